@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic decks for the benchmark suite.
+
+Each case function takes a number of lines n and returns a Case: a
+description, the lines of a deck of about n lines, a function that reads
+(or writes) the whole deck once and returns the number of lines it
+processed, and optionally a function that releases what the case set up.
+Cases that need an optional dependency raise ImportError without it.
+
+Cases that time two ways of doing the same thing, such as reading rows
+into cards and into columns, use the same deck so that their results can
+be compared directly.
+"""
+
+import asyncio
+import collections
+import io
+import itertools
+import os
+import string
+import tempfile
+
+from fortranformat import FortranRecordReader
+
+from text_data_cards import DataCard, DataCardAlternates, \
+    DataCardFixedText, DataCardOptional, DataCardRepeat, DataCardStack, \
+    IncrementalParser, MappedLines, ParseCache, ReadError, \
+    compile_grammar, load_snapshot, save_snapshot
+from text_data_cards.fastformat import compile_reader
+from text_data_cards.profiler import profiling
+
+
+Case = collections.namedtuple('Case', 'description lines run close')
+Case.__new__.__defaults__ = (None,)
+
+FORMAT = '(I3, F5.4, F8.5, I2, F8.5, F8.5, A8, A5, A5)'
+FIELDS = ['IP', 'SKIN', 'RESIS', 'IX', 'REACT', 'DIAM', 'T', 'FIXED',
+          'RIGHT']
+ROW = '  3  0.0   .1357 0   .3959    1.18TESTTEXTFIXEDRIGHT'
+ROW_FORMAT = '%3d  0.0   .1357 0   .3959    1.18TESTTEXTFIXEDRIGHT'
+
+
+def branch_card(**kwargs):
+    return DataCard(FORMAT, FIELDS, fixed_fields=(7, 8), **kwargs)
+
+
+def keyed(name):
+    return DataCard('(A4, I4, F8.3, F8.3)', [name, 'N', 'X', 'Y'],
+                    fixed_fields=(0,))
+
+
+def branch_lines(n):
+    return [ROW_FORMAT % (i % 1000) for i in range(n)]
+
+
+def branch_block(**kwargs):
+    return DataCardRepeat(branch_card(), DataCardFixedText('BLANK'),
+                          name='BRANCHES', **kwargs)
+
+
+def block_lines(n):
+    return branch_lines(n - 1) + ['BLANK']
+
+
+def temp_file(lines):
+    """ Writes lines to a temporary file and returns its path. """
+    fd, path = tempfile.mkstemp(prefix='bench')
+    with os.fdopen(fd, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+def read_each(card, lines, step, **kwargs):
+    """ Returns a function that reads card at every step-th line. """
+    def run():
+        for start in range(0, len(lines) - step + 1, step):
+            card.read(lines, start=start, **kwargs)
+        return len(lines)
+    return run
+
+
+def read_once(card, lines):
+    return lambda: card.read(lines)
+
+
+# Cases
+
+
+def datacard_read(n):
+    lines = branch_lines(n)
+    return Case('DataCard.read() of each line', lines,
+                read_each(branch_card(), lines, 1))
+
+
+def datacard_read_lazy(n):
+    lines = branch_lines(n)
+    return Case('DataCard(lazy=True).read() of each line', lines,
+                read_each(branch_card(lazy=True), lines, 1))
+
+
+def datacard_read_all_or_none_false(n):
+    lines = branch_lines(n)
+    return Case('DataCard.read(read_all_or_none=False) of each line', lines,
+                read_each(branch_card(), lines, 1, read_all_or_none=False))
+
+
+def datacard_write(n):
+    lines = branch_lines(n)
+    card = branch_card()
+    card.read(lines)
+
+    def run():
+        # Without a source line every write formats the data.
+        card.source = None
+        for _ in range(n):
+            card.write()
+        return n
+    return Case('DataCard.write() of a modified card', lines, run)
+
+
+def datacard_write_source(n):
+    lines = branch_lines(n)
+    card = branch_card()
+    card.read(lines)
+
+    def run():
+        for _ in range(n):
+            card.write()
+        return n
+    return Case('DataCard.write() of an unmodified card', lines, run)
+
+
+def stack(n):
+    card = DataCardStack([keyed('NODE'), branch_card(),
+                          DataCardFixedText('NEXT')])
+    lines = ['NODE%4d   1.000   2.000' % (i % 1000) if i % 3 == 0
+             else ROW if i % 3 == 1 else 'NEXT' for i in range(n // 3 * 3)]
+    return Case('DataCardStack of 3 lines read at each stack', lines,
+                read_each(card, lines, 3))
+
+
+def reader_fortranformat(n):
+    lines = branch_lines(n)
+    reader = FortranRecordReader(FORMAT)
+
+    def run():
+        for line in lines:
+            reader.read(line)
+        return n
+    return Case('FortranRecordReader.read() of each line', lines, run)
+
+
+def reader_compiled(n):
+    lines = branch_lines(n)
+    reader = compile_reader(FORMAT)
+
+    def run():
+        for line in lines:
+            reader.read(line)
+        return n
+    return Case('compile_reader() record reader of each line', lines, run)
+
+
+def repeat_end(n):
+    lines = block_lines(n)
+    return Case('DataCardRepeat with an end record', lines,
+                read_once(branch_block(), lines))
+
+
+def repeat_unchecked(n):
+    card = branch_block()
+    lines = block_lines(n)
+
+    def run():
+        card._read(lines)
+        return len(lines)
+    return Case('DataCardRepeat._read() without parsing first', lines, run)
+
+
+def repeat_read_error(n):
+    card = branch_block()
+    lines = block_lines(n)
+    lines[-2] = lines[-2].replace('RIGHT', 'WRONG')
+
+    def run():
+        try:
+            card.read(lines)
+        except ReadError:
+            return len(lines)
+        raise AssertionError('The last row should not match')
+    return Case('DataCardRepeat.read() failing on the last row', lines, run)
+
+
+def repeat_match(n):
+    card = branch_block()
+    lines = block_lines(n)
+
+    def run():
+        card.match(lines)
+        return len(lines)
+    return Case('DataCardRepeat.match()', lines, run)
+
+
+def repeat_lazy(n):
+    lines = block_lines(n)
+    return Case('DataCardRepeat of DataCard(lazy=True) rows', lines,
+                read_once(DataCardRepeat(branch_card(lazy=True),
+                                         DataCardFixedText('BLANK')), lines))
+
+
+def repeat_compact(n):
+    lines = ['%3d  0.0   .1357 0   .3959    1.18NODE%-4dFIXEDRIGHT'
+             % (i % 1000, i % 500) for i in range(n - 1)] + ['BLANK']
+    return Case('DataCardRepeat(compact=True)', lines,
+                read_once(branch_block(compact=True), lines))
+
+
+def repeat_read_columns(n):
+    card = branch_block()
+    lines = block_lines(n)
+    return Case('DataCardRepeat.read_columns() into NumPy arrays', lines,
+                lambda: card.read_columns(lines).num_lines)
+
+
+def repeat_read_arrow(n):
+    card = branch_block()
+    lines = block_lines(n)
+
+    def run():
+        card.read_arrow(lines)
+        return len(lines)
+    return Case('DataCardRepeat.read_arrow() into a pyarrow Table', lines,
+                run)
+
+
+def repeat_cache_hit(n):
+    card = branch_block()
+    lines = block_lines(n)
+    cache = ParseCache()
+    cache.parse(card, lines)
+
+    def run():
+        cache.parse(card, lines)
+        return len(lines)
+    return Case('ParseCache.parse() of a cached DataCardRepeat', lines, run)
+
+
+def repeat_parallel(n):
+    import concurrent.futures
+    from text_data_cards.parallel import parallel_parse
+    card = branch_block()
+    lines = block_lines(n)
+    pool = concurrent.futures.ProcessPoolExecutor()
+
+    def run():
+        return parallel_parse(card, lines, executor=pool,
+                              chunk_size=max(n // 16, 1000))[0]
+    return Case('parallel_parse() of a DataCardRepeat', lines, run,
+                pool.shutdown)
+
+
+def repeat_file_list(n):
+    card = branch_block()
+    lines = block_lines(n)
+    path = temp_file(lines)
+
+    def run():
+        with open(path) as f:
+            return card._parse(f.read().splitlines())[0]
+    return Case('DataCardRepeat parse of a file read into a list', lines,
+                run, lambda: os.remove(path))
+
+
+def repeat_file_mapped(n):
+    card = branch_block()
+    lines = block_lines(n)
+    path = temp_file(lines)
+
+    def run():
+        mapped = MappedLines(path)
+        try:
+            return card._parse(mapped)[0]
+        finally:
+            mapped.close()
+    return Case('DataCardRepeat parse of a file through MappedLines', lines,
+                run, lambda: os.remove(path))
+
+
+def repeat_aiter_read(n):
+    card = branch_block()
+    lines = block_lines(n)
+    data = ('\n'.join(lines) + '\n').encode('latin-1')
+
+    async def read(chunk=65536):
+        reader = asyncio.StreamReader()
+        for i in range(0, len(data), chunk):
+            reader.feed_data(data[i:i + chunk])
+        reader.feed_eof()
+        async for c in card.aiter_read(reader):
+            pass
+
+    def run():
+        asyncio.run(read())
+        return len(lines)
+    return Case('DataCardRepeat.aiter_read() from a StreamReader', lines,
+                run)
+
+
+def repeat_profiled(n):
+    card = branch_block()
+    lines = block_lines(n)
+
+    def run():
+        with profiling():
+            return card.read(lines)
+    return Case('DataCardRepeat.read() with a Profiler enabled', lines, run)
+
+
+def snapshot_load(n):
+    card = branch_block()
+    lines = block_lines(n)
+    card.read(lines)
+    fd, path = tempfile.mkstemp(prefix='bench', suffix='.snap')
+    os.close(fd)
+    save_snapshot(card, path)
+
+    def run():
+        load_snapshot(branch_block(), path)
+        return len(lines)
+    return Case('load_snapshot() of a read DataCardRepeat', lines, run,
+                lambda: os.remove(path))
+
+
+def shared_attach(n):
+    from text_data_cards import shared
+    card = branch_block()
+    lines = block_lines(n)
+    card.read(lines)
+    published = shared.publish(card)
+
+    def run():
+        with shared.attach(published.handle) as deck:
+            deck.tables['BRANCHES']['RESIS'].sum()
+        return len(lines)
+    return Case('shared.attach() to a published deck and sum a column',
+                lines, run, published.unlink)
+
+
+def repeat_no_end(n):
+    card = DataCardRepeat(branch_card())
+    lines = branch_lines(n)
+    return Case('DataCardRepeat without an end record', lines,
+                read_once(card, lines))
+
+
+def repeat_write(n):
+    card = branch_block()
+    lines = block_lines(n)
+    card.read(lines)
+    for dl in card._datalines:
+        dl.source = None
+    return Case('DataCardRepeat.write() formatting every row', lines,
+                lambda: card.write().count('\n') + 1)
+
+
+def repeat_write_source(n):
+    card = branch_block()
+    lines = block_lines(n)
+    card.read(lines)
+    card.data[len(card.data) // 2]['IP'] = 999
+    return Case('DataCardRepeat.write() with one row changed', lines,
+                lambda: card.write().count('\n') + 1)
+
+
+def repeat_write_columns(n):
+    card = branch_block()
+    lines = block_lines(n)
+    card.read(lines)
+    columns = dict((f, [row[f] for row in card.data]) for f in FIELDS)
+
+    def run():
+        return card.write_columns(columns, io.StringIO())
+    return Case('DataCardRepeat.write_columns() from lists', lines, run)
+
+
+def alternates_wide(n):
+    names = ['%s%sCD' % (a, b) for a in string.ascii_uppercase[:13]
+             for b in 'XY']
+    card = DataCardRepeat(DataCardAlternates([keyed(name) for name in names]),
+                          DataCardFixedText('END'))
+    lines = ['%s%4d   1.000   2.000' % (names[i * 7 % len(names)], i % 1000)
+             for i in range(n - 1)] + ['END']
+    return Case('DataCardRepeat of 26 DataCardAlternates', lines,
+                read_once(card, lines))
+
+
+def grammar_parse(n):
+    names = ['C%05d' % i for i in range(20)]
+    card = DataCardStack([
+        DataCardFixedText('BEGIN NEW DATA CASE'),
+        DataCardRepeat(
+            DataCardAlternates([DataCard('(A6, I10, F16.6, F16.6)',
+                                         [name, 'NODE', 'R', 'X'],
+                                         fixed_fields=(0,))
+                                for name in names]),
+            DataCardFixedText('BLANK BRANCH'))])
+    grammar = compile_grammar(card, strict=True)
+    lines = (['BEGIN NEW DATA CASE']
+             + ['%s%10d%16.6f%16.6f' % (names[i % 20], i, 0.5, 1.25)
+                for i in range(n - 2)]
+             + ['BLANK BRANCH'])
+    return Case('Grammar.parse() of 20 DataCardAlternates', lines,
+                lambda: grammar.parse(lines)[0])
+
+
+def keywords(n):
+    names = ['BEGIN NEW DATA CASE', 'BLANK', 'BLANK BRANCH', 'BLANK SWITCH',
+             'BLANK SOURCE', 'BLANK OUTPUT', 'BLANK PLOT',
+             'END NEW DATA CASE', 'TACS HYBRID', 'TACS STAND ALONE'] \
+        + ['REQUEST %02d' % i for i in range(30)]
+    card = DataCardAlternates(
+        [DataCardFixedText(k) for k in names]
+        + [DataCardFixedText('$INCLUDE', prefix=True),
+           DataCardFixedText('C ', prefix=True)])
+    kinds = names + ['$INCLUDE  file.lib', 'C comment']
+    lines = [kinds[i * 7 % len(kinds)] for i in range(n)]
+
+    def run():
+        for i in range(len(lines)):
+            card._parse(lines, i)
+        return len(lines)
+    return Case('DataCardAlternates of 42 DataCardFixedText keywords',
+                lines, run)
+
+
+def incremental_edit(n):
+    card = DataCardStack([
+        DataCardFixedText('BEGIN'),
+        DataCardRepeat(DataCardAlternates([
+            DataCard('(A4, I4)', ['NODE', 'N'], fixed_fields=(0,)),
+            DataCard('(A4, I4)', ['LINE', 'L'], fixed_fields=(0,))]),
+            DataCardFixedText('END'))])
+    lines = ['BEGIN'] + ['NODE%4d' % (i % 1000) for i in range(n - 2)] \
+        + ['END']
+    parser = IncrementalParser(card, lines)
+    edits = itertools.cycle((i * 7919 % (n - 2) + 1, ['LINE%4d' % i])
+                            for i in range(20))
+
+    def run():
+        idx, new = next(edits)
+        parser.replace(idx, idx + 1, new)
+        return len(lines)
+    return Case('IncrementalParser.replace() of one line', lines, run)
+
+
+def optional(n):
+    card = DataCardRepeat(
+        DataCardStack([DataCardOptional(keyed('NOTE')), keyed('NODE')]),
+        DataCardFixedText('END'))
+    lines = ['NOTE   1   0.000   0.000' if i % 4 == 0 and i < n - 2
+             else 'NODE%4d   1.000   2.000' % (i % 1000)
+             for i in range(n - 1)] + ['END']
+    return Case('DataCardRepeat of rows with a DataCardOptional', lines,
+                read_once(card, lines))
+
+
+CASES = collections.OrderedDict(
+    (f.__name__, f) for f in [
+        datacard_read, datacard_read_lazy, datacard_read_all_or_none_false,
+        datacard_write, datacard_write_source, reader_fortranformat,
+        reader_compiled, stack, repeat_end, repeat_no_end, repeat_unchecked,
+        repeat_read_error, repeat_match, repeat_lazy, repeat_compact,
+        repeat_read_columns, repeat_read_arrow, repeat_cache_hit,
+        repeat_parallel, repeat_file_list, repeat_file_mapped,
+        repeat_aiter_read, repeat_profiled, repeat_write,
+        repeat_write_source, repeat_write_columns, snapshot_load,
+        shared_attach, alternates_wide, grammar_parse, keywords,
+        incremental_edit, optional])
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite: reads and writes synthetic decks of each card class at
+several sizes and reports throughput in lines per second and the peak
+memory allocated while processing the deck (not counting the lines).
+
+Results can be saved to a JSON file and compared with an earlier run to
+catch regressions. The exit status is 1 if a case is slower than the
+baseline by more than the tolerance.
+
+Usage: python benchmarks/suite.py [-s SIZES] [-k NAME ...] [--save FILE]
+                                  [--compare FILE] [--tolerance FRACTION]
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import decks
+
+
+def best_time(run, min_time=0.05, repeat=5):
+    """ Returns the best time per call of run() out of repeat timings. Each
+        timing calls run() enough times to take at least min_time seconds,
+        so that small decks are timed accurately.
+    """
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            run()
+        t = time.perf_counter() - t0
+        if t >= min_time:
+            break
+        number *= 2 if t == 0 else max(2, int(min_time / t) + 1)
+    times = [t]
+    for _ in range(repeat - 1):
+        gc.collect()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            run()
+        times.append(time.perf_counter() - t0)
+    return min(times) / number
+
+
+def peak_memory(run):
+    """ Returns the peak memory in bytes allocated during run(). """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(name, n, memory=True):
+    """ Returns the results of case name for a deck of n lines, or None if
+        the case needs an optional dependency that isn't installed.
+    """
+    try:
+        case = decks.CASES[name](n)
+    except ImportError:
+        return None
+    try:
+        try:
+            lines = case.run()
+        except ImportError:
+            return None
+        t = best_time(case.run)
+        result = {'case': name, 'size': n, 'lines': lines, 'seconds': t,
+                  'lines_per_second': lines / t}
+        if memory:
+            result['peak_mb'] = peak_memory(case.run) / 1e6
+        return result
+    finally:
+        if case.close is not None:
+            case.close()
+
+
+def compare(results, baseline, tolerance):
+    """ Print the change in throughput from baseline. Returns the number
+        of cases slower by more than tolerance.
+    """
+    old = dict(((r['case'], r['size']), r) for r in baseline['results'])
+    slower = 0
+    for r in results:
+        b = old.get((r['case'], r['size']))
+        if b is None:
+            continue
+        change = r['lines_per_second'] / b['lines_per_second'] - 1
+        flag = ''
+        if change < -tolerance:
+            flag = '  REGRESSION'
+            slower += 1
+        print('%-32s %8d %+7.1f%%%s' % (r['case'], r['size'],
+                                        100 * change, flag))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-s', '--sizes', default='1000,10000,100000',
+                        help='comma separated deck sizes in lines '
+                             '(default %(default)s; add 1000000 for the '
+                             'largest decks)')
+    parser.add_argument('-k', '--case', action='append', choices=decks.CASES,
+                        help='run only this case (repeatable)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the peak memory measurement')
+    parser.add_argument('--save', help='write the results to a JSON file')
+    parser.add_argument('--compare', help='compare with a saved JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown that counts as a regression '
+                             '(default %(default)s)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    names = args.case or list(decks.CASES)
+    print('%-32s %8s %12s %10s %9s' % ('case', 'lines', 'lines/s',
+                                       'seconds', 'peak MB'))
+    results = []
+    for name in names:
+        for n in sizes:
+            r = run_case(name, n, not args.no_memory)
+            if r is None:
+                print('%-32s skipped, missing optional dependency' % name)
+                break
+            results.append(r)
+            print('%-32s %8d %12.0f %10.4f %9s'
+                  % (name, r['lines'], r['lines_per_second'], r['seconds'],
+                     '%.1f' % r['peak_mb'] if 'peak_mb' in r else '-'))
+            sys.stdout.flush()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\nChange in lines/s from %s:' % args.compare)
+        return 1 if compare(results, baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
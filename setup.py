@@ -34,6 +34,10 @@ setup(
                  'text_data_cards'},
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'numpy': ['numpy'],
+        'arrow': ['numpy', 'pyarrow'],
+    },
     license="MIT license",
     zip_safe=False,
     keywords='text_data_cards',
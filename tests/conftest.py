@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+conftest
+----------------------------------
+
+Card layouts and card builders shared by the tests.
+"""
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+
+
+#      I3 F5.4 F8.5    I2F8.5    F8.5    A8      A5   A5
+ROW_FORMAT = '(I3, F5.4, F8.5, I2, F8.5, F8.5, A8, A5, A5)'
+ROW_FIELDS = ['IP', 'SKIN', 'RESIS', 'IX', 'REACT', 'DIAM', 'T', 'FIXED',
+              'RIGHT']
+
+
+@pytest.fixture()
+def row_format():
+    return ROW_FORMAT
+
+
+@pytest.fixture()
+def row_fields():
+    return list(ROW_FIELDS)
+
+
+@pytest.fixture()
+def make_row():
+    """ Builds DataCards of the row layout, fixed to end in FIXEDRIGHT. """
+    def make_row(**kwargs):
+        return tdc.DataCard(ROW_FORMAT, ROW_FIELDS, fixed_fields=(7, 8),
+                            **kwargs)
+    return make_row
+
+
+@pytest.fixture()
+def make_repeat(make_row):
+    """ Builds DataCardRepeats of rows, ended by BLANK unless end is False.
+        Other keyword arguments are passed to the row card.
+    """
+    def make_repeat(end=True, compact=False, **kwargs):
+        return tdc.DataCardRepeat(
+            make_row(**kwargs),
+            tdc.DataCardFixedText('BLANK') if end else None, compact=compact)
+    return make_repeat
+
+
+@pytest.fixture()
+def keyed():
+    """ Builds '(A4, I4)' cards matching on text in the first field. """
+    def keyed(text, field='N', **kwargs):
+        return tdc.DataCard('(A4, I4)', [text, field], fixed_fields=(0,),
+                            **kwargs)
+    return keyed
+
+
+@pytest.fixture()
+def node():
+    """ Builds '(A4, I4, F8.2)' cards matching on text in the first field,
+        with an A6 TAG field after them if tag is True.
+    """
+    def node(text='NODE', tag=False, **kwargs):
+        if tag:
+            return tdc.DataCard('(A4, I4, F8.2, A6)', [text, 'N', 'X', 'TAG'],
+                                fixed_fields=(0,), **kwargs)
+        return tdc.DataCard('(A4, I4, F8.2)', [text, 'N', 'X'],
+                            fixed_fields=(0,), **kwargs)
+    return node
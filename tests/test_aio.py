@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_aio
+----------------------------------
+
+Tests for `aio` module.
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import aio
+
+
+@pytest.fixture()
+def deck(keyed):
+    row = tdc.DataCardAlternates([keyed('NODE'), keyed('LINE', 'L')])
+    return tdc.DataCardStack([
+        tdc.DataCardOptional(keyed('HEAD', 'H')),
+        tdc.DataCardRepeat(row, tdc.DataCardFixedText('END')),
+        keyed('TAIL', 'T'),
+    ])
+
+
+LINES = ['HEAD   1', 'NODE   2', 'LINE   3', 'NODE   4', 'END', 'TAIL   5']
+
+
+async def lines_of(lines):
+    for line in lines:
+        await asyncio.sleep(0)
+        yield line + '\n'
+
+
+async def collect(card, source):
+    return [(c.write(), dict(c.data)) async for c in card.aiter_read(source)]
+
+
+def test_aiter_read_same_as_iter_read(deck):
+    expected = [(c.write(), dict(c.data))
+                for c in deck._new_record().iter_read(iter(LINES))]
+    assert asyncio.run(collect(deck, lines_of(LINES))) == expected
+    assert deck.data['T'] == 5 and deck.data['H'] == 1
+
+
+def test_aiter_read_optional_missing(deck):
+    lines = LINES[1:]
+    cards = asyncio.run(collect(deck, lines_of(lines)))
+    # The unmatched optional card is yielded too, and writes nothing.
+    assert [w for w, d in cards] == [''] + lines
+    assert deck._datalines[0].dl_matched is None
+
+
+def test_aiter_read_bad_line(deck):
+    with pytest.raises(ValueError):
+        asyncio.run(collect(deck, lines_of(LINES[:3] + ['JUNK'])))
+
+
+def test_cards_yielded_as_lines_arrive(deck):
+    async def main():
+        reader = asyncio.StreamReader()
+        fed = []
+
+        async def produce():
+            for line in LINES:
+                fed.append(line)
+                reader.feed_data(line.encode('latin-1') + b'\n')
+                await asyncio.sleep(0.01)
+            reader.feed_eof()
+
+        task = asyncio.ensure_future(produce())
+        seen = [(c.write(), len(fed)) async for c in deck.aiter_read(reader)]
+        await task
+        return seen
+
+    seen = asyncio.run(main())
+    # Each row is yielded as soon as the line after it shows that it
+    # isn't the end record, not after the whole deck has arrived.
+    assert seen[1] == ('NODE   2', 2)
+    assert seen[-1] == ('TAIL   5', 6)
+
+
+def test_large_card_parsed_log_times(keyed):
+    rows = tdc.DataCardRepeat(keyed('NODE'), tdc.DataCardFixedText('END'))
+    card = tdc.DataCardOptional(rows)
+    parse = card._parse
+    calls = []
+
+    def counted(lines, start=0):
+        calls.append(start)
+        return parse(lines, start)
+    card._parse = counted
+    lines = ['NODE%4d' % i for i in range(1000)] + ['END']
+    cards = asyncio.run(collect(card, lines_of(lines)))
+    assert len(cards) == 1 and len(card.data) == 1000
+    assert len(calls) <= 12
+
+
+def test_aiter_read_subprocess(deck):
+    async def main():
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', 'print(%r)' % '\n'.join(LINES),
+            stdout=asyncio.subprocess.PIPE)
+        cards = [c.write() async for c in aio.aiter_read(deck, proc.stdout)]
+        await proc.wait()
+        return cards
+
+    assert asyncio.run(main()) == LINES
+
+
+def test_stream_pending_lines():
+    async def main():
+        stream = aio.AsyncLineStream(lines_of(['A', 'B']))
+        with pytest.raises(aio.LinesPending):
+            stream[0]
+        assert await stream.fill(1)
+        assert stream[1] == 'B'
+        assert not await stream.fill(2)
+        with pytest.raises(IndexError):
+            stream[2]
+
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_arrow
+----------------------------------
+
+Tests for `text_data_cards.arrow` module.
+"""
+
+import pytest
+
+pytest.importorskip('numpy')
+pa = pytest.importorskip('pyarrow')
+
+from text_data_cards import arrow, columnar, text_data_cards
+
+
+@pytest.fixture()
+def lines():
+    return ['%3d  0.0   .1357 0   .3959    1.18%-8sFIXEDRIGHT'
+            % (i, 'NODE%d' % i) for i in range(10)] + ['BLANK', 'NEXT']
+
+
+def test_arrow_schema(make_repeat, row_fields):
+    schema = arrow.arrow_schema(make_repeat())
+    assert schema.names == row_fields
+    assert schema.field('IP').type == pa.int64()
+    assert schema.field('SKIN').type == pa.float64()
+    assert schema.field('T').type == pa.string()
+
+
+def test_arrow_schema_skips_unnamed_fields():
+    card = text_data_cards.DataCard('(I3, 2X, A4, F5.1)', ['N', None, 'X'])
+    schema = arrow.arrow_schema(card)
+    assert schema.names == ['N', 'X']
+
+
+def test_arrow_numeric_fixed_field_names():
+    card = text_data_cards.DataCardRepeat(
+        text_data_cards.DataCard('(I2, I4)', [5, 'N'], fixed_fields=(0,)))
+    assert arrow.arrow_schema(card).names == ['5', 'N']
+    lines = [' 5   1', ' 5   2']
+    table = card.read_arrow(lines)
+    assert table.column('5').to_pylist() == [5, 5]
+    assert table.column('N').to_pylist() == [1, 2]
+    card.read(lines)
+    assert arrow.table_from_data(card).equals(
+        table.replace_schema_metadata(None))
+
+
+def test_arrow_schema_rejects_stack():
+    card = text_data_cards.DataCardStack([
+        text_data_cards.DataCard('(I3)', ['N']),
+        text_data_cards.DataCard('(I3)', ['M'])])
+    with pytest.raises(TypeError):
+        arrow.arrow_schema(card)
+
+
+def test_read_arrow_same_as_read(make_repeat, lines):
+    card = make_repeat()
+    table = card.read_arrow(lines)
+    assert table.schema.metadata[b'num_lines'] == b'11'
+    assert table.num_rows == 10
+    assert table.schema.field('IP').type == pa.int64()
+    card.read(lines)
+    assert table.to_pylist() == card.data
+    assert arrow.table_from_data(card).equals(
+        table.replace_schema_metadata(None))
+
+
+def test_table_from_columns_missing_values_are_null():
+    np = pytest.importorskip('numpy')
+    columns = columnar.ColumnTable(
+        ['N', 'X'], [np.array([1, None], dtype=object),
+                     np.array([1.5, 2.5])], 2, 2)
+    schema = pa.schema([('N', pa.int64()), ('X', pa.float64())])
+    table = arrow.table_from_columns(columns, schema)
+    assert table.column('N').to_pylist() == [1, None]
+    assert table.column('N').null_count == 1
+    assert table.column('X').to_pylist() == [1.5, 2.5]
+
+
+def test_record_batches(make_repeat, lines):
+    batches = arrow.record_batches(make_repeat(), lines, batch_size=4)
+    assert [b.num_rows for b in batches] == [4, 4, 2]
+
+
+def test_write_parquet(make_repeat, lines, tmpdir):
+    pq = pytest.importorskip('pyarrow.parquet')
+    card = make_repeat()
+    path = str(tmpdir.join('rows.parquet'))
+    assert card.write_parquet(lines, path) == 11
+    table = pq.read_table(path)
+    assert table.schema.field('DIAM').type == pa.float64()
+    assert table.column('T').to_pylist()[3] == 'NODE3   '
+    assert table.column('IP').to_pylist() == list(range(10))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_batch
+----------------------------------
+
+Tests for `batch` module.
+"""
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import batch
+
+
+def total(c):
+    c.data.append(sum(d['N'] for d in c.data))
+
+
+@pytest.fixture()
+def card(keyed):
+    return tdc.DataCardRepeat(keyed('NODE'), tdc.DataCardFixedText('END'),
+                              post_read_hook=total)
+
+
+@pytest.fixture()
+def files(tmpdir):
+    paths = []
+    for i in range(6):
+        p = tmpdir.join('deck%d.dat' % i)
+        p.write('\n'.join(['NODE%4d' % j for j in range(i)] + ['END']))
+        paths.append(str(p))
+    bad = tmpdir.join('deck9.dat')
+    bad.write('NODE   1\nNODExxxx\nEND\n')
+    paths.append(str(bad))
+    return paths
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_read_files(card, files, processes):
+    results = list(batch.read_files(card, files, processes=processes,
+                                    max_workers=2))
+    assert [r.path for r in results] == files
+    for i, r in enumerate(results[:-1]):
+        assert r.error is None
+        assert r.num_lines == i + 1
+        assert r.card.data[-1] == sum(range(i))
+        assert r.card._repeated_record._schema is card._repeated_record._schema
+    assert results[-1].card is None
+    assert isinstance(results[-1].error, ValueError)
+
+
+def test_read_directory_unordered(card, files, tmpdir):
+    results = batch.read_files(card, str(tmpdir), pattern='deck*.dat',
+                               processes=False, ordered=False, grammar=True)
+    assert sorted(r.path for r in results) == sorted(files)
+
+
+def test_read_single_file(card, files):
+    r, = batch.read_files(card, files[3], processes=False)
+    assert r.path == files[3] and r.error is None and r.num_lines == 4
+    pathlib = pytest.importorskip('pathlib')
+    r, = batch.read_files(card, pathlib.Path(files[3]), processes=False)
+    assert r.error is None and r.num_lines == 4
+
+
+def test_missing_file(card, tmpdir):
+    missing = str(tmpdir.join('missing.dat'))
+    r, = batch.read_files(card, [missing], processes=False)
+    assert isinstance(r.error, IOError)
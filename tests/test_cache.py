@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cache
+----------------------------------
+
+Tests for `cache` module.
+"""
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import ParseCache, compile_grammar
+from text_data_cards.lines import LineStream
+
+
+def counter(c):
+    c.data['N'] += 100
+
+
+@pytest.fixture()
+def card(keyed):
+    return tdc.DataCardRepeat(
+        keyed('NODE', post_read_hook=counter),
+        tdc.DataCardFixedText('END'), name='NODES')
+
+
+@pytest.fixture()
+def lines():
+    return ['NODE   1', 'NODE   2', 'END', 'EXTRA']
+
+
+def test_read_hit(card, lines, monkeypatch):
+    cache = ParseCache()
+    assert card.read(lines, cache=cache) == 3
+    assert cache.info().misses == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Cached lines should not be parsed')
+    monkeypatch.setattr(card, '_parse', fail)
+    rec = card._new_record()
+    assert rec.read(lines, cache=cache) == 3
+    assert [d['N'] for d in rec.data] == [101, 102]
+    info = cache.info()
+    assert (info.hits, info.misses, info.currsize, info.lines) == \
+        (1, 1, 1, 3)
+
+
+def test_key_covers_lines_looked_at(card, keyed, lines):
+    cache = ParseCache()
+    card.read(lines, cache=cache)
+    # The same block elsewhere and followed by other lines is a hit.
+    rec = card._new_record()
+    assert rec.read(['HEAD'] + lines[:3] + ['OTHER'], start=1,
+                    cache=cache) == 3
+    assert cache.info().hits == 1
+    assert rec.read(lines[:1] + ['NODE   3', 'END'], cache=cache) == 3
+    assert [d['N'] for d in rec.data] == [101, 103]
+    other = tdc.DataCardRepeat(keyed('NODE', 'M'),
+                               tdc.DataCardFixedText('END'))
+    other.read(lines, cache=cache)
+    assert (cache.info().hits, cache.info().misses) == (1, 3)
+
+
+def test_end_of_input_in_key(keyed):
+    card = tdc.DataCardRepeat(keyed('NODE'))
+    cache = ParseCache()
+    assert card.read(['NODE   1'], cache=cache) == 1
+    # The block ended at the end of the input, so it is parsed again.
+    assert card.read(['NODE   1', 'NODE   2'], cache=cache) == 2
+    assert cache.info().misses == 2
+    assert card.read(['NODE   1', 'NODE   2', 'END'],
+                     read_all_or_none=False, cache=cache) == 2
+    assert cache.info().misses == 3
+
+
+def test_stream_only_loads_block(card, lines):
+    pulled = []
+
+    def source():
+        for line in lines + ['EXTRA'] * 100:
+            pulled.append(line)
+            yield line
+    cache = ParseCache()
+    assert card.read(LineStream(source()), cache=cache) == 3
+    assert card.read(LineStream(source()), cache=cache) == 3
+    assert cache.info().hits == 1
+    assert len(pulled) == 6
+
+
+def test_alternate_tried_first_in_key(keyed):
+    def alternates(first=None):
+        alt_list = [keyed('NODE'), tdc.DataCard('(A8)', ['TEXT'])]
+        return tdc.DataCardAlternates(
+            alt_list, None if first is None else alt_list[first])
+    cache = ParseCache()
+    alternates().read(['NODE   1'], cache=cache)
+    card = alternates(1)
+    card.read(['NODE   1'], cache=cache)
+    assert card.data == {'TEXT': 'NODE   1'}
+    assert cache.info().hits == 0
+
+
+def test_lru_eviction(card):
+    cache = ParseCache(maxsize=2)
+    blocks = [['NODE   %d' % i, 'END'] for i in range(3)]
+    card.read(blocks[0], cache=cache)
+    card.read(blocks[1], cache=cache)
+    card.read(blocks[0], cache=cache)
+    card.read(blocks[2], cache=cache)
+    assert cache.info().evictions == 1
+    card.read(blocks[0], cache=cache)
+    card.read(blocks[1], cache=cache)
+    info = cache.info()
+    assert (info.hits, info.misses, info.currsize) == (2, 4, 2)
+
+
+def test_max_lines(card, lines):
+    cache = ParseCache(max_lines=4)
+    card.read(lines, cache=cache)
+    card.read(lines, start=1, cache=cache)
+    info = cache.info()
+    assert (info.currsize, info.lines, info.evictions) == (1, 2, 1)
+
+
+def test_grammar(card, lines):
+    cache = ParseCache()
+    g = compile_grammar(card)
+    assert cache.read(g, lines) == 3
+    assert cache.read(card, lines) == 3
+    assert cache.info().hits == 1
+    assert card.data[1]['N'] == 102
+
+
+def test_save_load(card, lines, tmpdir):
+    path = str(tmpdir.join('cache.pickle'))
+    cache = ParseCache(path=path)
+    card.read(lines, cache=cache)
+    cache.save()
+    warm = ParseCache(path=path)
+    assert len(warm) == 1
+    warm.read(card, lines)
+    assert warm.info().hits == 1
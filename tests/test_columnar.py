@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_columnar
+----------------------------------
+
+Tests for `text_data_cards.columnar` module.
+"""
+
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from text_data_cards import columnar, fastformat, text_data_cards
+
+
+@pytest.fixture()
+def rows():
+    rnd = random.Random(0)
+    lines = []
+    for i in range(200):
+        lines.append('%3d%5s%8s%2d%8s%8s%-8sFIXEDRIGHT'
+                     % (rnd.randint(-99, 999),
+                        rnd.choice(['  0.0', ' 1234', '     ', '1.5-1']),
+                        rnd.choice(['   .1357', '  1357  ', '1.2D3   ',
+                                    '     -  ', '    12E+']),
+                        rnd.randint(0, 9),
+                        '%8.4f' % rnd.uniform(-10, 10),
+                        rnd.choice(['    1.18', '       .', '  -1.5e2']),
+                        rnd.choice(['TEXT', 'NODE 1', ''])))
+    return lines
+
+
+def test_read_columns_same_as_read(make_repeat, rows):
+    card = make_repeat()
+    lines = rows + ['BLANK', 'NEXT']
+    table = card.read_columns(lines)
+    assert table.nrows == len(rows)
+    assert table.num_lines == len(rows) + 1
+    assert table['IP'].dtype == np.int64
+    assert table['RESIS'].dtype == np.float64
+    card.read(lines)
+    for i, d in enumerate(card.data):
+        assert repr(table.row(i)) == repr(d)
+
+
+def test_read_columns_no_end(make_repeat, row_format, row_fields, rows):
+    card = make_repeat(end=False)
+    lines = rows + ['BLANK']
+    table = card.read_columns(lines, start=1)
+    assert table.nrows == len(rows) - 1
+    assert table.num_lines == len(rows) - 1
+    assert table['T'][0] == text_data_cards.CardSchema(
+        row_format, row_fields).read(rows[1])[6]
+
+
+def test_read_columns_invalid_row(make_repeat, rows):
+    card = make_repeat()
+    lines = rows[:3] + [rows[3].replace('RIGHT', 'WRONG')] + ['BLANK']
+    with pytest.raises(ValueError):
+        card.read_columns(lines)
+    lines = rows[:3] + ['  x' + rows[3][3:]] + ['BLANK']
+    with pytest.raises(ValueError):
+        card.read_columns(lines)
+
+
+def test_decode_lines_short_lines():
+    layout = fastformat.field_layout('(I3, F5.2, A4)')
+    reader = fastformat.compile_reader('(I3, F5.2, A4)')
+    lines = ['  1  2.5ABCD', '  2  1', ' 3', '']
+    columns = columnar.decode_lines(layout, lines)
+    for i, line in enumerate(lines):
+        assert [c[i] for c in columns] == reader.read(line)
+
+
+def test_decode_lines_in_chunks(row_format, rows):
+    layout = fastformat.field_layout(row_format)
+    lines = rows + ['  1  0.0']
+    whole = columnar.decode_lines(layout, lines)
+    chunked = columnar.decode_lines(layout, lines, chunk_size=7)
+    # Only the last chunk has missing values.
+    assert chunked[2].dtype == object and chunked[2][-1] is None
+    assert [repr(c.tolist()) for c in chunked] == \
+        [repr(c.tolist()) for c in whole]
+
+
+def test_read_columns_not_latin1(make_repeat, row_format, rows):
+    card = make_repeat()
+    lines = rows[:3] + ['  1  0.0   .1357 0   .3959    1.18€       '
+                        'FIXEDRIGHT', 'BLANK']
+    with pytest.raises(ValueError):
+        columnar.decode_lines(fastformat.field_layout(row_format), lines[:4])
+    table = card.read_columns(lines)
+    assert table['T'][3] == '€       '
+
+
+def test_write_columns_same_as_write(make_repeat, row_fields, rows):
+    import io
+    card = make_repeat()
+    card.read(rows + ['BLANK'])
+    columns = dict((f, [d[f] for d in card.data]) for f in row_fields)
+    out = io.StringIO()
+    assert card.write_columns(columns, out, chunk_size=7) == len(rows) + 1
+    # Compare with the formatted rows rather than the source lines.
+    for dl in card._datalines:
+        dl.source = None
+    assert out.getvalue() == card.write() + '\n'
+
+    out = io.StringIO()
+    card.write_columns(card.read_columns(rows + ['BLANK']), out)
+    assert out.getvalue() == card.write() + '\n'
+
+
+def test_write_columns_length_mismatch(make_repeat, row_fields):
+    import io
+    card = make_repeat()
+    columns = dict((f, [None]) for f in row_fields)
+    columns['IP'] = [1, 2]
+    with pytest.raises(ValueError):
+        card.write_columns(columns, io.StringIO())
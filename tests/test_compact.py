@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_compact
+----------------------------------
+
+Tests for `compact` module.
+"""
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import compact, load_snapshot, save_snapshot
+
+
+@pytest.fixture()
+def lines():
+    return ['%3d  0.0   .1357 0   .3959    1.18%-8sFIXEDRIGHT'
+            % (i, 'N%d' % (i % 3)) for i in range(10)] + ['BLANK', 'NEXT']
+
+
+def test_same_data_as_rows(make_repeat, lines):
+    card = make_repeat(compact=True)
+    assert card.read(lines) == 11
+    rows = make_repeat()
+    rows.read(lines)
+    assert isinstance(card.data, compact.CompactRows)
+    assert len(card.data) == 10
+    assert list(card.data) == rows.data
+    assert card.data[-1] == rows.data[-1]
+    assert card.data[4]['IP'] == 4
+    assert card.data[4]['T'] == 'N1      '
+    assert card._datalines == [card.end_record]
+    assert card.num_lines() == 11
+    assert card.write() == '\n'.join(lines[:11])
+
+
+def test_strings_are_pooled(make_repeat, lines):
+    card = make_repeat(compact=True)
+    card.read(lines)
+    assert len(card.data._strings) == 5
+    assert card.data._kinds[:3] == ['q', 'd', 'd']
+
+
+def test_changed_rows_are_formatted(make_repeat, lines):
+    card = make_repeat(compact=True)
+    card.read(lines)
+    card.data[2]['IP'] = 102
+    card.data[3]['T'] = 'NEW'
+    written = card.write().split('\n')
+    assert written[2].startswith('102')
+    assert written[3].endswith('NEWFIXEDRIGHT')
+    assert written[4] == lines[4]
+    assert card.data[3]['T'] == 'NEW'
+
+
+def test_column_type_changes(make_repeat, lines):
+    card = make_repeat(compact=True)
+    card.read(lines)
+    card.data[5]['RESIS'] = None
+    card.data[6]['IP'] = 2 ** 70
+    assert card.data._kinds[:3] == ['o', 'd', 'o']
+    assert card.data[5]['RESIS'] is None
+    assert card.data[6]['IP'] == 2 ** 70
+    assert card.data[7]['IP'] == 7
+    assert card.data[7]['RESIS'] == 0.1357
+
+
+def test_row_view(make_repeat, row_fields, lines):
+    card = make_repeat(compact=True)
+    card.read(lines)
+    row = card.data[1]
+    assert list(row) == row_fields
+    assert len(row) == len(row_fields)
+    assert 'IP' in row and 'XX' not in row
+    assert row.copy() == dict(row)
+    with pytest.raises(KeyError):
+        row['XX']
+    with pytest.raises(KeyError):
+        row['XX'] = 1
+    with pytest.raises(TypeError):
+        del row['IP']
+    with pytest.raises(IndexError):
+        card.data[10]
+    assert [r['IP'] for r in card.data[2:4]] == [2, 3]
+
+
+def test_hooks_and_lazy_rows(make_repeat, lines):
+    def hook(c):
+        c.data['IX'] = c.data['IP'] * 10
+    card = make_repeat(compact=True, post_read_hook=hook)
+    card.read(lines)
+    assert card.data[3]['IX'] == 30
+    assert card.write().split('\n')[3][16:18] == '30'
+    assert card.write().split('\n')[0] == lines[0]
+
+    card = make_repeat(compact=True, lazy=True)
+    card.read(lines)
+    assert card.data[3]['RESIS'] == 0.1357
+    assert card.write() == '\n'.join(lines[:11])
+
+
+def test_no_rows(make_repeat):
+    card = make_repeat(compact=True)
+    assert card.read(['BLANK']) == 1
+    assert len(card.data) == 0
+    assert card.write() == 'BLANK'
+
+
+def test_stack_rejected():
+    with pytest.raises(ValueError):
+        tdc.DataCardRepeat(tdc.DataCardStack([
+            tdc.DataCard('(I3)', ['A']), tdc.DataCard('(I3)', ['B'])]),
+            compact=True)
+
+
+def test_snapshot(make_repeat, lines, tmpdir):
+    path = str(tmpdir.join('rows.snap'))
+    card = make_repeat(compact=True)
+    card.read(lines)
+    card.data[2]['IP'] = 102
+    save_snapshot(card, path)
+    loaded = load_snapshot(make_repeat(compact=True), path)
+    assert list(loaded.data) == list(card.data)
+    assert loaded.write() == card.write()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_fastformat
+----------------------------------
+
+Tests for `text_data_cards.fastformat` module.
+"""
+
+import random
+
+import pytest
+
+from fortranformat import FortranRecordReader, FortranRecordWriter
+
+from text_data_cards import fastformat
+
+
+# The compiled conversions copy those of the tested fortranformat versions;
+# with other versions only the fallback to fortranformat is checked.
+compiled_writers = pytest.mark.skipif(not fastformat.COMPILED_WRITERS,
+                                      reason='untested fortranformat version')
+
+FORMATS = [
+    '(I3, F5.4, F8.5, I2, F8.5, F8.5, A8, A5, A5)',
+    '(2X, 3I4, 2(E12.5, 1X), A6)',
+    '(F8.5, D10.2, EN9.1, ES9.1, TR2, I5)',
+    '(A15, A15, A15)',
+]
+
+
+def _outcome(read, line):
+    try:
+        return [repr(v) for v in read(line)]
+    except ValueError:
+        return ValueError
+
+
+def test_field_layout():
+    layout = fastformat.field_layout(FORMATS[1])
+    assert [f.start for f in layout] == [2, 6, 10, 14, 27, 40]
+    assert layout[3] == fastformat.Field('E', 14, 12, 5)
+
+
+@pytest.mark.parametrize('format', ['(I3, T1, A3)', '(I3, 2X, L2)',
+                                    '(A)', '(F8.5, BZ, F8.5)'])
+def test_field_layout_unsupported(format):
+    assert fastformat.field_layout(format) is None
+    assert isinstance(fastformat.compile_reader(format), FortranRecordReader)
+
+
+@pytest.mark.parametrize('line', [
+    '', '  3', '  -  .  ', '1.5D2   1234567.E+', '  -1+2  .1357 0',
+    '   .1357   1.18E', '1-5E3 -.5d-1 +12 3', 'NAN  INF   x', '12\n34'])
+def test_read_same_as_fortranformat(line):
+    for format in FORMATS:
+        fast = fastformat.compile_reader(format)
+        assert isinstance(fast, fastformat.FastRecordReader) == \
+            fastformat.COMPILED_READERS
+        slow = FortranRecordReader(format)
+        assert _outcome(fast.read, line) == _outcome(slow.read, line)
+
+
+def test_read_same_as_fortranformat_random():
+    rnd = random.Random(0)
+    chars = ' 0123456789.+-EeDd    123'
+    readers = [(fastformat.compile_reader(f), FortranRecordReader(f))
+               for f in FORMATS]
+    for i in range(2000):
+        line = ''.join(rnd.choice(chars)
+                       for j in range(rnd.randint(0, 60)))
+        for fast, slow in readers:
+            assert _outcome(fast.read, line) == _outcome(slow.read, line)
+
+
+def test_valid_line_check_random():
+    # Fields the check matches must be read without error.
+    rnd = random.Random(0)
+    chars = ' 0123456789' * 3 + '.+-EeDdx'
+    for format in FORMATS[:3]:
+        layout = fastformat.field_layout(format)
+        width = max(f.start + f.width for f in layout)
+        reader = fastformat.compile_reader(format)
+        for i, field in enumerate(layout):
+            check = fastformat.valid_line_check(layout, [i])
+            if field.kind == 'A':
+                assert check is None
+                continue
+            matched = 0
+            for j in range(1000):
+                line = ''.join(rnd.choice(chars) for k in range(width))
+                if check(line) is not None:
+                    matched += 1
+                    reader.field_readers[i](line)
+            assert matched > 50
+
+
+WRITE_FORMATS = FORMATS + ['(F6.0, F3.1, F4.2, I2, 3X)']
+
+
+def _write_outcome(write, values):
+    try:
+        return write(values)
+    except (TypeError, ValueError) as e:
+        return type(e)
+
+
+def _random_value(rnd, func):
+    if func is fastformat.write_str:
+        return rnd.choice(['ab', 'abcdefghij', '', None, 3])
+    elif func is fastformat.write_int:
+        return rnd.choice([rnd.randint(-10 ** 6, 10 ** 6), 3.7, -0.5, True,
+                           2 ** 60, None])
+    return rnd.choice([rnd.uniform(-1000, 1000), rnd.uniform(-1, 1),
+                       round(rnd.uniform(-10, 10), 3), rnd.randint(-5, 5) / 8.,
+                       0.0, -0.0, rnd.uniform(-1e-4, 1e-4), 1e20, 12345,
+                       -0.00049])
+
+
+def test_write_same_as_fortranformat_random():
+    rnd = random.Random(0)
+    for format in WRITE_FORMATS:
+        fast = fastformat.compile_writer(format)
+        assert isinstance(fast, fastformat.FastRecordWriter) == \
+            fastformat.COMPILED_WRITERS
+        slow = FortranRecordWriter(format)
+        fields = fastformat.writer_fields(format)
+        for i in range(1000):
+            values = [_random_value(rnd, func)
+                      for gap, func, args in fields]
+            assert _write_outcome(fast.write, values) == \
+                _write_outcome(slow.write, values)
+
+
+@pytest.mark.parametrize('value,expected', [
+    (0.125, '0.13'), (-0.004, '-.00' if fastformat._VERSION_2 else '0.00'),
+    (-0.0, '0.00'), (-0.005, '-.01'), (2.5, '2.50'), (123.4, '****')])
+@compiled_writers
+def test_write_float_ties(value, expected):
+    assert fastformat.write_float(value, 4, 2) == expected
+    assert FortranRecordWriter('(F4.2)').write([value]) == expected
+
+
+@compiled_writers
+def test_write_none():
+    format = '(I3, F5.2, E9.2, A3)'
+    fast = fastformat.compile_writer(format)
+    values = [None] * 4
+    if fastformat._VERSION_2:
+        assert fast.write(values) == '  0 0.00 0.00E+00   '
+    assert _write_outcome(fast.write, values) == \
+        _write_outcome(FortranRecordWriter(format).write, values)
+
+
+def test_untested_version_falls_back(monkeypatch):
+    monkeypatch.setattr(fastformat, 'COMPILED_READERS', False)
+    monkeypatch.setattr(fastformat, 'COMPILED_WRITERS', False)
+    assert isinstance(fastformat.compile_reader(FORMATS[0]),
+                      FortranRecordReader)
+    assert isinstance(fastformat.compile_writer(FORMATS[0]),
+                      FortranRecordWriter)
+
+
+def test_write_unsupported():
+    assert isinstance(fastformat.compile_writer('(I3, T1, A3)'),
+                      FortranRecordWriter)
+    assert isinstance(fastformat.compile_writer('(I3.2)'),
+                      FortranRecordWriter)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_grammar
+----------------------------------
+
+Tests for `grammar` module.
+"""
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import grammar
+
+
+@pytest.fixture()
+def deck(node):
+    branches = tdc.DataCardRepeat(
+        tdc.DataCardAlternates([node('NODE'), node('LINE'), node('LOAD')]),
+        tdc.DataCardFixedText('BLANK BRANCH'), name='BRANCHES')
+    return tdc.DataCardStack([
+        tdc.DataCardFixedText('BEGIN NEW DATA CASE'),
+        tdc.DataCardOptional(node('OPTS'), name='OPTS'),
+        branches,
+        tdc.DataCardRepeat(node('SRCE'), name='SOURCES'),
+        tdc.DataCardFixedText('BLANK SOURCE')])
+
+
+@pytest.fixture()
+def deck_lines():
+    return ['BEGIN NEW DATA CASE',
+            'OPTS   1    0.50',
+            'NODE   2    1.00',
+            'LOAD   3    2.50',
+            'LINE   4    3.00',
+            'BLANK BRANCH',
+            'SRCE   5    4.00',
+            'SRCE   6    5.00',
+            'BLANK SOURCE']
+
+
+def test_compile_no_ambiguities(deck):
+    g = grammar.compile_grammar(deck, strict=True)
+    assert g.ambiguities == []
+
+
+def test_parse_same_as_card(deck, deck_lines):
+    g = grammar.compile_grammar(deck)
+    assert g.parse(deck_lines) == deck._parse(deck_lines)
+    lines = deck_lines[:1] + deck_lines[2:]
+    assert g.parse(lines) == deck._parse(lines)
+
+
+def test_read(deck, deck_lines):
+    g = grammar.compile_grammar(deck)
+    assert g.read(deck_lines) == 9
+    assert [d['N'] for d in deck.data['BRANCHES']] == [2, 3, 4]
+    assert deck._datalines[2]._datalines[1].dl_matched \
+        is deck._datalines[2]._datalines[1].alt_list[2]
+    assert [d['X'] for d in deck.data['SOURCES']] == [4.0, 5.0]
+    assert deck.data['OPTS']['N'] == 1
+
+
+def test_parse_no_trials(deck, deck_lines, monkeypatch):
+    alts = deck._datalines[2]._repeated_record
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Alternate should not be tried')
+    for dl in alts.alt_list[:2]:
+        monkeypatch.setattr(dl, '_parse', fail)
+    g = grammar.compile_grammar(deck)
+    assert g.parse(deck_lines[:2] + ['LOAD   3    2.50'] * 3
+                   + deck_lines[5:])[0] == 9
+
+
+def test_parse_commits(deck, deck_lines):
+    g = grammar.compile_grammar(deck)
+    lines = list(deck_lines)
+    lines[3] = 'LOAD  xx    2.50'
+    with pytest.raises(ValueError):
+        g.parse(lines)
+
+
+def test_ambiguous_alternates(node):
+    card = tdc.DataCardAlternates([
+        node('NODE'), tdc.DataCardFixedText('NODE'),
+        tdc.DataCardFixedText('NODE   1'), tdc.DataCard('(I8)', ['N']),
+        tdc.DataCardFixedText('LINE')])
+    g = grammar.compile_grammar(card)
+    assert sorted((a.kind, a.message) for a in g.ambiguities) == [
+        ('overlap', 'alternates 0 and 1 can start with the same line'),
+        ('overlap', 'alternates 0 and 2 can start with the same line'),
+        ('unknown', 'alternate 3 has no fixed text')]
+    # Undecided choices are parsed by trial.
+    assert g.parse(['NODE   1'], 0) == (
+        1, (0, (['NODE', 1, None], 'NODE   1')))
+    with pytest.raises(ValueError):
+        grammar.compile_grammar(card, strict=True)
+
+
+def test_ambiguous_repeat(node):
+    card = tdc.DataCardStack([
+        tdc.DataCardRepeat(tdc.DataCard('(I8)', ['N']), name='ROWS'),
+        tdc.DataCardOptional(node('NODE'))])
+    g = grammar.compile_grammar(card)
+    assert [(a.path, a.kind) for a in g.ambiguities] == [
+        ('DataCardStack/ROWS', 'unknown')]
+    lines = ['       1', '       2', 'NODE   1']
+    assert g.parse(lines) == card._parse(lines)
+
+
+def test_overlaps():
+    def first(*conds):
+        return grammar.First(frozenset([conds]), False, False)
+    assert grammar.overlaps(first((0, 4, 'NODE')), first((4, 4, 'LINE')))
+    assert not grammar.overlaps(first((0, 4, 'NODE')),
+                                first((0, 4, 'LINE')))
+    assert not grammar.overlaps(first((0, None, 'END')),
+                                first((4, 4, 'LINE')))
+    assert grammar.overlaps(first((0, None, 'END')), first((0, 5, 'END')))
+    assert not grammar.overlaps(first((0, None, 'END')),
+                                first((0, None, 'END2')))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_incremental
+----------------------------------
+
+Tests for `incremental` module.
+"""
+
+import random
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards.incremental import IncrementalParser
+
+
+@pytest.fixture()
+def deck_card(keyed):
+    def deck_card(end=True):
+        row = tdc.DataCardAlternates([
+            keyed('NODE'),
+            keyed('LINE', 'L'),
+            tdc.DataCardStack([keyed('PAIR', 'P'),
+                               tdc.DataCard('(I8)', ['Q'])]),
+        ])
+        return tdc.DataCardStack([
+            tdc.DataCardFixedText('BEGIN'),
+            tdc.DataCardRepeat(row, tdc.DataCardFixedText('END')
+                               if end else None),
+            tdc.DataCardOptional(keyed('TAIL', 'T')),
+        ])
+    return deck_card
+
+
+POOL = ['NODE   1', 'NODE   2', 'LINE   3', 'PAIR   4', '       5',
+        'END', 'TAIL   6', 'BEGIN', 'JUNK']
+
+
+def make_lines(n):
+    lines = ['BEGIN']
+    for i in range(n):
+        if i % 7 == 3:
+            lines += ['PAIR%4d' % i, '%8d' % i]
+        else:
+            lines.append('NODE%4d' % i)
+    return lines + ['END', 'TAIL   1']
+
+
+def full_parse(card, lines, start=0):
+    try:
+        return card._parse(lines, start)
+    except ValueError:
+        return None
+
+
+@pytest.mark.parametrize('end', [True, False])
+def test_random_edits_match_full_parse(deck_card, end):
+    rng = random.Random(1)
+    card = deck_card(end)
+    lines = make_lines(40)
+    p = IncrementalParser(card, lines)
+    for _ in range(300):
+        start = rng.randint(0, len(p.lines))
+        stop = min(len(p.lines), start + rng.choice([0, 0, 1, 1, 2, 3]))
+        new = [rng.choice(POOL) for _ in range(rng.choice([0, 1, 1, 2]))]
+        lines = p.lines[:start] + new + p.lines[stop:]
+        expected = full_parse(card, lines)
+        if expected is None:
+            with pytest.raises(ValueError):
+                p.replace(start, stop, new)
+            p = IncrementalParser(card, make_lines(rng.randint(0, 40)))
+        else:
+            assert p.replace(start, stop, new) == expected
+            assert p.lines == lines
+
+
+def test_edit_parses_few_cards(deck_card):
+    card = deck_card()
+    p = IncrementalParser(card, make_lines(10000))
+    assert p.parsed > 10000
+    p.replace(5000, 5001, ['LINE   7'])
+    assert p.parsed < 10
+    p.insert(200, ['PAIR   1', '       2'])
+    assert p.parsed < 10
+    p.delete(9000, 9001)
+    assert p.parsed < 10
+    assert p.parse() == card._parse(p.lines)
+
+
+def test_edit_outside_parsed_lines(keyed):
+    card = keyed('NODE')
+    p = IncrementalParser(card, ['xx', 'NODE   1', 'yy'], start=1)
+    p.delete(0, 1)
+    assert p.start == 0 and p.parsed == 0
+    p.replace(1, 2, ['zz'])
+    assert p.parsed == 0
+    p.replace(0, 1, ['NODE   2'])
+    assert p.read() == 1
+    assert card.data['N'] == 2
+
+
+def test_read_applies_result(deck_card):
+    card = deck_card()
+    p = IncrementalParser(card, make_lines(3))
+    p.insert(1, ['LINE   9'])
+    assert p.read() == len(p.lines)
+    assert card._datalines[1].data[0]['L'] == 9
+    assert card.data['T'] == 1
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_lazy
+----------------------------------
+
+Tests for lazy reading and the `lazy` module.
+"""
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards.lazy import LazyData
+
+
+LINE = '  3  0.0   .1357 0   .3959    1.18TESTTEXTFIXEDRIGHT'
+
+
+@pytest.fixture()
+def tc_lazy(make_row):
+    return make_row(lazy=True)
+
+
+def test_lazy_same_as_eager(make_row, row_fields, tc_lazy):
+    eager = make_row()
+    eager.read([LINE])
+    tc_lazy.read([LINE])
+    assert isinstance(tc_lazy.data, LazyData)
+    assert tc_lazy.data == eager.data
+    assert list(tc_lazy.data) == row_fields
+
+
+def test_lazy_decodes_on_access(tc_lazy):
+    tc_lazy.read([LINE])
+    assert tc_lazy.data.is_decoded('FIXED')
+    assert not tc_lazy.data.is_decoded('RESIS')
+    assert tc_lazy.data['RESIS'] == 0.1357
+    assert tc_lazy.data.is_decoded('RESIS')
+    assert not tc_lazy.data.is_decoded('REACT')
+
+
+def test_lazy_fixed_fields_checked(tc_lazy):
+    assert tc_lazy.match([LINE.replace('RIGHT', 'WRONG')]) is False
+
+
+@pytest.mark.parametrize('value', [
+    'xxxxx', '1.2.3', '-.   ', '  -  ', '    .', ' 1+2 ', '1.5d2', ' 1e  ',
+    '1_000', '+    ', '  nan', ' 12  '])
+def test_lazy_matches_like_eager(make_row, tc_lazy, value):
+    eager = make_row()
+    for line in [LINE.replace('.1357', value), LINE.replace(' 0 ', value[:3]),
+                 LINE[:14].replace('.13', value[:3])]:
+        assert tc_lazy.match([line]) is eager.match([line])
+
+
+def test_lazy_rows_end_like_eager(node):
+    def rows(lazy):
+        return tdc.DataCardRepeat(node(lazy=lazy))
+    lines = ['NODE   1  1.50', 'NODE   2  2.50', 'NODE  x3  3.50']
+    eager, lazy = rows(False), rows(True)
+    assert lazy.read(lines) == eager.read(lines) == 2
+    assert lazy.data == eager.data
+
+
+def test_lazy_mapping():
+    data = LazyData(('A', 'B'), {'A': 1}, {'B': lambda line: line * 2}, 'x')
+    assert 'B' in data and 'C' not in data
+    data['C'] = 3
+    del data['A']
+    assert dict(data) == {'B': 'xx', 'C': 3}
+    assert len(data) == 2
+    with pytest.raises(KeyError):
+        data['A']
+
+
+def test_lazy_stack_and_repeat(keyed, node):
+    card = tdc.DataCardStack([
+        keyed('HEAD', 'COUNT', lazy=True),
+        tdc.DataCardRepeat(node(lazy=True), tdc.DataCardFixedText('END'),
+                           name='ROWS')])
+    card.read(['HEAD   2', 'NODE   1    0.50', 'NODE   2    1.50', 'END'])
+    assert not card.data.is_decoded('COUNT')
+    assert card.data['COUNT'] == 2
+    assert [d['N'] for d in card.data['ROWS']] == [1, 2]
+    assert card.write().split('\n')[:2] == ['HEAD   2', 'NODE   1    0.50']
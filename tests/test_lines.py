@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_lines
+----------------------------------
+
+Tests for `text_data_cards.lines` module.
+"""
+
+import pytest
+
+
+from text_data_cards.lines import LineStream, MappedLines, text_or
+
+
+def test_LineStream_index():
+    s = LineStream(iter(['a\n', 'b\r\n', 'c']))
+    assert s[1] == 'b'
+    assert s[0] == 'a'
+    assert s[2] == 'c'
+    with pytest.raises(IndexError):
+        s[3]
+
+
+def test_LineStream_release():
+    s = LineStream(iter(['a', 'b', 'c']))
+    s[1]
+    assert s.buffered() == 2
+    s.advance(2)
+    assert s.pos == 2
+    assert s.buffered() == 0
+    assert s[2] == 'c'
+    with pytest.raises(IndexError):
+        s[1]
+
+
+@pytest.fixture()
+def mapped(tmpdir):
+    p = tmpdir.join('deck.dat')
+    p.write_binary(b'NODE   1    0.50\r\nEND\n\nNODE   2\n  last')
+    with MappedLines(str(p)) as lines:
+        yield lines
+
+
+def test_MappedLines_index(mapped):
+    assert len(mapped) == 5
+    assert [str(line) for line in mapped[:]] == \
+        ['NODE   1    0.50', 'END', '', 'NODE   2', '  last']
+    assert mapped[-1] == '  last'
+    with pytest.raises(IndexError):
+        mapped[5]
+
+
+def test_LineView(mapped):
+    line = mapped[0]
+    assert line[4:8] == '   1'
+    assert line[12:] == '0.50'
+    assert line[14:30] == '50'
+    assert line[20:24] == ''
+    assert len(line) == 16
+    assert '\r' not in line
+    assert 'E  ' in line
+    assert mapped[1] == 'END' and mapped[1] != 'END '
+
+
+def test_MappedLines_read(mapped):
+    from text_data_cards import DataCard, DataCardFixedText, DataCardRepeat
+    card = DataCardRepeat(DataCard('(A4, I4, F8.2)', ['NODE', 'N', 'X'],
+                                   fixed_fields=(0,)),
+                          DataCardFixedText('END'))
+    assert card.read(mapped) == 2
+    assert card.data == [{'NODE': 'NODE', 'N': 1, 'X': 0.5}]
+    # Formats that aren't compiled are read by fortranformat.
+    other = DataCard('(A4, T5, I4)', ['NODE', 'N'], fixed_fields=(0,))
+    other.read(mapped, start=3)
+    assert other.data['N'] == 2
+
+
+def test_text_or_closed(tmpdir):
+    from text_data_cards import DataCard, DataCardRepeat
+    p = tmpdir.join('deck.dat')
+    p.write_binary(b'NODE   1    0.50\nNODE   2    1.00\n')
+    lines = MappedLines(str(p))
+    card = DataCardRepeat(DataCard('(A4, I4, F8.2)', ['NODE', 'N', 'X'],
+                                   fixed_fields=(0,)), compact=True)
+    single = DataCard('(A4, I4, F8.2)', ['NODE', 'N', 'X'],
+                      fixed_fields=(0,))
+    card.read(lines)
+    single.read(lines)
+    line = lines[0]
+    assert text_or(line) == 'NODE   1    0.50'
+    lines.close()
+    assert text_or(line, 'closed') == 'closed'
+    assert text_or('NODE') == 'NODE'
+    # Cards fall back to formatting their data.
+    assert single.write() == 'NODE   1    0.50'
+    assert card.write().split('\n') == ['NODE   1    0.50',
+                                        'NODE   2    1.00']
+
+
+def test_MappedLines_empty(tmpdir):
+    p = tmpdir.join('empty.dat')
+    p.write_binary(b'')
+    with MappedLines(str(p)) as lines:
+        assert len(lines) == 0
+
+
+def test_scan_newlines_without_numpy(monkeypatch):
+    from text_data_cards import lines
+    buf = b'a\nbb\n\nc'
+    expected = list(lines._scan_newlines(buf, len(buf)))
+    monkeypatch.setattr(lines, 'np', None)
+    assert list(lines._scan_newlines(buf, len(buf))) == expected == \
+        [1, 4, 5, 7]
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_literals
+----------------------------------
+
+Tests for `literals` module and fixed text cards.
+"""
+
+import pickle
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import grammar, literals
+
+
+def test_LiteralIndex_lookup():
+    index = literals.LiteralIndex([
+        ((0, None, 'BLANK'), 'blank'),
+        ((0, 8, '$INCLUDE'), 'include'),
+        ((0, 2, 'C'), 'comment'),
+        ((0, 2, 'C'), 'comment2'),
+        ((8, 4, 'ABC'), 'cols'),
+    ])
+    assert len(index) == 5
+    assert index.lookup('BLANK') == ['blank']
+    assert index.lookup('BLANK ') == []
+    assert index.lookup('$INCLUDE  file.lib') == ['include']
+    assert index.lookup('C') == ['comment', 'comment2']
+    assert index.lookup('C comment') == ['comment', 'comment2']
+    assert index.lookup('CX') == []
+    assert index.lookup('xxxxxxxxABC ') == ['cols']
+    assert index.lookup('xxxxxxxxABC') == ['cols']
+    index.add((0, 2, 'ABC'), 'too wide')
+    assert len(index) == 5
+    assert index.lookup('ABC') == []
+
+
+def test_alternate_wider_than_field():
+    card = tdc.DataCardAlternates([
+        tdc.DataCard('(A2,I2)', ['ABC', 'N'], fixed_fields=(0,)),
+        tdc.DataCard('(A2,I2)', ['AB', 'N'], fixed_fields=(0,))])
+    assert card._candidates(['ABC'], 0) == [1]
+    card.read(['AB 1'])
+    assert card.dl_matched is card.alt_list[1]
+    with pytest.raises(ValueError):
+        card.read(['AC 1'])
+    g = grammar.compile_grammar(card)
+    assert g.parse(['AB 1']) == card._parse(['AB 1'])
+
+
+def test_literal_test():
+    assert literals.literal_test([]) is None
+    test = literals.literal_test([(0, 4, 'NODE'), (10, None, 'END')])
+    assert test('NODE      END')
+    assert not test('NODE      END ')
+    assert pickle.loads(pickle.dumps(test))('NODE      END')
+
+
+def test_FixedText_prefix_and_columns():
+    include = tdc.DataCardFixedText('$INCLUDE', prefix=True)
+    request = tdc.DataCardFixedText('POCKET', columns=(4, 14))
+    assert include.match(['$INCLUDE, file.lib'])
+    assert not include.match(['$INCLUD'])
+    assert request.match(['    POCKET    CALCULATOR'])
+    assert not request.match(['   POCKET'])
+    assert include._discriminators() == [(0, 8, '$INCLUDE')]
+    assert request._discriminators() == [(4, 10, 'POCKET')]
+    include.read(['$INCLUDE, file.lib'])
+    assert include.write() == '$INCLUDE, file.lib'
+    assert request.write() == '    POCKET'
+    with pytest.raises(ValueError):
+        tdc.DataCardFixedText('TOO LONG', columns=(0, 3))
+
+
+@pytest.fixture()
+def keywords(keyed):
+    return tdc.DataCardAlternates([
+        tdc.DataCardFixedText('BEGIN NEW DATA CASE'),
+        tdc.DataCardFixedText('BLANK'),
+        tdc.DataCardFixedText('$INCLUDE', prefix=True),
+        tdc.DataCardFixedText('C ', prefix=True),
+        keyed('NODE'),
+    ])
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('BEGIN NEW DATA CASE', [0]), ('BLANK', [1]),
+    ('$INCLUDE  file.lib', [2]), ('C a comment', [3]), ('C', [3]),
+    ('NODE   1', [4]), ('BLANKS', [])])
+def test_alternates_keyword_candidates(keywords, line, expected):
+    assert keywords._candidates([line], 0) == expected
+
+
+def test_grammar_prefix_keywords(keywords):
+    g = grammar.compile_grammar(keywords, strict=True)
+    for line in ['BLANK', '$INCLUDE  file.lib', 'C a comment', 'NODE   1']:
+        assert g.parse([line]) == keywords._parse([line])
+
+
+def test_repeat_prefix_end_record(keyed):
+    card = tdc.DataCardRepeat(keyed('NODE'),
+                              tdc.DataCardFixedText('BLANK', prefix=True))
+    lines = ['NODE   1', 'NODE   2', 'BLANK card ending nodes', 'NODE   3']
+    assert card.read(lines) == 3
+    assert [d['N'] for d in card.data] == [1, 2]
+    assert card.write().split('\n') == lines[:3]
+
+
+def test_read_columns_prefix_end_record(keyed):
+    pytest.importorskip('numpy')
+    card = tdc.DataCardRepeat(keyed('NODE'),
+                              tdc.DataCardFixedText('BLANK', prefix=True))
+    table = card.read_columns(['NODE   1', 'NODE   2', 'BLANK nodes'])
+    assert table.num_lines == 3
+    assert table['N'].tolist() == [1, 2]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_parallel
+----------------------------------
+
+Tests for `parallel` module.
+"""
+
+import concurrent.futures
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import parallel
+
+
+@pytest.fixture()
+def hooked(node):
+    """ Builds nodes with a post read hook that can't be pickled. """
+    def hooked(text='NODE'):
+        return node(text, post_read_hook=lambda c: None)
+    return hooked
+
+
+@pytest.fixture()
+def deck(hooked):
+    return tdc.DataCardStack([
+        tdc.DataCardFixedText('BEGIN'),
+        tdc.DataCardRepeat(hooked(), tdc.DataCardFixedText('BLANK'),
+                           name='NODES'),
+        tdc.DataCardRepeat(hooked('SRCE'), hooked('STOP'), name='SOURCES'),
+        tdc.DataCardRepeat(hooked('LOAD'), name='LOADS')])
+
+
+def deck_lines(n):
+    return (['BEGIN']
+            + ['NODE%4d%8.2f' % (i, i / 4.0) for i in range(n)]
+            + ['BLANK']
+            + ['SRCE%4d%8.2f' % (i, 1.0) for i in range(n)]
+            + ['STOP   0    0.00']
+            + ['LOAD%4d%8.2f' % (i, 2.0) for i in range(n)]
+            + ['OTHER'])
+
+
+@pytest.fixture()
+def executor():
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize('n', [0, 5, 10, 11, 37])
+def test_same_as_serial(deck, executor, n):
+    lines = deck_lines(n)
+    assert parallel.parallel_parse(deck, lines, executor=executor,
+                                   chunk_size=4) == deck._parse(lines)
+
+
+def test_error_in_chunk(deck, executor):
+    lines = deck_lines(30)
+    lines[20] = 'NODE  xx    1.00'
+    with pytest.raises(ValueError) as e:
+        parallel.parallel_parse(deck, lines, executor=executor,
+                                chunk_size=4)
+    assert (e.value.line_number, e.value.card, e.value.field) == \
+        (20, 'NODES', 'N')
+
+
+def test_end_of_input(deck, executor):
+    lines = deck_lines(30)[:20]
+    assert parallel.parallel_parse(deck, lines, executor=executor,
+                                   chunk_size=4) == deck._parse(lines)
+
+
+@pytest.mark.parametrize('end,end_line', [
+    (tdc.DataCardFixedText('BLANK'), 'BLANK'),
+    (tdc.DataCardFixedText('BLANK', prefix=True), 'BLANK CARD'),
+    (tdc.DataCardFixedText('BLANK', columns=(2, 8)), '  BLANK  '),
+    ('STOP', 'STOP   0    0.00')])
+def test_only_block_submitted(executor, hooked, end, end_line):
+    # A str end is the text of a node ending the rows.
+    if isinstance(end, str):
+        end = hooked(end)
+    card = tdc.DataCardRepeat(hooked(), end)
+    lines = ['NODE%4d%8.2f' % (i, 1.0) for i in range(40)] + [end_line] + \
+        ['NODE   0    0.00'] * 400
+    submitted = []
+    submit = executor.submit
+
+    def counted(func, row, end, chunk):
+        submitted.append(len(chunk))
+        return submit(func, row, end, chunk)
+    executor.submit = counted
+    assert parallel.parallel_parse(card, lines, executor=executor,
+                                   chunk_size=8) == card._parse(lines)
+    assert sum(submitted) == 41
+
+
+def test_read_process_pool(deck):
+    lines = deck_lines(50)
+    expected = deck._new_record()
+    expected.read(lines)
+    assert parallel.parallel_read(deck, lines, max_workers=2,
+                                  chunk_size=10) == len(lines) - 1
+    assert deck.data == expected.data
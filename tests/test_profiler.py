@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_profiler
+----------------------------------
+
+Tests for `profiler` module.
+"""
+
+import json
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import profiler
+
+
+@pytest.fixture()
+def deck(keyed):
+    row = tdc.DataCardAlternates([keyed('NODE', name='NODE'),
+                                  keyed('LINE', name='LINE')])
+    return tdc.DataCardStack([
+        tdc.DataCardOptional(keyed('HEAD', name='HEAD')),
+        tdc.DataCardRepeat(row, tdc.DataCardFixedText('END'), name='ROWS'),
+    ])
+
+
+LINES = ['NODE   1', 'LINE   2', 'LINE   3', 'END']
+
+
+def test_profiling_counts(deck):
+    with profiler.profiling() as prof:
+        assert deck.read(LINES) == 4
+    stats = prof.stats()
+    assert stats['DataCardStack']['read.calls'] == 1
+    assert stats['DataCardStack']['lines'] == 4
+    assert stats['DataCardRepeat:ROWS']['parse.calls'] == 1
+    # The optional card tried HEAD and failed.
+    assert stats['DataCardOptional']['failed_trials'] == 1
+    assert stats['DataCard:HEAD']['parse.failed'] == 1
+    # LINE is indexed by its fixed text, so it is never tried on NODE.
+    assert stats['DataCard:LINE']['parse.calls'] == 2
+    assert stats['DataCard:LINE'].get('parse.failed', 0) == 0
+    # The end record is only parsed on the line with its text.
+    assert stats['DataCardFixedText']['parse.calls'] == 1
+    assert stats['DataCardAlternates']['new_record.calls'] == 3
+    assert stats['DataCardStack']['parse.time'] >= \
+        stats['DataCardStack']['self_time'] >= 0
+
+    by_class = prof.stats('class')
+    assert by_class['DataCard']['parse.calls'] == \
+        sum(c['parse.calls'] for k, c in stats.items()
+            if k.startswith('DataCard:'))
+    assert json.loads(prof.to_json('class')) == by_class
+    report = prof.report()
+    assert report.splitlines()[0].split()[:3] == ['card', 'read', 'match']
+    assert 'DataCardRepeat:ROWS' in report
+
+
+def test_profiling_copies_and_writes(deck, keyed):
+    with profiler.profiling() as prof:
+        tdc.DataCardStack([keyed('NODE', name='NODE'),
+                           keyed('LINE', name='LINE')])
+        deck.read(LINES)
+        deck.write()
+    stats = prof.stats()
+    assert stats['DataCard:NODE']['deepcopies'] == 1
+    # Nested blocks are written line by line into the deck's output.
+    assert stats['DataCardStack']['write.calls'] == 1
+    assert stats['DataCard:LINE']['write.calls'] == 2
+
+
+def test_profiling_restores_methods(deck):
+    parse = tdc.DataCard._parse
+    prof = profiler.Profiler()
+    prof.enable()
+    assert tdc.DataCard._parse is not parse
+    with pytest.raises(RuntimeError):
+        profiler.Profiler().enable()
+    prof.disable()
+    assert tdc.DataCard._parse is parse
+    assert tdc.copy.deepcopy is profiler.copy.deepcopy
+    deck.read(LINES)
+    assert prof.stats() == {}
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_shared
+----------------------------------
+
+Tests for `shared` module.
+"""
+
+import concurrent.futures
+import os
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('multiprocessing.shared_memory')
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import shared
+
+
+@pytest.fixture()
+def deck(node):
+    card = tdc.DataCardStack([
+        tdc.DataCard('(A4, I6, F10.3)', ['CASE', 'STEPS', 'DT'],
+                     fixed_fields=(0,)),
+        tdc.DataCardRepeat(node(tag=True), tdc.DataCardFixedText('BLANK'),
+                           name='NODES'),
+        tdc.DataCardRepeat(tdc.DataCardAlternates([node('SRCE', tag=True),
+                                                   node('LOAD', tag=True)]))])
+    card.read(['CASE    20     0.125']
+              + ['NODE%4d%8.2f%-6s' % (i, i / 4.0, 'T%d' % i)
+                 for i in range(50)]
+              + ['BLANK', 'SRCE   1    1.00  abc', 'LOAD   2    2.00'])
+    return card
+
+
+def total(handle):
+    with shared.attach(handle) as deck:
+        nodes = deck.tables['NODES']
+        result = (float(nodes['X'].sum()), int(nodes['N'][-1]),
+                  deck.data['DT'])
+        # The block can't be closed while its columns are referenced.
+        del nodes
+    return result
+
+
+def test_publish(deck):
+    with shared.publish(deck) as published:
+        assert published.owner
+        assert published.data == {'CASE': 'CASE', 'STEPS': 20, 'DT': 0.125}
+        nodes = published.tables['NODES']
+        assert nodes.fields == ['NODE', 'N', 'X', 'TAG']
+        assert (nodes.nrows, nodes.num_lines) == (50, 51)
+        assert nodes['N'].dtype == np.int64
+        assert nodes['X'].dtype == np.float64
+        assert nodes['X'][4] == 1.0
+        assert nodes['TAG'][3] == 'T3    '
+        assert nodes.row(2) == deck.data['NODES'][2]
+        with pytest.raises(ValueError):
+            nodes['N'][0] = 1
+        del nodes
+
+
+def test_alternate_rows_are_masked(deck):
+    with shared.publish(deck) as published:
+        rows = published.tables['table1']
+        assert rows.fields == ['SRCE', 'N', 'X', 'TAG', 'LOAD']
+        assert rows['N'].tolist() == [1, 2]
+        assert rows['SRCE'].tolist() == ['SRCE', None]
+        assert rows['LOAD'].tolist() == [None, 'LOAD']
+        del rows
+
+
+def test_attach(deck):
+    with shared.publish(deck) as published:
+        with shared.attach(published.handle) as attached:
+            assert not attached.owner
+            assert attached.data == published.data
+            assert attached.tables['NODES']['TAG'].tolist() == \
+                published.tables['NODES']['TAG'].tolist()
+            x = attached.tables['NODES']['X']
+            block = np.frombuffer(attached._shm.buf, np.uint8)
+            assert np.shares_memory(x, block)
+            # Values written to the publisher's block show in the column.
+            offset = x.ctypes.data - block.ctypes.data
+            source = np.frombuffer(published._shm.buf, np.float64, 1, offset)
+            source[0] = 42.0
+            assert x[0] == 42.0
+            del x, block, source
+
+
+def test_attach_from_processes(deck):
+    with shared.publish(deck) as published:
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            results = list(executor.map(total, [published.handle] * 3))
+    assert results == [(sum(i / 4.0 for i in range(50)), 49, 0.125)] * 3
+
+
+def test_attach_from_processes_in_turn(deck):
+    # Processes that attach and exit mustn't unlink the block.
+    code = ('import sys\n'
+            'from text_data_cards import shared\n'
+            'with shared.attach(sys.argv[1]) as deck:\n'
+            '    print(int(deck.tables["NODES"].nrows))\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(shared.__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    published = shared.publish(deck)
+    for _ in range(2):
+        output = subprocess.check_output(
+            [sys.executable, '-c', code, published.handle.name], env=env)
+        assert output.strip() == b'50'
+    published.unlink()
+
+
+def test_duplicate_table_names(node):
+    card = tdc.DataCardStack([
+        tdc.DataCardRepeat(node(), tdc.DataCardFixedText('BLANK'),
+                           name='NODES'),
+        tdc.DataCardRepeat(node('LOAD'), name='NODES')])
+    card.read(['NODE   1    1.00', 'BLANK', 'LOAD   2    2.00'])
+    with pytest.raises(ValueError):
+        shared.publish(card)
+
+
+def test_int_out_of_range():
+    card = tdc.DataCardRepeat(
+        tdc.DataCard('(A4, I24)', ['NODE', 'N'], fixed_fields=(0,)),
+        name='NODES')
+    card.read(['NODE%24d' % 1, 'NODE%24d' % 10 ** 20])
+    with pytest.raises(ValueError) as e:
+        shared.publish(card)
+    assert "'N'" in str(e.value) and "'NODES'" in str(e.value)
+
+
+def test_close_with_columns_in_use(deck):
+    published = shared.publish(deck)
+    column = published.tables['NODES']['N']
+    with pytest.raises(BufferError):
+        published.close()
+    del column
+    published.close()
+    published.unlink()
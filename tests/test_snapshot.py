@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_snapshot
+----------------------------------
+
+Tests for `snapshot` module.
+"""
+
+import pytest
+
+from text_data_cards import text_data_cards as tdc
+from text_data_cards import load_snapshot, save_snapshot
+
+
+@pytest.fixture()
+def make_deck(node):
+    def make_deck(lazy=False):
+        return tdc.DataCardStack([
+            tdc.DataCardFixedText('BEGIN'),
+            tdc.DataCardOptional(tdc.DataCard('(A5, 1X, A20)',
+                                              ['TITLE', 'TEXT'],
+                                              fixed_fields=(0,))),
+            tdc.DataCardRepeat(
+                tdc.DataCardAlternates([
+                    node('NODE', tag=True, lazy=lazy),
+                    node('LINE', tag=True, lazy=lazy),
+                    tdc.DataCardFixedText('C', prefix=True)]),
+                tdc.DataCardFixedText('END')),
+            tdc.DataCard('(I4, 2X, F6.2)', ['LAST', 'Y']),
+        ])
+    return make_deck
+
+
+@pytest.fixture()
+def lines():
+    return ['BEGIN',
+            'TITLE a test deck',
+            'NODE   1   1.500 abc',
+            'LINE   2  -2.250',
+            'C a comment',
+            'NODE  30    .125 x',
+            'END',
+            '   7    1.00']
+
+
+@pytest.fixture()
+def path(tmpdir):
+    return str(tmpdir.join('deck.snap'))
+
+
+def test_round_trip(make_deck, lines, path):
+    card = make_deck()
+    card.read(lines)
+    save_snapshot(card, path)
+    loaded = load_snapshot(make_deck(), path)
+    assert loaded.write() == card.write() == '\n'.join(lines)
+    assert loaded.data == card.data
+    repeat = loaded._datalines[2]
+    assert [type(r.dl_matched.data) for r in repeat._datalines[:-1]] == \
+        [dict, dict, dict, dict]
+    assert repeat.data[1]['LINE'] == 'LINE'
+    assert repeat.data[1]['X'] == -2.25
+    assert not repeat._datalines[0].dl_matched.dirty
+
+
+def test_changed_cards_are_formatted(make_deck, lines, path):
+    card = make_deck()
+    card.read(lines)
+    card.data['LAST'] = 8
+    card._datalines[2].data[0]['N'] = 5
+    save_snapshot(card, path)
+    loaded = load_snapshot(make_deck(), path)
+    assert loaded.write() == card.write()
+    assert loaded.write().split('\n')[-1] == '   8    1.00'
+    assert loaded._datalines[2]._datalines[0].dl_matched.dirty
+
+
+def test_optional_not_matched(make_deck, lines, path):
+    card = make_deck()
+    del lines[1]
+    card.read(lines)
+    save_snapshot(card, path)
+    loaded = load_snapshot(make_deck(), path)
+    assert loaded._datalines[1].dl_matched is None
+    assert loaded.write() == card.write()
+    assert loaded.data == card.data
+
+
+def test_lazy_cards_stay_lazy(make_deck, lines, path):
+    card = make_deck(lazy=True)
+    card.read(lines)
+    card._datalines[2].data[3]['TAG'] = 'y'
+    save_snapshot(card, path)
+    loaded = load_snapshot(make_deck(lazy=True), path)
+    rows = loaded._datalines[2]._datalines
+    assert not rows[0].dl_matched.data.is_decoded('X')
+    assert rows[0].dl_matched.data['X'] == 1.5
+    assert rows[3].dl_matched.data['TAG'] == 'y'
+    assert loaded.write() == card.write()
+
+
+def test_post_read_hooks_run(make_deck, lines, path):
+    card = make_deck()
+    card.read(lines)
+    save_snapshot(card, path)
+    seen = []
+    loaded = make_deck()
+    loaded.post_read_hook = seen.append
+    load_snapshot(loaded, path)
+    assert seen == [loaded]
+
+
+def test_numeric_columns_are_packed(node, path):
+    card = tdc.DataCardRepeat(node(tag=True))
+    card.read(['NODE%4d%8.2f' % (i, i / 4.0) for i in range(100)])
+    save_snapshot(card, path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert b'NODE  99   24.75' in data
+    assert b'24.75' not in data.replace(b'NODE  99   24.75', b'')
+    assert load_snapshot(tdc.DataCardRepeat(node(tag=True)),
+                         path).data == card.data
+
+
+def test_unnamed_fields(path):
+    card = tdc.DataCard('(I4, 2X, F6.2)', ['LAST', None])
+    card.read(['   7    1.00'])
+    save_snapshot(card, path)
+    loaded = load_snapshot(
+        tdc.DataCard('(I4, 2X, F6.2)', ['LAST', None]), path)
+    assert loaded.data == {'LAST': 7}
+    assert loaded.write() == '   7    1.00'
+
+
+def test_other_layout_rejected(make_deck, node, lines, path):
+    card = make_deck()
+    card.read(lines)
+    save_snapshot(card, path)
+    with pytest.raises(ValueError):
+        load_snapshot(tdc.DataCardRepeat(node(tag=True)), path)
+
+
+def test_not_a_snapshot(make_deck, path):
+    with open(path, 'wb') as f:
+        f.write(b'NODE   1\n')
+    with pytest.raises(ValueError):
+        load_snapshot(make_deck(), path)
+    open(path, 'wb').close()
+    with pytest.raises(ValueError):
+        load_snapshot(make_deck(), path)
+
+
+def test_unread_alternates_rejected(node, path):
+    card = tdc.DataCardAlternates([node(tag=True), node('LINE', tag=True)])
+    with pytest.raises(ValueError):
+        save_snapshot(card, path)
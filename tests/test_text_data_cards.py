@@ -8,6 +8,9 @@ test_text_data_cards
 Tests for `text_data_cards` module.
 """
 
+import io
+import pickle
+
 import pytest
 
 
@@ -233,6 +236,286 @@ def test_DataCardAlt_match2(tc_opt, tt_fixed_text_match):
     assert tc_opt.num_lines() == 0
 
 
+# Non-mutating match
+def test_DataCard_match_no_side_effects(tc, tt_match, monkeypatch):
+    def no_deepcopy(*args, **kwargs):
+        raise AssertionError('match() should not copy the card')
+    monkeypatch.setattr(text_data_cards.copy, 'deepcopy', no_deepcopy)
+    assert tc.match(tt_match) is True
+    assert tc.data['IP'] is None
+
+
+def test_DataCard_parse_num_lines(tc_stack, tc_repeat, tc_opt,
+                                  tt_repeat_match):
+    assert tc_stack._parse(tt_match() + tt_fixed_text_match())[0] == 2
+    assert tc_repeat._parse(tt_repeat_match)[0] == 3
+    assert tc_opt._parse(tt_fixed_text_match())[0] == 0
+
+
+def test_DataCardAlt_parse_selects_index(tc_alt, tt_fixed_text_match):
+    n, (idx, r) = tc_alt._parse(tt_fixed_text_match)
+    assert n == 1
+    assert idx == 1
+
+
+def test_DataCardOptional_match_end_of_input(tc_opt):
+    assert tc_opt.match([]) is True
+    assert tc_opt.dl.match([]) is False
+
+
+# CardSchema
+def test_CardSchema_immutable(tc):
+    with pytest.raises(AttributeError):
+        tc._schema.format = '(A5)'
+
+
+def test_CardSchema_shared(tc_repeat, tt_repeat_match):
+    import copy
+    assert copy.deepcopy(tc_repeat)._repeated_record._schema \
+        is tc_repeat._repeated_record._schema
+    tc_repeat.read(tt_repeat_match)
+    rows = tc_repeat._datalines[:-1]
+    assert len(rows) == 2
+    assert rows[0]._schema is rows[1]._schema
+    assert rows[0].data is not rows[1].data
+
+
+def test_DataCardAlt_new_record(tc_alt, tt_match):
+    tc_alt.read(tt_match)
+    rec = tc_alt._new_record()
+    assert rec.dl_matched is rec.alt_list[0]
+    assert rec.data['IP'] is None
+    assert tc_alt.data['IP'] == 4
+
+
+@pytest.fixture()
+def tc_alt_keyed():
+    cards = [text_data_cards.DataCard('(A4, I4)', [name, 'N'],
+                                      fixed_fields=(0,))
+             for name in ('NODE', 'LINE', 'LOAD')]
+    return text_data_cards.DataCardAlternates(
+        cards + [text_data_cards.DataCardFixedText('END'),
+                 text_data_cards.DataCard('(I8)', ['N'])])
+
+
+def test_DataCardAlt_index_candidates(tc_alt_keyed):
+    assert tc_alt_keyed._candidates(['LOAD   7'], 0) == [2, 4]
+    assert tc_alt_keyed._candidates(['END'], 0) == [3, 4]
+    assert tc_alt_keyed._candidates(['LOA'], 0) == [4]
+    assert tc_alt_keyed._candidates([], 0) == [4]
+
+
+def test_DataCardAlt_parse_once(tc_alt_keyed, monkeypatch):
+    calls = []
+    for dl in tc_alt_keyed.alt_list:
+        orig = dl._parse
+        monkeypatch.setattr(dl, '_parse',
+                            lambda lines, start=0, orig=orig, dl=dl:
+                            calls.append(dl) or orig(lines, start))
+    assert tc_alt_keyed.read(['LINE  12']) == 1
+    assert calls == [tc_alt_keyed.alt_list[1]]
+    assert tc_alt_keyed.dl_matched is tc_alt_keyed.alt_list[1]
+    assert tc_alt_keyed.data['N'] == 12
+
+
+def test_DataCardAlt_matched_first(tc_alt_keyed):
+    tc_alt_keyed.read(['LINE  12'])
+    assert tc_alt_keyed._candidates(['LINE   1'], 0) == [1, 4]
+
+
+# Line offsets
+def test_DataCard_read_start(tc, tt_match):
+    assert tc.read(tt_fixed_text_match() + tt_match, start=1) == 1
+    assert tc.data['IP'] == 4
+
+
+@pytest.fixture()
+def tc_nested():
+    stack = text_data_cards.DataCardStack(
+        [tc_fixed_text(), text_data_cards.DataCardRepeat(
+            tc(), text_data_cards.DataCardFixedText('END'), name='ROWS')])
+    return text_data_cards.DataCardAlternates([tc(), stack])
+
+
+def test_DataCard_nested_start(tc_nested, tt_match):
+    lines = tt_match + tt_fixed_text_match() + tt_match * 3 + ['END']
+    assert tc_nested._parse(lines, 1)[0] == 5
+    assert tc_nested.read(lines, start=1) == 5
+    assert tc_nested.dl_matched is tc_nested.alt_list[1]
+    assert len(tc_nested.data['ROWS']) == 3
+    assert tc_nested.data['ROWS'][2]['IP'] == 4
+
+
+# Streaming
+def test_DataCardRepeat_iter_read(tc_repeat):
+    from text_data_cards.lines import LineStream
+    rows = 1000
+    max_buffered = [0]
+
+    def source():
+        for i in range(rows):
+            yield tt_match()[0] + '\n'
+            max_buffered[0] = max(max_buffered[0], stream.buffered())
+        yield tt_fixed_text_match()[0] + '\n'
+        yield 'TRAILING LINE\n'
+
+    stream = LineStream(source())
+    cards = list(tc_repeat.iter_read(stream))
+    assert len(cards) == rows + 1
+    assert cards[0].data['IP'] == 4
+    assert cards[0] is not cards[1]
+    assert cards[-1] is tc_repeat.end_record
+    assert tc_repeat.data == []
+    assert max_buffered[0] <= 2
+    assert stream.pos == rows + 1
+    assert stream[stream.pos] == 'TRAILING LINE'
+
+
+def test_DataCardStack_iter_read(tc_nested, tt_match):
+    stack = text_data_cards.DataCardStack([tc(), tc_nested])
+    lines = tt_match + tt_fixed_text_match() + tt_match * 3 + ['END']
+    cards = list(stack.iter_read(iter(lines)))
+    assert len(cards) == 2
+    assert stack.data['IP'] == 4
+    assert cards[1] is stack._datalines[1]
+
+
+# Writing to files
+def test_DataCardRepeat_write_to(tc_repeat, tt_repeat_match):
+    import io
+    tc_repeat.read(tt_repeat_match)
+    out = io.StringIO()
+    assert tc_repeat.write_to(out, chunk_size=2) == 3
+    assert out.getvalue() == tc_repeat.write() + '\n'
+
+
+# Round trip writing
+def plain_card():
+    return text_data_cards.DataCard('(A4, I4, F8.5)', ['NODE', 'N', 'X'],
+                                    fixed_fields=(0,))
+
+
+def test_DataCard_write_unmodified_verbatim():
+    lines = ['NODE   1   .1357', 'NODE   2 1.5E-01', 'END']
+    card = text_data_cards.DataCardRepeat(
+        plain_card(), text_data_cards.DataCardFixedText('END'))
+    card.read(lines)
+    assert not card._datalines[0].dirty
+    assert card.write() == '\n'.join(lines)
+    card.data[1]['N'] = 7
+    assert card._datalines[1].dirty and not card._datalines[0].dirty
+    assert card.write().split('\n') == [lines[0], 'NODE   7 0.15000',
+                                        'END']
+
+
+def test_DataCard_dirty_compares_values_read():
+    card = plain_card()
+    card.read(['NODE   1    nan'])
+    assert not card.dirty
+    card.data['N'] = 2
+    assert card.dirty
+    card.data['N'] = 1
+    assert not card.dirty
+    card.data = {'NODE': 'NODE', 'N': 1}
+    assert card.dirty
+    card.read(['NODE   1   .1357'])
+    assert not card.dirty and card.write() == 'NODE   1   .1357'
+
+
+def test_DataCard_write_no_source():
+    card = plain_card()
+    card.read(['NODE   1   .1357'])
+    assert card._new_record().dirty
+    card.source = None
+    assert card.write() == 'NODE   1 0.13570'
+
+
+def test_DataCardStack_write_syncs_changed_fields():
+    lines = ['NODE   1   .1357', '  3  0.0   .1357 0   .3959    1.18'
+             'TESTTEXTFIXEDRIGHT']
+    stack = text_data_cards.DataCardStack([plain_card(), tc()])
+    stack.read(lines)
+    assert stack.write().split('\n')[0] == lines[0]
+    stack.data['X'] = 2.0
+    assert stack.write().split('\n')[0] == 'NODE   1 2.00000'
+    assert stack._datalines[0].data['X'] == 2.0
+
+
+def test_DataCardStack_write_skips_empty_cards():
+    card = text_data_cards.DataCardStack([
+        text_data_cards.DataCardFixedText('BEGIN'),
+        text_data_cards.DataCardOptional(plain_card()),
+        text_data_cards.DataCardRepeat(
+            text_data_cards.DataCard('(A4, I4)', ['LOAD', 'N'],
+                                     fixed_fields=(0,))),
+        text_data_cards.DataCardFixedText('BLANK')])
+    lines = ['BEGIN', 'BLANK']
+    card.read(lines)
+    assert card.write() == 'BEGIN\nBLANK'
+    out = io.StringIO()
+    assert card.write_to(out) == 2
+    assert out.getvalue() == card.write() + '\n'
+
+
+def test_lazy_DataCard_write_verbatim():
+    card = text_data_cards.DataCard('(A4, I4, F8.5)', ['NODE', 'N', 'X'],
+                                    fixed_fields=(0,), lazy=True)
+    card.read(['NODE   1   .1357  trailing comment'])
+    assert card.data['X'] == 0.1357
+    assert card.write() == 'NODE   1   .1357  trailing comment'
+    card.data['N'] = 1
+    assert card.dirty
+    assert card.write() == 'NODE   1 0.13570'
+
+
+def test_read_error_diagnostics(tc_repeat, tt_repeat_nomatch2):
+    tc_repeat.name = 'BRANCHES'
+    with pytest.raises(text_data_cards.ReadError) as e:
+        tc_repeat.read(['header'] + tt_repeat_nomatch2, start=1)
+    assert e.value.line_number == 2
+    assert e.value.card == 'BRANCHES'
+    assert e.value.field == 'RIGHT'
+    assert str(e.value) == ("Fixed field with wrong value: WRONG/RIGHT "
+                            "(line 2, card 'BRANCHES', field 'RIGHT')")
+    assert tc_repeat.data == []
+
+
+def test_read_error_field_that_cannot_be_read(tc):
+    tc.name = 'BRANCH'
+    line = '  3  0.0   .1357 X   .3959    1.18TESTTEXTFIXEDRIGHT'
+    with pytest.raises(ValueError) as e:
+        tc.read([line])
+    assert (e.value.line_number, e.value.card, e.value.field) == \
+        (0, 'BRANCH', 'IX')
+
+
+def test_read_error_named_by_enclosing_card(tc_stack, tt_stack_nomatch2):
+    tc_stack.name = 'STACK'
+    with pytest.raises(text_data_cards.ReadError) as e:
+        tc_stack.read(tt_stack_nomatch2)
+    assert (e.value.line_number, e.value.card, e.value.field) == \
+        (1, 'STACK', None)
+    with pytest.raises(text_data_cards.ReadError) as e:
+        tc_stack.read(tt_match())
+    assert e.value.message == 'Unexpected end of input'
+    assert e.value.line_number == 1
+
+
+def test_read_error_alternates(tc_alt, tt_nomatch):
+    tc_alt.name = 'ALT'
+    with pytest.raises(text_data_cards.ReadError) as e:
+        tc_alt.read(['x'] + tt_nomatch, start=1)
+    assert (e.value.line_number, e.value.card) == (1, 'ALT')
+
+
+def test_read_error_pickle(tc, tt_nomatch):
+    with pytest.raises(text_data_cards.ReadError) as e:
+        tc.read(tt_nomatch)
+    error = pickle.loads(pickle.dumps(e.value))
+    assert (error.line_number, error.field) == (0, 'RIGHT')
+    assert str(error) == str(e.value)
+
+
 # TODO
 # Coverage.py shows that tests are still needed for the following:
 # - DataCard.write()
@@ -4,8 +4,36 @@ __author__ = 'Paul David Brown'
 __email__ = 'pdb.lists@gmail.com'
 __version__ = '0.1.0'
 
-from .text_data_cards import DataCard, DataCardFixedText, \
-    DataCardStack, DataCardRepeat, DataCardAlternates, DataCardOptional
+from .text_data_cards import CardSchema, DataCard, DataCardFixedText, \
+    DataCardStack, DataCardRepeat, DataCardAlternates, DataCardOptional, \
+    ReadError
+from .lines import LineStream, LineView, MappedLines
+from .grammar import Ambiguity, Grammar, compile_grammar
+from .cache import ParseCache
+from .incremental import IncrementalParser
+from .profiler import Profiler, profiling
+from .snapshot import load_snapshot, save_snapshot
 
-__all__ = DataCard, DataCardFixedText, DataCardStack, DataCardRepeat, \
-          DataCardAlternates, DataCardOptional
+__all__ = ['CardSchema', 'DataCard', 'DataCardFixedText', 'DataCardStack',
+           'DataCardRepeat', 'DataCardAlternates', 'DataCardOptional',
+           'ReadError', 'LineStream', 'LineView', 'MappedLines', 'Ambiguity',
+           'Grammar', 'compile_grammar', 'ParseCache', 'IncrementalParser',
+           'Profiler', 'profiling', 'load_snapshot', 'save_snapshot']
+
+try:
+    from .parallel import parallel_parse, parallel_read
+    from .batch import FileResult, read_files
+except ImportError:  # pragma: no cover
+    # concurrent.futures needs Python 3.2, or the futures backport.
+    pass
+else:
+    __all__ += ['parallel_parse', 'parallel_read', 'FileResult',
+                'read_files']
+
+try:
+    from .aio import AsyncLineStream, LinesPending, aiter_read
+except SyntaxError:  # pragma: no cover
+    # Async generators need Python 3.6.
+    pass
+else:
+    __all__ += ['AsyncLineStream', 'LinesPending', 'aiter_read']
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+""" Read cards from an asyncio stream as its lines arrive.
+
+    aiter_read() is the asyncio counterpart of DataCard.iter_read(). Lines
+    are read from an asyncio.StreamReader, such as the stdout of a
+    subprocess or a socket, or from any async iterator of lines, into an
+    AsyncLineStream. Cards are parsed with their usual _parse() methods on
+    the lines already buffered. When a parse looks at a line that hasn't
+    arrived yet, the stream raises LinesPending instead of blocking; the
+    reader then waits until twice as many lines as the parse has looked at
+    are buffered, or the input ends, and parses that card again, so a card
+    of n lines is parsed O(log n) times. The rows of a DataCardRepeat are
+    parsed one at a time and yielded as soon as they are complete. The
+    lookahead of DataCardRepeat end records and the trial matching of
+    DataCardAlternates and DataCardOptional work unchanged, and the event
+    loop keeps running while the producer is slow.
+
+    Cards are yielded as in iter_read(): a simple card yields itself,
+    stacks yield their children's cards and DataCardRepeat yields each row
+    as a new card without storing it. Parsing a card never modifies it, so
+    a card is only populated once all of its lines have arrived.
+"""
+
+from .lines import LineStream
+from .text_data_cards import DataCardAlternates, DataCardRepeat, \
+    DataCardStack
+
+
+class LinesPending(Exception):
+    """ Raised by AsyncLineStream for a line that hasn't been received yet.
+    """
+
+    def __init__(self, idx):
+        Exception.__init__(self, 'Line %d has not been received yet' % idx)
+        self.idx = idx
+
+
+class AsyncLineStream(LineStream):
+    """ LineStream over an asyncio.StreamReader or an async iterator of
+        lines.
+
+        Indexing returns buffered lines only: a line that may still arrive
+        raises LinesPending, and a line past the end of the source raises
+        IndexError. await fill(idx) reads lines until line idx is buffered
+        or the source ends. Bytes are decoded with encoding.
+    """
+
+    def __init__(self, source, encoding='latin-1'):
+        LineStream.__init__(self, ())
+        self.encoding = encoding
+        if hasattr(source, 'readline'):
+            self._readline = source.readline
+            self._source = None
+        else:
+            self._readline = None
+            self._source = source.__aiter__()
+
+    def __getitem__(self, idx):
+        i = idx - self._base
+        if i < 0:
+            raise IndexError('Line %d has already been released' % idx)
+        if i < len(self._buf):
+            return self._buf[i]
+        if self._eof:
+            raise IndexError('Line %d is past the end of input' % idx)
+        raise LinesPending(idx)
+
+    async def _next(self):
+        """ Returns the next line of the source, or None at its end. """
+        if self._readline is not None:
+            line = await self._readline()
+            return line or None
+        try:
+            return await self._source.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    async def fill(self, idx):
+        """ Read lines until line idx is buffered or the source ends.
+            Returns True if line idx is available.
+        """
+        while idx - self._base >= len(self._buf):
+            if self._eof:
+                return False
+            line = await self._next()
+            if line is None:
+                self._eof = True
+                return False
+            if isinstance(line, bytes):
+                line = line.decode(self.encoding)
+            self._buf.append(line.rstrip('\r\n'))
+        return True
+
+
+async def _call(stream, func, *args, **kwargs):
+    """ Call func, which reads lines from stream beginning at stream.pos,
+        until it returns. Each time it needs a line that hasn't been
+        received, it is called again once the lines it has looked at are
+        buffered twice over.
+    """
+    start = stream.pos
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except LinesPending as e:
+            await stream.fill(2 * e.idx - start)
+
+
+async def _aiter_read(card, stream):
+    if isinstance(card, DataCardRepeat):
+        # Yield each row as a new card without adding it to data, as in
+        # DataCardRepeat._iter_read.
+        card.data = []
+        card._datalines = []
+        while await stream.fill(stream.pos):
+            if card.end_record is not None and await _call(
+                    stream, card.end_record.match, stream, stream.pos):
+                async for c in _aiter_read(card.end_record, stream):
+                    yield c
+                break
+            r = card._repeated_record._new_record()
+            if card.end_record is None \
+                    and not await _call(stream, r.match, stream, stream.pos):
+                break
+            async for c in _aiter_read(r, stream):
+                yield c
+        if card.post_read_hook is not None:
+            card.post_read_hook(card)
+    elif isinstance(card, DataCardStack) \
+            and not isinstance(card, DataCardAlternates):
+        for dl in card._datalines:
+            async for c in _aiter_read(dl, stream):
+                yield c
+            for f in dl._fields:
+                card.data[f] = dl.data[f]
+            if dl.name is not None:
+                card.data[dl.name] = dl.data
+        if card.post_read_hook is not None:
+            card.post_read_hook(card)
+    else:
+        n = await _call(stream, card.read, stream, start=stream.pos)
+        stream.advance(n)
+        yield card
+
+
+async def aiter_read(card, source, encoding='latin-1'):
+    """ Read card from an asyncio.StreamReader or async iterator of lines,
+        yielding cards as they are read, like card.iter_read(). Use it with
+        async for.
+
+        source may also be an AsyncLineStream, in which case reading starts
+        at source.pos and the stream is left positioned after the card.
+    """
+    if isinstance(source, AsyncLineStream):
+        stream = source
+    else:
+        stream = AsyncLineStream(source, encoding)
+    async for c in _aiter_read(card, stream):
+        yield c
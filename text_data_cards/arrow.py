@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+""" Export repeated blocks to Apache Arrow tables and Parquet files.
+
+    The Arrow schema of a block is derived from the format of its repeated
+    record: each named field becomes a column, typed by its edit
+    descriptor (I as int64, F, E, D, EN and ES as float64 and A as
+    string). read_arrow() decodes the block column by column with
+    columnar.read_columns(), without building a data dict per row, and
+    wraps the NumPy arrays in Arrow arrays; numeric columns without
+    missing values are not copied. Values that read as None become
+    nulls. Columns are named by str() of the field names, since fixed
+    fields may be named by an int or float value.
+
+    pyarrow (and NumPy) are optional dependencies, only needed for this
+    module.
+"""
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+from .columnar import read_columns
+from .fastformat import field_layout
+from .text_data_cards import DataCard, DataCardFixedText, DataCardRepeat
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is required for Arrow export. '
+                          'Install from pip: pip install pyarrow')
+
+
+def _arrow_type(kind):
+    if kind == 'I':
+        return pa.int64()
+    if kind == 'A':
+        return pa.string()
+    return pa.float64()
+
+
+def _record(card):
+    if isinstance(card, DataCardRepeat):
+        card = card._repeated_record
+    if not isinstance(card, DataCard) or isinstance(card, DataCardFixedText) \
+            or not hasattr(card, '_schema'):
+        raise TypeError('Arrow export requires a single-line DataCard or a '
+                        'DataCardRepeat of one')
+    return card
+
+
+def arrow_schema(card):
+    """ Returns the pyarrow.Schema of the rows of card, a single-line
+        DataCard or a DataCardRepeat of one, or None if its format isn't
+        made up of fixed-width fields, in which case the types are inferred
+        from the values.
+    """
+    _require_pyarrow()
+    schema = _record(card)._schema
+    layout = field_layout(schema.format)
+    if layout is None or len(layout) != len(schema.fields):
+        return None
+    return pa.schema([pa.field(str(f), _arrow_type(field.kind))
+                      for f, field in zip(schema.fields, layout)
+                      if f is not None])
+
+
+def _array(values, type):
+    """ Arrow array of a NumPy array or list of values. Arrays of dtype
+        object hold None for missing values.
+    """
+    if getattr(values, 'dtype', None) is not None \
+            and values.dtype.kind == 'O':
+        values = values.tolist()
+    return pa.array(values, type=type)
+
+
+def table_from_columns(columns, schema=None):
+    """ Returns a pyarrow.Table of a columnar.ColumnTable, typed by schema
+        if given.
+    """
+    _require_pyarrow()
+    arrays = []
+    for f in columns.fields:
+        type = None if schema is None else schema.field(str(f)).type
+        arrays.append(_array(columns[f], type))
+    if schema is None:
+        return pa.Table.from_arrays(arrays,
+                                    names=[str(f) for f in columns.fields])
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def read_arrow(card, lines, start=0):
+    """ Read the DataCardRepeat block beginning at lines[start] into a
+        pyarrow.Table with one column per named field of the repeated
+        record. See columnar.read_columns for how the block is found; the
+        end record is read into card.end_record, and the number of lines
+        consumed is stored as b'num_lines' in the table's schema metadata.
+    """
+    _require_pyarrow()
+    columns = read_columns(card, lines, start)
+    table = table_from_columns(columns, arrow_schema(card))
+    return table.replace_schema_metadata(
+        {b'num_lines': str(columns.num_lines).encode('ascii')})
+
+
+def record_batches(card, lines, start=0, batch_size=65536):
+    """ Read the block like read_arrow() and return it as a list of
+        pyarrow.RecordBatch of up to batch_size rows.
+    """
+    return read_arrow(card, lines, start).to_batches(batch_size)
+
+
+def table_from_data(card):
+    """ Returns a pyarrow.Table of the rows already read into card.data,
+        for a DataCardRepeat, or of the one row of a DataCard.
+    """
+    _require_pyarrow()
+    record = _record(card)
+    rows = card.data if isinstance(card, DataCardRepeat) else [card.data]
+    schema = arrow_schema(card)
+    names = [f for f in record._fields if f is not None]
+    arrays = [pa.array([row[f] for row in rows],
+                       type=None if schema is None
+                       else schema.field(str(f)).type)
+              for f in names]
+    if schema is None:
+        return pa.Table.from_arrays(arrays, names=[str(f) for f in names])
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(card, lines, path, start=0, **kwargs):
+    """ Read the block beginning at lines[start] with read_arrow() and write
+        it to a Parquet file. kwargs are passed to pyarrow.parquet's
+        write_table(). Returns the number of lines read.
+    """
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+    table = read_arrow(card, lines, start)
+    pq.write_table(table, path, **kwargs)
+    return int(table.schema.metadata[b'num_lines'])
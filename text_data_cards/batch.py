@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+""" Read many files with the same card layout on a pool of workers.
+
+    read_files() parses each file with a concurrent.futures pool of
+    processes or threads. The card layout is sent to each worker process
+    once, when it starts, and optionally compiled into a Grammar there, so
+    each file costs only its parse. Workers return parse results, which are
+    applied to a new record of the card in the calling process; the
+    records share the card's compiled schemas and post read hooks run as
+    usual.
+
+    A file that can't be read or parsed is reported in its result instead
+    of stopping the batch.
+"""
+
+import collections
+import concurrent.futures
+import glob
+import io
+import os
+
+from .grammar import compile_grammar
+
+
+FileResult = collections.namedtuple('FileResult',
+                                    'path card num_lines error')
+FileResult.__doc__ = """ Result of reading one file: a new record of the card
+    with the file's data and the number of lines read, or None for both and
+    the exception raised for the file in error.
+"""
+
+# Parser of the worker process, set by _init_worker.
+_worker = {}
+
+
+def _parser(card, grammar):
+    return compile_grammar(card).parse if grammar else card._parse
+
+
+def _init_worker(card, grammar):
+    _worker['parse'] = _parser(card, grammar)
+
+
+def read_lines(path, encoding=None):
+    """ Returns the lines of a file without line endings. """
+    with io.open(path, encoding=encoding) as f:
+        return [line.rstrip('\r\n') for line in f]
+
+
+def parse_file(path, encoding=None, parse=None):
+    """ Parse a file with parse, by default the worker's parser. Returns a
+        tuple of the (number of lines, result) tuple and None, or of None
+        and the exception raised.
+    """
+    if parse is None:
+        parse = _worker['parse']
+    try:
+        return parse(read_lines(path, encoding)), None
+    except Exception as e:
+        return None, e
+
+
+# Types of a single path, as opposed to a list of them.
+_PATH_TYPES = (str,) + ((os.PathLike,) if hasattr(os, 'PathLike') else ())
+
+
+def _expand(paths, pattern):
+    if isinstance(paths, _PATH_TYPES):
+        if os.path.isdir(paths):
+            return sorted(glob.glob(os.path.join(paths, pattern)))
+        return [paths]
+    return list(paths)
+
+
+def read_files(card, paths, pattern='*', processes=True, max_workers=None,
+               ordered=True, grammar=False, encoding=None):
+    """ Read each file with card and yield a FileResult for it.
+
+        paths is a list of file paths, a single file path or a directory,
+        in which case the files matching pattern are read in name order. processes selects a
+        process pool, which needs card to be picklable (for example, post
+        read hooks must be module-level functions), or a thread pool. If
+        grammar is True, each worker compiles card with compile_grammar().
+
+        Results are yielded in the order of paths if ordered is True,
+        otherwise as soon as each file is done.
+    """
+    paths = _expand(paths, pattern)
+    if processes:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(card, grammar))
+        parse = None
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers)
+        parse = _parser(card, grammar)
+
+    with pool:
+        futures = collections.OrderedDict(
+            (pool.submit(parse_file, path, encoding, parse), path)
+            for path in paths)
+        done = futures if ordered else \
+            concurrent.futures.as_completed(futures)
+        try:
+            for future in done:
+                path = futures[future]
+                parsed, error = future.result()
+                rec = None
+                n = None
+                if error is None:
+                    rec = card._new_record()
+                    try:
+                        rec._apply(parsed[1])
+                    except Exception as e:
+                        rec, error = None, e
+                    else:
+                        n = parsed[0]
+                yield FileResult(path, rec, n, error)
+        finally:
+            # Don't parse the remaining files if the caller stops early.
+            for future in futures:
+                future.cancel()
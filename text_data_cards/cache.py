@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+""" Cache of parse results keyed by the card layout and the lines parsed.
+
+    Parsing the same lines with the same layout always gives the same
+    result, so files that are read over and over, such as library include
+    files, only need to be parsed once. ParseCache stores the results
+    returned by a card's _parse() under the card's layout, the alternate
+    each DataCardAlternates tries first, and a hash of the lines the parse
+    looked at: the lines it consumed and any it looked ahead at to find
+    where the block ends, or the end of the input. The same block is found
+    again wherever it is in the input and whatever follows it, as long as
+    the lines looked ahead at are the same. A cached result is applied to
+    the card as if it had just been parsed, so post read hooks still run.
+
+    The cache can be saved to a pickle file and loaded again so that a new
+    process starts with the results of earlier runs. Only load cache files
+    you trust: unpickling can run arbitrary code.
+"""
+
+import collections
+import hashlib
+import os
+import pickle
+import weakref
+
+from .text_data_cards import DataCard, DataCardAlternates, \
+    DataCardFixedText, DataCardOptional, DataCardRepeat, DataCardStack, \
+    _has_line
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', 'hits misses evictions maxsize currsize lines')
+CacheInfo.__doc__ = """ Statistics of a ParseCache. currsize is the number of
+    cached results and lines the number of lines they were parsed from.
+"""
+
+
+def signature(card):
+    """ Returns a tuple describing the layout of card and everything in it.
+        Cards with equal signatures parse lines the same way.
+    """
+    name = type(card).__name__
+    if isinstance(card, DataCardOptional):
+        return (name, signature(card.dl))
+    elif isinstance(card, DataCardAlternates):
+        return (name, tuple(signature(dl) for dl in card.alt_list))
+    elif isinstance(card, DataCardRepeat):
+        return (name, signature(card._repeated_record),
+                None if card.end_record is None
+                else signature(card.end_record))
+    elif isinstance(card, DataCardStack):
+        return (name, tuple(signature(dl) for dl in card._datalines))
+    elif isinstance(card, DataCardFixedText):
+        return (name, card._fields[0], card.columns)
+    elif isinstance(card, DataCard):
+        schema = card._schema
+        return (name, schema.format, schema.fields, schema.fixed_fields,
+                card.lazy)
+    raise TypeError('Cannot cache results for %r' % card)
+
+
+def _state(card, state):
+    """ Append to state the index of the alternate of each DataCardAlternates
+        in card that it tries first, the one that matched last. Returns
+        state.
+    """
+    if isinstance(card, DataCardOptional):
+        _state(card.dl, state)
+    elif isinstance(card, DataCardAlternates):
+        state.append(next((i for i, dl in enumerate(card.alt_list)
+                           if dl is card.dl_matched), None))
+        for dl in card.alt_list:
+            _state(dl, state)
+    elif isinstance(card, DataCardRepeat):
+        _state(card._repeated_record, state)
+        if card.end_record is not None:
+            _state(card.end_record, state)
+    elif isinstance(card, DataCardStack):
+        for dl in card._datalines:
+            _state(dl, state)
+    return state
+
+
+def _digest(lines, start, stop):
+    """ Returns a hash of lines[start:stop]. Raises IndexError if some of
+        the lines don't exist.
+    """
+    h = hashlib.sha1()
+    for i in range(start, stop):
+        h.update(str(lines[i]).encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+class _Watched(object):
+    """ Lines that record how far they were looked at. stop is the index
+        after the last line looked at and eof whether a line past the end
+        of the input was asked for.
+    """
+
+    def __init__(self, lines, start):
+        self._lines = lines
+        self.stop = start
+        self.eof = False
+
+    def __getitem__(self, idx):
+        try:
+            line = self._lines[idx]
+        except IndexError:
+            self.eof = True
+            raise
+        if idx >= self.stop:
+            self.stop = idx + 1
+        return line
+
+
+class ParseCache(object):
+    """ LRU cache of parse results.
+
+        maxsize is the largest number of results kept and max_lines, if
+        given, the largest total number of lines they may have been parsed
+        from. The least recently used results are evicted first. If path is
+        given, the cache is loaded from that file if it exists, and save()
+        writes it back.
+
+        Use it with card.read(lines, cache=cache), or with a Grammar from
+        compile_grammar() through read() and parse().
+    """
+
+    def __init__(self, maxsize=128, max_lines=None, path=None):
+        self.maxsize = maxsize
+        self.max_lines = max_lines
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lines = 0
+        # Results keyed by (head, number of lines looked at, eof, digest of
+        # those lines), and the keys of the results for each head.
+        self._results = collections.OrderedDict()
+        self._heads = {}
+        self._signatures = weakref.WeakKeyDictionary()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def _head(self, card, lines, start):
+        """ Returns a hash of the layout and state of card and of
+            lines[start], which all the keys of its results share.
+        """
+        try:
+            sig = self._signatures[card]
+        except KeyError:
+            sig = self._signatures[card] = repr(signature(card))
+        h = hashlib.sha1(sig.encode('utf-8'))
+        h.update(repr(_state(card, [])).encode('utf-8'))
+        if _has_line(lines, start):
+            h.update(b'\n')
+            h.update(str(lines[start]).encode('utf-8'))
+        return h.hexdigest()
+
+    def _lookup(self, head, lines, start):
+        """ Returns the key of a result for lines[start:] under head, or
+            None.
+        """
+        digests = {}
+        for key in self._heads.get(head, ()):
+            seen, eof = key[1], key[2]
+            if seen not in digests:
+                try:
+                    digests[seen] = _digest(lines, start, start + seen)
+                except IndexError:
+                    digests[seen] = None
+            if digests[seen] == key[3] \
+                    and (not eof or not _has_line(lines, start + seen)):
+                return key
+        return None
+
+    def parse(self, card, lines, start=0):
+        """ Returns the (number of lines, result) tuple of card._parse(),
+            from the cache if possible. card may also be a Grammar.
+        """
+        target = getattr(card, 'card', card)
+        head = self._head(target, lines, start)
+        key = self._lookup(head, lines, start)
+        if key is None:
+            self.misses += 1
+            watched = _Watched(lines, start)
+            value = card._parse(watched, start) if target is card \
+                else card.parse(watched, start)
+            seen = watched.stop - start
+            key = (head, seen, watched.eof,
+                   _digest(lines, start, start + seen))
+            self._add(key, value)
+        else:
+            self.hits += 1
+            value = self._results.pop(key)
+            self._results[key] = value
+        self._evict()
+        return value
+
+    def _add(self, key, value):
+        if key in self._results:
+            self._lines -= self._results.pop(key)[0]
+        else:
+            self._heads.setdefault(key[0], []).append(key)
+        self._results[key] = value
+        self._lines += value[0]
+
+    def read(self, card, lines, start=0):
+        """ Read lines beginning at lines[start] into card, which may also
+            be a Grammar. Returns the number of lines read.
+        """
+        n, result = self.parse(card, lines, start)
+        getattr(card, 'card', card)._apply(result)
+        return n
+
+    def _evict(self):
+        while self._results and (
+                len(self._results) > self.maxsize
+                or (self.max_lines is not None
+                    and self._lines > self.max_lines)):
+            key, value = self._results.popitem(last=False)
+            self._lines -= value[0]
+            keys = self._heads[key[0]]
+            keys.remove(key)
+            if not keys:
+                del self._heads[key[0]]
+            self.evictions += 1
+
+    def info(self):
+        """ Returns a CacheInfo tuple of hit and miss statistics. """
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         self.maxsize, len(self._results), self._lines)
+
+    def clear(self):
+        """ Remove all results and reset the statistics. """
+        self._results.clear()
+        self._heads.clear()
+        self._lines = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def save(self, path=None):
+        """ Write the cached results to a pickle file, by default the path
+            the cache was created with.
+        """
+        path = self.path if path is None else path
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(list(self._results.items()), f,
+                        pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(tmp, path)
+
+    def load(self, path=None):
+        """ Add the results saved in a pickle file to the cache. """
+        path = self.path if path is None else path
+        with open(path, 'rb') as f:
+            items = pickle.load(f)
+        for key, value in items:
+            self._add(key, value)
+        self._evict()
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+""" Columnar reading and writing of DataCardRepeat blocks.
+
+    Instead of building a data dict for every row, read_columns() finds the
+    extent of the repeated block and then converts each field for all rows
+    at once, column by column, into NumPy arrays. write_columns() formats
+    rows from columns of values a column at a time. NumPy is an optional
+    dependency and is only needed for reading.
+"""
+
+import itertools
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .fastformat import FastRecordWriter, field_layout, read_float, read_int
+from .text_data_cards import DataCard, DataCardFixedText, _has_line
+
+
+class ColumnTable(dict):
+    """ Dict of NumPy arrays, one per named field of the repeated record,
+        all with one entry per row.
+
+        num_lines is the number of lines consumed, including the end record
+        if one was found. fields lists the field names in column order.
+    """
+
+    def __init__(self, fields, columns, nrows, num_lines):
+        dict.__init__(self, zip(fields, columns))
+        self.fields = list(fields)
+        self.nrows = nrows
+        self.num_lines = num_lines
+
+    def row(self, i):
+        """ Returns row i as a data dict like the ones in
+            DataCardRepeat.data.
+        """
+        return dict((f, self[f][i].item() if hasattr(self[f][i], 'item')
+                     else self[f][i]) for f in self.fields)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('NumPy is required for columnar reading. '
+                          'Install from pip: pip install numpy')
+
+
+def _scalar_column(convert, strs, dtype, *args):
+    """ Convert one value at a time. Columns with missing values (None) or
+        integers too large for dtype are returned with dtype object.
+    """
+    values = [convert(s, *args) for s in strs.tolist()]
+    try:
+        if None not in values:
+            return np.array(values, dtype=dtype)
+    except OverflowError:
+        pass
+    return np.array(values, dtype=object)
+
+
+def _decode_int(strs):
+    if (strs == '').any():
+        return _scalar_column(read_int, strs, np.int64)
+    t = np.char.replace(strs, ' ', '')
+    t = np.where((t == '') | (t == '-'), '0', t)
+    try:
+        return t.astype(np.int64)
+    except (ValueError, OverflowError):
+        return _scalar_column(read_int, strs, np.int64)
+
+
+def _decode_float(strs, decimals):
+    if (strs == '').any():
+        return _scalar_column(read_float, strs, np.float64, decimals)
+    t = np.char.replace(strs, ' ', '')
+    for c in 'eDd':
+        t = np.char.replace(t, c, 'E')
+    # Rows that need fortranformat's special cases are converted one by one.
+    no_exp = np.char.find(t, 'E') < 0
+    special = ((no_exp & ((np.char.find(t, '+', 1) >= 0)
+                          | (np.char.find(t, '-', 1) >= 0)))
+               | np.char.endswith(t, 'E') | np.char.endswith(t, 'E+')
+               | np.char.endswith(t, 'E-')
+               | (t == '') | (t == '.') | (t == '-'))
+    try:
+        vals = np.where(special, '0', t).astype(np.float64)
+    except ValueError:
+        return _scalar_column(read_float, strs, np.float64, decimals)
+    if decimals is not None:
+        implied = np.char.find(t, '.') < 0
+        vals = np.where(implied, vals / float(10 ** decimals), vals)
+    if special.any():
+        idx = np.flatnonzero(special)
+        vals[idx] = [read_float(s, decimals) for s in strs[idx].tolist()]
+    return vals
+
+
+def _pack(lines, width, chunk_size=10000):
+    """ Returns a bytearray of lines encoded as latin-1, each cut or padded
+        with NUL characters to width bytes. Lines are packed chunk_size at a
+        time so that only one chunk of padded copies exists at once.
+    """
+    buf = bytearray()
+    for a in range(0, len(lines), chunk_size):
+        text = ''.join([line[:width].ljust(width, '\0')
+                        for line in lines[a:a + chunk_size]])
+        if '\n' in text or '\r' in text:
+            raise ValueError('Lines contain line breaks')
+        try:
+            buf += text.encode('latin-1')
+        except UnicodeEncodeError:
+            raise ValueError('Lines contain characters outside latin-1')
+    return buf
+
+
+def _decode_field(f, chars):
+    """ Decode a field from chars, a 2-d array of the latin-1 bytes of its
+        columns, one row per line.
+    """
+    codes = chars.astype(np.uint32)
+    if f.kind == 'A':
+        # Pad lines shorter than the field with blanks.
+        codes[codes == 0] = ord(' ')
+    # Latin-1 bytes are the code points of their characters. Trailing NUL
+    # characters, from lines shorter than the field, are dropped.
+    strs = codes.view('U%d' % max(f.width, 1)).reshape(len(codes))
+    if f.kind == 'A':
+        return strs
+    elif f.kind == 'I':
+        return _decode_int(strs)
+    return _decode_float(strs, f.decimals)
+
+
+def decode_lines(layout, lines, chunk_size=16384):
+    """ Decode a list of lines with a fixed-width layout from
+        fastformat.field_layout(). Returns one array per field in the
+        layout, with the same values FastRecordReader would give.
+
+        The lines are packed into one latin-1 buffer of fixed-width rows.
+        Each field is decoded from a strided view of its columns in the
+        buffer, chunk_size rows at a time, into the field's array, so the
+        text of only one chunk of one field is held at a time.
+    """
+    _require_numpy()
+    n = len(lines)
+    if n == 0:
+        return [np.array([], dtype='U%d' % max(f.width, 1)) if f.kind == 'A'
+                else np.array([], dtype=np.int64 if f.kind == 'I'
+                              else np.float64) for f in layout]
+    width = max(f.start + f.width for f in layout)
+    rows = np.frombuffer(_pack(lines, width), np.uint8).reshape(n, width)
+    columns = []
+    for f in layout:
+        chars = rows[:, f.start:f.start + max(f.width, 1)]
+        column = None
+        for a in range(0, n, chunk_size):
+            values = _decode_field(f, chars[a:a + chunk_size])
+            if column is None:
+                column = np.empty(n, values.dtype)
+            elif values.dtype != column.dtype and column.dtype != object:
+                # Missing or very large values in this chunk.
+                column = column.astype(object)
+            column[a:a + len(values)] = values
+        columns.append(column)
+    return columns
+
+
+def read_columns(card, lines, start=0):
+    """ Read a DataCardRepeat block beginning at lines[start] into a
+        ColumnTable.
+
+        The repeated record must be a single-line DataCard. If the card has
+        an end record, the extent of the block is found by matching only
+        the end record, and every row in it is then decoded column by
+        column. An invalid row raises ValueError. The end record is read
+        into card.end_record. Without an end record, rows are read until
+        one doesn't match, as in DataCardRepeat.read.
+
+        The card's data is not modified and post_read_hook is not called
+        for the rows.
+    """
+    _require_numpy()
+    schema = _repeated_schema(card)
+    names = [f for f in schema.fields if f is not None]
+    keep = [i for i, f in enumerate(schema.fields) if f is not None]
+    layout = field_layout(schema.format)
+
+    line_idx = start
+    if card.end_record is not None and layout is not None:
+        line_idx = card._end_index(lines, start)
+        block = [str(lines[i]) for i in range(start, line_idx)]
+        try:
+            columns = decode_lines(layout, block)
+        except ValueError:
+            columns = None
+        else:
+            for i in schema.fixed_fields:
+                if not (columns[i] == schema.fields[i]).all():
+                    raise ValueError('Fixed field with wrong value in '
+                                     'column %d' % i)
+        if columns is None:
+            rows = [schema.read(line) for line in block]
+            columns = _columns_from_rows(rows, len(schema.fields))
+        nrows = len(block)
+    else:
+        rows = []
+        while _has_line(lines, line_idx):
+            if card.end_record is not None:
+                if card.end_record.match(lines, line_idx):
+                    break
+                rows.append(schema.read(lines[line_idx]))
+            else:
+                try:
+                    rows.append(schema.read(lines[line_idx]))
+                except ValueError:
+                    break
+            line_idx += 1
+        columns = _columns_from_rows(rows, len(schema.fields))
+        nrows = len(rows)
+
+    if card.end_record is not None and _has_line(lines, line_idx):
+        line_idx += card.end_record.read(lines, start=line_idx)
+    return ColumnTable(names, [columns[i] for i in keep], nrows,
+                       line_idx - start)
+
+
+def _repeated_schema(card):
+    record = card._repeated_record
+    if not isinstance(record, DataCard) \
+            or isinstance(record, DataCardFixedText) \
+            or not hasattr(record, '_schema'):
+        raise TypeError('Columnar reading and writing requires a single-line '
+                        'DataCard as the repeated record')
+    return record._schema
+
+
+def write_columns(card, columns, file, chunk_size=10000):
+    """ Write a DataCardRepeat block to a file object from columnar data.
+
+        columns maps each named field of the repeated record to a sequence
+        or NumPy array of values, all of the same length. Rows are formatted
+        chunk_size at a time, one field for all rows of the chunk at a
+        time, and each chunk is written to file as it is finished. The end
+        record, if any, is written last. Every line is terminated with a
+        newline. Returns the number of lines written.
+
+        The output is the same as formatting each row with DataCard.write().
+    """
+    schema = _repeated_schema(card)
+    values = []
+    nrows = None
+    for f in schema.fields:
+        if f is None:
+            values.append(None)
+            continue
+        col = columns[f]
+        col = col.tolist() if hasattr(col, 'tolist') else list(col)
+        if nrows is None:
+            nrows = len(col)
+        elif len(col) != nrows:
+            raise ValueError('Column %s has %d values, expected %d'
+                             % (f, len(col), nrows))
+        values.append(col)
+    if nrows is None:
+        nrows = 0
+    values = [[None] * nrows if v is None else v for v in values]
+
+    writer = schema._writer
+    n = 0
+    for a in range(0, nrows, chunk_size):
+        b = min(a + chunk_size, nrows)
+        if isinstance(writer, FastRecordWriter):
+            parts = []
+            for (gap, func, args), col in zip(writer.fields, values):
+                if gap:
+                    parts.append(itertools.repeat(' ' * gap))
+                parts.append([func(v, *args) for v in col[a:b]])
+            lines = [''.join(p) for p in zip(*parts)]
+        else:
+            lines = [writer.write([col[i] for col in values])
+                     for i in range(a, b)]
+        file.write('\n'.join(lines) + '\n')
+        n += len(lines)
+    if card.end_record is not None:
+        n += card.end_record.write_to(file)
+    return n
+
+
+def _columns_from_rows(rows, nfields):
+    columns = []
+    for i in range(nfields):
+        values = [r[i] for r in rows]
+        try:
+            if None not in values:
+                columns.append(np.array(values))
+                continue
+        except OverflowError:
+            pass
+        columns.append(np.array(values, dtype=object))
+    return columns
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+""" Compact storage of the rows of a DataCardRepeat.
+
+    A DataCardRepeat created with compact=True doesn't keep a card and a
+    data dict per row. Its data is a CompactRows sequence that stores each
+    field as a column: integers in an array of int64, floats in an array
+    of float64 and strings as indices into a pool of the distinct strings,
+    so that repeated text such as keywords and node names is stored once.
+    A column that holds other values, or values of several types, is kept
+    as a list. The source line of each row is kept by reference for
+    write().
+
+    data[i] returns a RowView, a mapping that reads and writes the values
+    of row i in the columns, so data[i]['FIELD'] works as with the dicts of
+    an ordinary DataCardRepeat. Rows that are changed through a RowView are
+    formatted by write(); the others are written from their source line.
+"""
+
+import array
+
+try:
+    from collections.abc import MutableMapping, Sequence
+except ImportError:  # pragma: no cover
+    from collections import MutableMapping, Sequence
+
+from .lines import text_or
+
+
+_TYPECODES = {int: 'q', float: 'd'}
+_TYPES = {'q': int, 'd': float}
+
+
+class CompactRows(Sequence):
+    """ Rows of a single-line record stored as typed columns.
+
+        schema is the CardSchema of the record. Rows are added with
+        extend(). The i-th item is a RowView of row i.
+    """
+
+    def __init__(self, schema):
+        self._schema = schema
+        self.fields = schema._names
+        self._index = dict((f, i) for i, f in enumerate(schema.fields)
+                           if f is not None)
+        # One column per field of the schema, None for unnamed fields.
+        # kinds holds the typecode of each column: 'q' or 'd' for arrays of
+        # numbers, 's' for an array of indices in the string pool, 'o' for
+        # a list and None until the first row is added.
+        self._columns = [None] * len(schema.fields)
+        self._kinds = [None] * len(schema.fields)
+        self._strings = []
+        self._pool = {}
+        self._sources = []
+        self._modified = set()
+
+    def __len__(self):
+        return len(self._sources)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [RowView(self, j) for j in range(*i.indices(len(self)))]
+        n = len(self._sources)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('Row index out of range')
+        return RowView(self, i)
+
+    def extend(self, rows, sources):
+        """ Add rows, a list of lists of values with one value per field of
+            the schema, read from the lines in sources. A source is None if
+            the row must be formatted.
+        """
+        n = len(self._sources)
+        columns = list(zip(*rows)) if rows else \
+            [()] * len(self._schema.fields)
+        for i, f in enumerate(self._schema.fields):
+            if f is not None:
+                self._extend_column(i, columns[i])
+        self._sources.extend(sources)
+        for i, source in enumerate(sources):
+            if source is None:
+                self._modified.add(n + i)
+
+    def _extend_column(self, i, values):
+        kind = self._kinds[i]
+        if kind is None:
+            if not values:
+                return
+            types = set(map(type, values))
+            kind = 's' if types == {str} else \
+                _TYPECODES.get(types.pop(), 'o') if len(types) == 1 else 'o'
+            self._kinds[i] = kind
+            self._columns[i] = [] if kind == 'o' else \
+                array.array('I' if kind == 's' else kind)
+        column = self._columns[i]
+        if kind == 's':
+            if all(type(v) is str for v in values):
+                pool = self._pool
+                strings = self._strings
+                indices = []
+                for v in values:
+                    j = pool.get(v)
+                    if j is None:
+                        j = pool[v] = len(strings)
+                        strings.append(v)
+                    indices.append(j)
+                column.extend(indices)
+                return
+        elif kind != 'o':
+            typ = _TYPES[kind]
+            if all(type(v) is typ for v in values):
+                try:
+                    column.extend(array.array(kind, values))
+                    return
+                except OverflowError:
+                    pass
+        if kind != 'o':
+            column = self._to_list(i)
+        column.extend(values)
+
+    def _to_list(self, i):
+        """ Convert column i to a list, which can hold any value. """
+        self._columns[i] = [self._get(i, j) for j in range(len(self))]
+        self._kinds[i] = 'o'
+        return self._columns[i]
+
+    def _get(self, i, row):
+        if self._kinds[i] == 's':
+            return self._strings[self._columns[i][row]]
+        return self._columns[i][row]
+
+    def _set(self, i, row, value):
+        kind = self._kinds[i]
+        if kind == 's' and type(value) is str:
+            j = self._pool.get(value)
+            if j is None:
+                j = self._pool[value] = len(self._strings)
+                self._strings.append(value)
+            self._columns[i][row] = j
+        elif kind in ('q', 'd') and type(value) is _TYPES[kind]:
+            try:
+                self._columns[i][row] = value
+            except OverflowError:
+                self._to_list(i)[row] = value
+        elif kind == 'o':
+            self._columns[i][row] = value
+        else:
+            self._to_list(i)[row] = value
+        self._modified.add(row)
+
+    def values(self, row):
+        """ Returns the list of values of row, one per field of the schema,
+            with None for unnamed fields.
+        """
+        return [None if f is None else self._get(i, row)
+                for i, f in enumerate(self._schema.fields)]
+
+    def row(self, row):
+        """ Returns row as a data dict. """
+        return dict((f, self._get(i, row))
+                    for i, f in enumerate(self._schema.fields)
+                    if f is not None)
+
+    def source(self, row):
+        """ Returns the line row was read from, or None if it has been
+            changed since.
+        """
+        if row in self._modified:
+            return None
+        return self._sources[row]
+
+    def write_row(self, row):
+        """ Returns the line of row: the source line if the row hasn't been
+            changed, otherwise its values formatted.
+        """
+        source = self.source(row)
+        if source is not None:
+            line = text_or(source)
+            if line is not None:
+                return line
+        return self._schema.write(self.values(row))
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__,
+                           [self.row(i) for i in range(len(self))])
+
+
+class RowView(MutableMapping):
+    """ data dict of a row of CompactRows. Values are read from and written
+        to the columns. Fields can't be added or deleted.
+    """
+
+    __slots__ = ('_rows', '_row')
+
+    def __init__(self, rows, row):
+        self._rows = rows
+        self._row = row
+
+    def __getitem__(self, key):
+        try:
+            i = self._rows._index[key]
+        except (KeyError, TypeError):
+            raise KeyError(key)
+        return self._rows._get(i, self._row)
+
+    def __setitem__(self, key, value):
+        try:
+            i = self._rows._index[key]
+        except (KeyError, TypeError):
+            raise KeyError(key)
+        self._rows._set(i, self._row, value)
+
+    def __delitem__(self, key):
+        raise TypeError('Fields of compact rows cannot be deleted')
+
+    def __contains__(self, key):
+        try:
+            return key in self._rows._index
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._rows.fields)
+
+    def __len__(self):
+        return len(self._rows.fields)
+
+    def copy(self):
+        return self._rows.row(self._row)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.copy())
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+""" Compiled readers and writers for Fortran formats made up of simple
+    fixed-width edit descriptors.
+
+    A FortranRecordReader interprets the format on every line it reads.
+    Most card formats only use I, F, E, D, EN, ES and A edit descriptors with
+    explicit widths, plus X and TR for skipping columns, so each field
+    always comes from the same columns of the line. For those formats,
+    compile_reader() generates a function that slices the columns directly
+    and converts them with the same rules fortranformat uses, including
+    reading blank fields as zero and inserting the implied decimal point
+    in fields such as F8.5. Any other format falls back to fortranformat.
+
+    compile_writer() does the same for output. I, F and A fields are
+    formatted directly. E, D, EN and ES fields are formatted one field at a
+    time by fortranformat's own float formatting.
+
+    The conversions follow the fortranformat versions in READER_VERSIONS
+    and WRITER_VERSIONS; other versions are always used through
+    FortranRecordReader and FortranRecordWriter.
+"""
+
+import collections
+import math
+import operator
+import re
+
+import fortranformat
+from fortranformat import FortranRecordReader
+from fortranformat import FortranRecordWriter
+from fortranformat import config
+
+try:
+    from fortranformat import _edit_descriptors as _eds
+    from fortranformat import _output
+    from fortranformat._misc import expand_edit_descriptors
+except ImportError:  # pragma: no cover
+    _eds = None
+
+# The compiled readers and writers reproduce the conversions of these
+# versions of fortranformat, whose private modules they also use. With
+# other versions, compile_reader() and compile_writer() return
+# fortranformat's own readers and writers.
+READER_VERSIONS = ('0.2.5', '2.0.3')
+WRITER_VERSIONS = ('0.2.5', '2.0.3')
+_VERSION = getattr(fortranformat, '__version__', None)
+COMPILED_READERS = _eds is not None and _VERSION in READER_VERSIONS
+COMPILED_WRITERS = _eds is not None and _VERSION in WRITER_VERSIONS
+
+# fortranformat 2 writes None as 0 in numeric fields and as blanks in A
+# fields, where earlier versions raise an error, and keeps the sign of
+# negative values that round to zero in F fields.
+_VERSION_2 = _VERSION is not None and not _VERSION.startswith('0.')
+
+
+Field = collections.namedtuple('Field', 'kind start width decimals')
+Field.__doc__ = """ Columns and type of one value in a fixed-width format.
+    kind is the edit descriptor name, start is the 0-based first column
+    and decimals is the number of implied decimal places (None for I and
+    A fields).
+"""
+
+if _eds is not None:
+    _VALUE_KINDS = ((_eds.I, 'I'), (_eds.F, 'F'), (_eds.E, 'E'),
+                    (_eds.D, 'D'), (_eds.EN, 'EN'), (_eds.ES, 'ES'),
+                    (_eds.A, 'A'))
+    _SKIP_EDS = (_eds.X, _eds.TR)
+
+
+def _default_config():
+    """ The compiled conversions follow fortranformat's default settings. """
+    return (not config.RET_WRITTEN_VARS_ONLY
+            and config.RET_UNWRITTEN_VARS_NONE
+            and config.PROC_NEG_AS_ZERO
+            and not config.PROC_BLANKS_AS_ZEROS
+            and config.PROC_PAD_CHAR == ' ')
+
+
+def field_layout(format):
+    """ Returns a list of Field tuples, one for each value read by format, or
+        None if the format uses edit descriptors whose columns are not fixed.
+    """
+    if _eds is None:
+        return None
+    reader = FortranRecordReader(format)
+    eds = expand_edit_descriptors(reader._eds)
+    layout = []
+    pos = 0
+    for ed in eds:
+        if isinstance(ed, _SKIP_EDS):
+            if ed.num_chars is None:
+                return None
+            pos += ed.num_chars
+            continue
+        for cls, kind in _VALUE_KINDS:
+            if type(ed) is cls:
+                break
+        else:
+            return None
+        if ed.width is None:
+            return None
+        layout.append(Field(kind, pos, ed.width,
+                            getattr(ed, 'decimal_places', None)))
+        pos += ed.width
+    if not layout:
+        return None
+    return layout
+
+
+def read_int(substr):
+    """ Convert an I field the way fortranformat does. """
+    if not substr:
+        return None
+    teststr = substr.replace(' ', '')
+    # Blank fields and a lone minus sign read as zero.
+    if not teststr or teststr == '-':
+        return 0
+    try:
+        return int(teststr)
+    except ValueError:
+        raise ValueError('%s is not a valid input for one of integer, octal, '
+                         'hex or binary' % substr)
+
+
+def read_float(substr, decimals):
+    """ Convert an F, E, D, EN or ES field the way fortranformat does. """
+    teststr = substr.replace(' ', '')
+    if not teststr:
+        if not substr:
+            return None
+        teststr = '0'
+    teststr = teststr.upper().replace('D', 'E')
+    # A sign after the first character starts the exponent.
+    if 'E' not in teststr:
+        teststr = teststr[0] + \
+            teststr[1:].replace('+', 'E+').replace('-', 'E-')
+    if teststr == '.' or teststr == '-':
+        teststr = '0'
+    # Numbers may end with an empty exponent.
+    if teststr[-1:] == 'E':
+        teststr = teststr[:-1]
+    elif teststr[-2:] in ('E+', 'E-'):
+        teststr = teststr[:-2]
+    try:
+        val = float(teststr)
+    except ValueError:
+        raise ValueError('%s is not a valid input as for an E, ES, EN or D '
+                         'edit descriptor' % substr)
+    # Implied decimal point
+    if '.' not in teststr and decimals is not None:
+        val = val / 10 ** decimals
+    return val
+
+
+# Fields that read_int() and read_float() always accept once blanks are
+# removed: a sign and digits, and a decimal point and exponent for floats.
+# Other fields may be valid too.
+_VALID = {
+    'I': r'(?:-|[-+]?[0-9]+)?',
+    'F': r'(?:[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)'
+         r'(?:[EeDd][-+]?[0-9]+)?)?',
+}
+
+
+def valid_line_check(layout, indices):
+    """ Returns a function of a line that returns a true value if the fields
+        of layout at indices are certainly read without error, or None if
+        none of them can fail. A line it returns None for may still be
+        valid.
+    """
+    fields = [layout[i] for i in indices if layout[i].kind != 'A']
+    if not fields:
+        return None
+    # The fields are cut out, joined with NULs, which they can't contain if
+    # they are valid, and matched in one go without their blanks.
+    get = operator.itemgetter(*[slice(f.start, f.start + f.width)
+                                for f in fields])
+    match = re.compile('\0'.join(_VALID['I' if f.kind == 'I' else 'F']
+                                 for f in fields) + r'\Z').match
+    if len(fields) == 1:
+        return lambda line: match(get(line).replace(' ', ''))
+    return lambda line: match('\0'.join(get(line)).replace(' ', ''))
+
+
+def _field_expr(field):
+    col = 'line[%d:%d]' % (field.start, field.start + field.width)
+    if field.kind == 'A':
+        return '%s.ljust(%d)' % (col, field.width)
+    elif field.kind == 'I':
+        return 'read_int(%s)' % col
+    else:
+        return 'read_float(%s, %r)' % (col, field.decimals)
+
+
+class FastRecordReader(object):
+    """ Drop-in replacement for FortranRecordReader for formats that
+        field_layout() accepts. The read method is generated Python code
+        that slices each field's columns directly.
+
+        Lines containing line breaks are passed to fortranformat, which
+        reads only up to the first break.
+
+        field_readers holds one function per field that converts just that
+        field of a line without line breaks.
+    """
+
+    def __init__(self, format, layout=None):
+        self.format = format
+        if layout is None:
+            layout = field_layout(format)
+        self.layout = layout
+        self._fallback = FortranRecordReader(format)
+        src = ('def read(line):\n'
+               '    if "\\n" in line or "\\r" in line:\n'
+               '        return fallback(line)\n'
+               '    return [%s]\n'
+               'field_readers = [%s]\n'
+               % (', '.join(_field_expr(f) for f in layout),
+                  ', '.join('lambda line: %s' % _field_expr(f)
+                            for f in layout)))
+        namespace = {'read_int': read_int, 'read_float': read_float,
+                     'fallback': self._fallback.read}
+        exec(compile(src, '<%s %s>' % (self.__class__.__name__, format),
+                     'exec'), namespace)
+        self.read = namespace['read']
+        self.field_readers = namespace['field_readers']
+
+    def __getstate__(self):
+        return self.format
+
+    def __setstate__(self, format):
+        self.__init__(format)
+
+
+def compile_reader(format):
+    """ Returns a FastRecordReader for format if every field has fixed
+        columns and a tested fortranformat is using its default settings,
+        otherwise a FortranRecordReader.
+    """
+    if COMPILED_READERS and _default_config():
+        layout = field_layout(format)
+        if layout is not None:
+            return FastRecordReader(format, layout)
+    return FortranRecordReader(format)
+
+
+# Output state for fortranformat's formatting functions with no SP or P
+# edit descriptors in effect.
+_STATE = {'position': 0, 'scale': 0, 'incl_plus': False,
+          'blanks_as_zeros': False, 'halt_if_no_vals': False}
+
+# Largest magnitude, in units of the last decimal place, that write_float
+# formats itself. Beyond it, rounding ties can't be detected reliably.
+_MAX_SCALED = 1e9
+
+
+def _default_output_config():
+    return (not _output.PROC_SIGN_ZERO
+            and _output.PROC_DECIMAL_CHAR == '.'
+            and not _output.G0_NO_BLANKS
+            and not _output.PROC_NO_LEADING_BLANK)
+
+
+def write_int(val, width):
+    """ Format an I field the way fortranformat does. """
+    try:
+        ival = int(val)
+    except (TypeError, ValueError):
+        if val is None and _VERSION_2:
+            return '0'.rjust(width)
+        return _output._compose_i_string(width, None, _STATE, val)
+    # fortranformat takes the absolute value as a float.
+    if not -2 ** 53 < ival < 2 ** 53:
+        return _output._compose_i_string(width, None, _STATE, val)
+    s = '%d' % ival
+    if len(s) > width:
+        return '*' * width
+    return s.rjust(width)
+
+
+def write_float(val, width, decimals):
+    """ Format an F field the way fortranformat does.
+
+        fortranformat rounds half up from a 38 digit decimal expansion while
+        '%f' rounds the exact binary value, so values close to a rounding
+        tie are left to fortranformat.
+    """
+    if type(val) is float or type(val) is int:
+        tmp = abs(val)
+        scaled = tmp * 10.0 ** decimals
+        if scaled < _MAX_SCALED \
+                and abs(scaled - math.floor(scaled) - 0.5) > 1e-6:
+            body = '%.*f' % (decimals, tmp)
+            # Before version 2, values that round to zero are written
+            # without a sign.
+            sign = '-' if val < 0 and (_VERSION_2 or body.strip('0.')) \
+                else ''
+            if body[0] == '0':
+                body = body[1:]
+            if len(sign) + len(body) > width:
+                return '*' * width
+            if body[0] == '.' and len(sign) + len(body) < width:
+                body = '0' + body
+            return (sign + body).rjust(width)
+    elif val is None and _VERSION_2:
+        val = 0.0
+    return _output._compose_float_string(width, None, decimals, _STATE, val,
+                                         'F')
+
+
+def write_str(val, width):
+    """ Format an A field the way fortranformat does. """
+    val = '' if val is None and _VERSION_2 else str(val)
+    if width is None:
+        return val
+    elif width >= len(val):
+        return val.rjust(width)
+    return val[:width]
+
+
+def compose_float(val, width, decimals, exponent, kind):
+    """ Format an E, D, EN or ES field with fortranformat. """
+    if val is None and _VERSION_2:
+        val = 0.0
+    return _output._compose_float_string(width, exponent, decimals, _STATE,
+                                         val, kind)
+
+
+def writer_fields(format):
+    """ Returns a list of (gap, function, args) tuples, one for each value
+        written by format, or None if the format can't be compiled. gap is
+        the number of blank columns before the field and function(value,
+        *args) formats the value.
+    """
+    if _eds is None:
+        return None
+    writer = FortranRecordWriter(format)
+    fields = []
+    gap = 0
+    for ed in expand_edit_descriptors(writer._eds):
+        if isinstance(ed, _SKIP_EDS):
+            if ed.num_chars is None:
+                return None
+            gap += ed.num_chars
+            continue
+        kind = type(ed)
+        width = getattr(ed, 'width', None)
+        if kind is _eds.A:
+            fields.append((gap, write_str, (width,)))
+        elif width is None or width <= 0:
+            return None
+        elif kind is _eds.I and ed.min_digits is None:
+            fields.append((gap, write_int, (width,)))
+        elif kind is _eds.F and ed.decimal_places:
+            fields.append((gap, write_float, (width, ed.decimal_places)))
+        elif kind in (_eds.F, _eds.E, _eds.D, _eds.EN, _eds.ES) \
+                and ed.decimal_places is not None:
+            fields.append((gap, compose_float,
+                           (width, ed.decimal_places,
+                            getattr(ed, 'exponent', None), kind.__name__)))
+        else:
+            return None
+        gap = 0
+    if not fields:
+        return None
+    return fields
+
+
+class FastRecordWriter(object):
+    """ Drop-in replacement for FortranRecordWriter for formats that
+        writer_fields() accepts. fields holds the per-field formatters for
+        bulk writers that format a column at a time.
+
+        A list with a different number of values than the format has
+        fields is passed to fortranformat.
+    """
+
+    def __init__(self, format, fields=None):
+        self.format = format
+        if fields is None:
+            fields = writer_fields(format)
+        self.fields = fields
+        self._fallback = FortranRecordWriter(format)
+        names = ['v%d' % i for i in range(len(fields))]
+        parts = []
+        for name, (gap, func, args) in zip(names, fields):
+            if gap:
+                parts.append(repr(' ' * gap))
+            parts.append('%s(%s)' % (func.__name__, ', '.join(
+                [name] + [repr(a) for a in args])))
+        src = ('def write(values):\n'
+               '    if len(values) != %d:\n'
+               '        return fallback(values)\n'
+               '    %s, = values\n'
+               '    return %s\n'
+               % (len(fields), ', '.join(names), ' + '.join(parts)))
+        namespace = dict((func.__name__, func) for gap, func, args in fields)
+        namespace['fallback'] = self._fallback.write
+        exec(compile(src, '<%s %s>' % (self.__class__.__name__, format),
+                     'exec'), namespace)
+        self.write = namespace['write']
+
+    def __getstate__(self):
+        return self.format
+
+    def __setstate__(self, format):
+        self.__init__(format)
+
+
+def compile_writer(format):
+    """ Returns a FastRecordWriter for format if it can be compiled and a
+        tested fortranformat is using its default settings, otherwise a
+        FortranRecordWriter.
+    """
+    if COMPILED_WRITERS and _default_output_config():
+        fields = writer_fields(format)
+        if fields is not None:
+            return FastRecordWriter(format, fields)
+    return FortranRecordWriter(format)
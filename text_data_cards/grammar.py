@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+""" Compile a tree of cards into a predictive parser.
+
+    A deck is described by nesting DataCardStack, DataCardRepeat,
+    DataCardAlternates and DataCardOptional around single-line cards, and
+    those cards parse by trial and error: every alternate, optional card and
+    end record is parsed until one succeeds. compile_grammar() instead
+    works out, for every choice in the tree, which lines each branch can
+    start with. The conditions come from the fixed text of the cards
+    (fixed A fields and DataCardFixedText), as in the first-line
+    discriminators used by DataCardAlternates. Where the branches of a
+    choice can't start with the same line, the compiled parser looks at the
+    line once and parses only the branch it selects.
+
+    Choices that can't be decided from a single line are reported in
+    Grammar.ambiguities and are parsed by trial as before. The card tree
+    itself is not changed, and a Grammar populates it with the same results
+    as card.read().
+
+    Because the parser commits to a branch after looking at its first line,
+    a line that starts like a branch but is otherwise invalid raises
+    ValueError. card.read() would instead try the other branches or, for a
+    DataCardRepeat with no end record, stop before the line.
+"""
+
+import collections
+
+from .text_data_cards import DataCardAlternates, DataCardOptional, \
+    DataCardRepeat, DataCardStack, ReadError, _has_line
+from .literals import LiteralIndex, holds
+
+
+Ambiguity = collections.namedtuple('Ambiguity', 'path kind message')
+Ambiguity.__doc__ = """ A choice in a card tree that can't be decided from
+    one line. path names the card, kind is 'overlap' if two branches can
+    start with the same line, 'unknown' if a branch has no fixed text to
+    decide by, or 'nullable' if a branch can match no lines at all.
+"""
+
+First = collections.namedtuple('First', 'conds any nullable')
+First.__doc__ = """ The lines a card can start with. conds is a frozenset of
+    tuples of (start, width, text) conditions; a line can start the card
+    if it meets every condition of one tuple. any is True if nothing is
+    known about the first line, and nullable is True if the card can
+    match no lines.
+"""
+
+# What can follow the outermost card: the end of the input.
+_END = First(frozenset(), False, True)
+
+
+def _requirements(conds):
+    """ Returns a dict of the characters conds requires in each column and
+        the required line length (None if not fixed), or None if no line
+        can meet all of conds.
+    """
+    chars = {}
+    end = None
+    for start, width, text in conds:
+        if width is None:
+            if end is not None and end != start + len(text):
+                return None
+            end = start + len(text)
+        elif len(text) > width:
+            return None
+        else:
+            text = text.ljust(width)
+        for i, c in enumerate(text):
+            if chars.setdefault(start + i, c) != c:
+                return None
+    # Columns past the end of the line read as blanks.
+    if end is not None and any(c != ' ' for col, c in chars.items()
+                               if col >= end):
+        return None
+    return chars, end
+
+
+def first_set(card):
+    """ Returns the First tuple of the lines card can start with. """
+    if isinstance(card, DataCardOptional):
+        f = first_set(card.dl)
+        return First(f.conds, f.any, True)
+    elif isinstance(card, DataCardAlternates):
+        return _union([first_set(dl) for dl in card.alt_list])
+    elif isinstance(card, DataCardRepeat):
+        row = first_set(card._repeated_record)
+        if card.end_record is None:
+            return First(row.conds, row.any, True)
+        end = first_set(card.end_record)
+        return First(row.conds | end.conds, row.any or end.any,
+                     end.nullable)
+    elif isinstance(card, DataCardStack):
+        return _sequence([first_set(dl) for dl in card._datalines])
+    conds = tuple(card._discriminators())
+    if not conds:
+        return First(frozenset(), True, False)
+    if _requirements(conds) is None:
+        # The card can never match.
+        return First(frozenset(), False, False)
+    return First(frozenset([conds]), False, False)
+
+
+def _union(firsts):
+    return First(frozenset().union(*[f.conds for f in firsts]),
+                 any(f.any for f in firsts),
+                 any(f.nullable for f in firsts))
+
+
+def _sequence(firsts, follow=None):
+    """ First tuple of a sequence of cards, followed by follow. """
+    used = []
+    for f in firsts:
+        used.append(f)
+        if not f.nullable:
+            u = _union(used)
+            return First(u.conds, u.any, False)
+    if follow is not None:
+        used.append(follow)
+    u = _union(used)
+    return First(u.conds, u.any, True)
+
+
+def overlaps(a, b):
+    """ Returns True if some line could start both a and b. """
+    if (a.any and (b.any or b.conds)) or (b.any and a.conds):
+        return True
+    return any(_requirements(ca + cb) is not None
+               for ca in a.conds for cb in b.conds)
+
+
+def _tester(first):
+    conds = sorted(first.conds)
+
+    def test(line):
+        for conj in conds:
+            for cond in conj:
+                if not holds(cond, line):
+                    break
+            else:
+                return True
+        return False
+    return test
+
+
+class Grammar(object):
+    """ Predictive parser for a card tree, built by compile_grammar().
+
+        parse() returns the same (number of lines, result) tuple as the
+        card's _parse() and read() populates the card from it. The card
+        tree must not be changed after it is compiled.
+    """
+
+    def __init__(self, card, strict=False):
+        self.card = card
+        self.ambiguities = []
+        self._parse = self._compile(card, _END,
+                                    card.name or card.__class__.__name__)
+        if strict and self.ambiguities:
+            raise ValueError('Ambiguous card layout:\n' + '\n'.join(
+                '%s: %s' % (a.path, a.message) for a in self.ambiguities))
+
+    def parse(self, lines, start=0):
+        """ Parse lines beginning at lines[start] without modifying the
+            card. Raises ValueError if the lines don't match.
+        """
+        return self._parse(lines, start)
+
+    def read(self, lines, start=0):
+        """ Read lines beginning at lines[start] into the card. Returns the
+            number of lines read.
+        """
+        n, result = self._parse(lines, start)
+        self.card._apply(result)
+        return n
+
+    def _report(self, path, kind, message):
+        self.ambiguities.append(Ambiguity(path, kind, message))
+
+    def _check(self, path, first, other, what, other_what):
+        """ Report if a branch that is selected by its first line can't be
+            told apart from other. Returns True if it can.
+        """
+        if first.any:
+            self._report(path, 'unknown', '%s has no fixed text' % what)
+        elif first.nullable:
+            self._report(path, 'nullable', '%s can match no lines' % what)
+        elif overlaps(first, other):
+            self._report(path, 'overlap', '%s can start with the same line '
+                         'as %s' % (what, other_what))
+        else:
+            return True
+        return False
+
+    def _compile(self, card, follow, path):
+        if isinstance(card, DataCardOptional):
+            return self._compile_optional(card, follow, path)
+        elif isinstance(card, DataCardAlternates):
+            return self._compile_alternates(card, follow, path)
+        elif isinstance(card, DataCardRepeat):
+            return self._compile_repeat(card, follow, path)
+        elif isinstance(card, DataCardStack):
+            return self._compile_stack(card, follow, path)
+        return card._parse
+
+    def _compile_stack(self, card, follow, path):
+        firsts = [first_set(dl) for dl in card._datalines]
+        funcs = [self._compile(dl, _sequence(firsts[i + 1:], follow),
+                               _child_path(path, i, dl))
+                 for i, dl in enumerate(card._datalines)]
+
+        def parse(lines, start=0):
+            results = []
+            line_idx = start
+            for func in funcs:
+                n, r = func(lines, line_idx)
+                line_idx += n
+                results.append(r)
+            return line_idx - start, results
+        return parse
+
+    def _compile_repeat(self, card, follow, path):
+        row = first_set(card._repeated_record)
+        if row.nullable:
+            self._report(path, 'nullable',
+                         'the repeated record can match no lines')
+        if card.end_record is None:
+            return self._compile_repeat_no_end(card, row, follow, path)
+
+        end = first_set(card.end_record)
+        row_parse = self._compile(card._repeated_record,
+                                  _union([row, end, _END]), path + '/row')
+        end_parse = self._compile(card.end_record, follow, path + '/end')
+        if self._check(path, end, row, 'the end record', 'a row'):
+            is_end = _tester(end)
+
+            def parse(lines, start=0):
+                rows = []
+                line_idx = start
+                while _has_line(lines, line_idx):
+                    if is_end(lines[line_idx]):
+                        n, r = end_parse(lines, line_idx)
+                        return line_idx + n - start, (rows, True, r)
+                    n, r = row_parse(lines, line_idx)
+                    line_idx += n
+                    rows.append(r)
+                return line_idx - start, (rows, False, None)
+        else:
+            def parse(lines, start=0):
+                rows = []
+                line_idx = start
+                while _has_line(lines, line_idx):
+                    try:
+                        n, r = end_parse(lines, line_idx)
+                    except ValueError:
+                        pass
+                    else:
+                        return line_idx + n - start, (rows, True, r)
+                    n, r = row_parse(lines, line_idx)
+                    line_idx += n
+                    rows.append(r)
+                return line_idx - start, (rows, False, None)
+        return parse
+
+    def _compile_repeat_no_end(self, card, row, follow, path):
+        row_parse = self._compile(card._repeated_record,
+                                  _union([row, follow]), path + '/row')
+        if self._check(path, row, follow, 'the repeated record',
+                       'what follows the block'):
+            is_row = _tester(row)
+
+            def parse(lines, start=0):
+                rows = []
+                line_idx = start
+                while _has_line(lines, line_idx) \
+                        and is_row(lines[line_idx]):
+                    n, r = row_parse(lines, line_idx)
+                    line_idx += n
+                    rows.append(r)
+                return line_idx - start, (rows, False, None)
+        else:
+            def parse(lines, start=0):
+                rows = []
+                line_idx = start
+                while _has_line(lines, line_idx):
+                    try:
+                        n, r = row_parse(lines, line_idx)
+                    except ValueError:
+                        break
+                    line_idx += n
+                    rows.append(r)
+                return line_idx - start, (rows, False, None)
+        return parse
+
+    def _compile_optional(self, card, follow, path):
+        first = first_set(card.dl)
+        dl_parse = self._compile(card.dl, follow, _child_path(path, 0,
+                                                              card.dl))
+        if self._check(path, first, follow, 'the optional card',
+                       'what follows it'):
+            is_dl = _tester(first)
+
+            def parse(lines, start=0):
+                if _has_line(lines, start) and is_dl(lines[start]):
+                    n, r = dl_parse(lines, start)
+                    return n, (True, r)
+                return 0, (False, None)
+        else:
+            def parse(lines, start=0):
+                try:
+                    n, r = dl_parse(lines, start)
+                except ValueError:
+                    return 0, (False, None)
+                return n, (True, r)
+        return parse
+
+    def _compile_alternates(self, card, follow, path):
+        firsts = [first_set(dl) for dl in card.alt_list]
+        funcs = [self._compile(dl, follow, _child_path(path, i, dl))
+                 for i, dl in enumerate(card.alt_list)]
+
+        decidable = True
+        for i, f in enumerate(firsts):
+            what = 'alternate %d' % i
+            if f.any:
+                self._report(path, 'unknown', '%s has no fixed text' % what)
+                decidable = False
+            elif f.nullable:
+                self._report(path, 'nullable',
+                             '%s can match no lines' % what)
+                decidable = False
+            for j in range(i + 1, len(firsts)):
+                if not f.any and not firsts[j].any \
+                        and overlaps(f, firsts[j]):
+                    self._report(path, 'overlap', 'alternates %d and %d can '
+                                 'start with the same line' % (i, j))
+                    decidable = False
+
+        if not decidable:
+            def parse(lines, start=0):
+                for i in card._candidates(lines, start):
+                    try:
+                        n, r = funcs[i](lines, start)
+                    except ValueError:
+                        continue
+                    return n, (i, r)
+                raise ReadError('None of the alternate datacards matched.',
+                                start, card.name)
+            return parse
+
+        # Index the alternates by their first condition, as in
+        # DataCardAlternates._build_index.
+        index = LiteralIndex()
+        for i, f in enumerate(firsts):
+            for conj in f.conds:
+                index.add(conj[0], (_tester(First(frozenset([conj]), False,
+                                                  False)), i))
+
+        def parse(lines, start=0):
+            if _has_line(lines, start):
+                line = lines[start]
+                for test, i in index.lookup(line):
+                    if test(line):
+                        n, r = funcs[i](lines, start)
+                        return n, (i, r)
+            raise ReadError('None of the alternate datacards matched.', start,
+                            card.name)
+        return parse
+
+
+def _child_path(path, i, card):
+    if card.name:
+        return '%s/%s' % (path, card.name)
+    return '%s[%d]' % (path, i)
+
+
+def compile_grammar(card, strict=False):
+    """ Compile a card tree into a Grammar. Choices that can't be decided
+        from one line are listed in Grammar.ambiguities, or raise
+        ValueError if strict is True.
+    """
+    return Grammar(card, strict)
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+
+""" Re-parse a deck after editing some of its lines.
+
+    IncrementalParser parses a list of lines with a card tree and keeps a
+    tree of nodes, one for each card that was parsed, with the number of
+    lines it consumed and the number of lines it looked at (its reach,
+    which is larger if the card had to look ahead, for example to find out
+    that an alternate didn't match or that a repeated block had ended).
+    Node positions are relative to the enclosing card, so they stay valid
+    when lines are inserted or deleted before them.
+
+    After an edit, only the cards whose reach overlaps the edited lines
+    are parsed again. In a DataCardRepeat, the rows before the edit are
+    kept, rows are parsed from the first affected row until the parse is
+    back in step with a row boundary after the edit, and the remaining rows
+    and the end record are kept. DataCardAlternates and DataCardOptional
+    keep their choice and update it in place when the alternates that were
+    tried and failed before it didn't look at the edited lines.
+
+    The result is the same as parsing the edited lines from scratch.
+"""
+
+import bisect
+
+from .text_data_cards import DataCardAlternates, DataCardOptional, \
+    DataCardRepeat, DataCardStack, ReadError, _has_line
+
+
+class _Tracker(object):
+    """ Wraps a list of lines and records the largest index looked up. """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.max = -1
+
+    def __getitem__(self, idx):
+        if idx > self.max:
+            self.max = idx
+        return self.lines[idx]
+
+
+class Node(object):
+    """ Parse of one card: the number of lines n it consumed, the number of
+        lines reach it looked at, its _parse() result and the nodes of the
+        cards in it. For a DataCardRepeat, children are the rows and end
+        is the node of the end record, if it was found. For alternates,
+        fail_reach is the reach of the alternates tried before the one
+        that matched.
+    """
+
+    __slots__ = ('card', 'n', 'reach', 'result', 'children', 'end',
+                 'fail_reach', 'uniform', 'row_results')
+
+    def __init__(self, card, n, result, children=(), end=None,
+                 fail_reach=0):
+        self.card = card
+        self.n = n
+        self.reach = n
+        self.result = result
+        self.children = children
+        self.end = end
+        self.fail_reach = fail_reach
+        self.uniform = False
+        self.row_results = None
+
+
+class IncrementalParser(object):
+    """ Parses lines[start:] with card and re-parses after edits.
+
+        lines is copied into a list that replace(), insert() and delete()
+        edit. parse() returns the (number of lines, result) tuple that
+        card._parse() would return for the current lines and read()
+        populates the card from it. parsed is the number of cards parsed
+        by the last parse or edit.
+    """
+
+    def __init__(self, card, lines, start=0):
+        self.card = card
+        self.lines = list(lines)
+        self.start = start
+        self.parsed = 0
+        self._tracker = _Tracker(self.lines)
+        self.root = self._parse(card, start)
+
+    def parse(self):
+        return self.root.n, self.root.result
+
+    def read(self):
+        """ Populate the card from the current parse. Returns the number of
+            lines read.
+        """
+        self.card._apply(self.root.result)
+        return self.root.n
+
+    def replace(self, start, stop, new_lines):
+        """ Replace lines[start:stop] with new_lines and re-parse. Returns
+            the new (number of lines, result) tuple. If the edited lines no
+            longer match the card, ValueError is raised and the parser keeps
+            the lines but should not be used further.
+        """
+        new_lines = list(new_lines)
+        delta = len(new_lines) - (stop - start)
+        self.lines[start:stop] = new_lines
+        self.parsed = 0
+        a = start - self.start
+        b = stop - self.start
+        if b <= 0 and (a < 0 or delta == 0):
+            # The edit is before the parsed lines.
+            self.start += delta
+        elif a < 0:
+            self.root = self._parse(self.card, self.start)
+        elif a < self.root.reach:
+            self.root = self._update(self.root, self.start, a, b, delta)
+        return self.parse()
+
+    def insert(self, idx, new_lines):
+        """ Insert new_lines before lines[idx] and re-parse. """
+        return self.replace(idx, idx, new_lines)
+
+    def delete(self, start, stop):
+        """ Delete lines[start:stop] and re-parse. """
+        return self.replace(start, stop, [])
+
+    # Parsing from scratch
+
+    def _parse(self, card, pos):
+        t = self._tracker
+        saved = t.max
+        t.max = -1
+        self.parsed += 1
+        try:
+            node = self._parse_card(card, pos)
+            node.reach = max(node.reach, t.max + 1 - pos)
+            return node
+        finally:
+            t.max = max(saved, t.max)
+
+    def _parse_card(self, card, pos):
+        if isinstance(card, DataCardOptional):
+            try:
+                child = self._parse(card.dl, pos)
+            except ValueError:
+                return Node(card, 0, (False, None))
+            return Node(card, child.n, (True, child.result), [child])
+        elif isinstance(card, DataCardAlternates):
+            return self._parse_alternates(card, pos)
+        elif isinstance(card, DataCardRepeat):
+            node = Node(card, 0, None, [])
+            node.uniform = True
+            node.row_results = []
+            return self._run_repeat(node, pos, pos)
+        elif isinstance(card, DataCardStack):
+            children = []
+            idx = pos
+            for dl in card._datalines:
+                child = self._parse(dl, idx)
+                idx += child.n
+                children.append(child)
+            return self._stack_node(card, pos, children)
+        n, result = card._parse(self._tracker, pos)
+        return Node(card, n, result)
+
+    def _parse_alternates(self, card, pos):
+        t = self._tracker
+        for i in card._candidates(t, pos):
+            fail_reach = t.max + 1 - pos
+            try:
+                child = self._parse(card.alt_list[i], pos)
+            except ValueError:
+                continue
+            node = Node(card, child.n, (i, child.result), [child],
+                        fail_reach=max(fail_reach, 0))
+            node.reach = max(node.fail_reach, child.reach)
+            return node
+        raise ReadError('None of the alternate datacards matched.', pos,
+                        card.name)
+
+    def _stack_node(self, card, pos, children):
+        node = Node(card, sum(c.n for c in children),
+                    [c.result for c in children], children)
+        offset = 0
+        for c in children:
+            node.reach = max(node.reach, offset + c.reach)
+            offset += c.n
+        return node
+
+    def _step(self, card, idx):
+        """ One step of DataCardRepeat._parse at idx: returns ('row', node),
+            ('end', node), or ('stop', None) if there are no more rows.
+        """
+        t = self._tracker
+        saved = t.max
+        t.max = -1
+        try:
+            if not _has_line(t, idx):
+                return 'stop', None
+            if card.end_record is not None:
+                try:
+                    return 'end', self._parse(card.end_record, idx)
+                except ValueError:
+                    pass
+                row = self._parse(card._repeated_record, idx)
+            else:
+                try:
+                    row = self._parse(card._repeated_record, idx)
+                except ValueError:
+                    return 'stop', None
+            # The row depends on the lines the end record looked at too.
+            row.reach = max(row.reach, t.max + 1 - idx)
+            return 'row', row
+        finally:
+            t.max = max(saved, t.max)
+
+    def _run_repeat(self, node, pos, idx, resync=None):
+        """ Parse rows of a DataCardRepeat from idx, appending them to node.
+            resync(idx) may return a function that completes the node from
+            the old parse once the parse is back in step with it.
+        """
+        card = node.card
+        rows = node.children
+        results = node.row_results
+        while True:
+            if resync is not None:
+                finish = resync(idx)
+                if finish is not None:
+                    return finish(node, idx)
+            kind, child = self._step(card, idx)
+            if kind == 'row':
+                rows.append(child)
+                results.append(child.result)
+                node.uniform = node.uniform and child.n == 1 \
+                    and child.reach == 1
+                idx += child.n
+                continue
+            if kind == 'end':
+                node.end = child
+                node.n = idx + child.n - pos
+                node.result = (results, True, child.result)
+                node.reach = max(node.reach, node.n - child.n + child.reach)
+            else:
+                node.n = idx - pos
+                node.result = (results, False, None)
+            node.reach = max(node.reach, node.n, self._tracker.max + 1 - pos)
+            return node
+
+    # Updating after an edit. a and b are the start and stop of the edited
+    # lines before the edit, relative to the node, and delta is the change
+    # in the number of lines.
+
+    def _update(self, node, pos, a, b, delta):
+        t = self._tracker
+        saved = t.max
+        t.max = -1
+        try:
+            new = self._update_card(node, pos, a, b, delta)
+            new.reach = max(new.reach, t.max + 1 - pos)
+            return new
+        finally:
+            t.max = max(saved, t.max)
+
+    def _update_child(self, old, offset, pos, new_pos, a, b, delta):
+        """ Returns the node for the card of old at new_pos, where old was
+            at offset in its parent and pos is the new position of the
+            parent.
+        """
+        rel = new_pos - pos
+        if rel == offset and offset + old.reach <= a:
+            return old
+        if rel == offset + delta and offset >= b:
+            return old
+        if rel == offset and a >= offset:
+            return self._update(old, new_pos, a - offset, b - offset, delta)
+        return self._parse(old.card, new_pos)
+
+    def _update_card(self, node, pos, a, b, delta):
+        card = node.card
+        if isinstance(card, DataCardOptional):
+            if node.children:
+                try:
+                    child = self._update_child(node.children[0], 0, pos,
+                                               pos, a, b, delta)
+                except ValueError:
+                    pass
+                else:
+                    new = Node(card, child.n, (True, child.result), [child])
+                    new.reach = child.reach
+                    return new
+            return self._parse_card(card, pos)
+        elif isinstance(card, DataCardAlternates):
+            if a >= node.fail_reach:
+                try:
+                    child = self._update_child(node.children[0], 0, pos,
+                                               pos, a, b, delta)
+                except ValueError:
+                    pass
+                else:
+                    new = Node(card, child.n, (node.result[0], child.result),
+                               [child], fail_reach=node.fail_reach)
+                    new.reach = max(node.fail_reach, child.reach)
+                    return new
+            return self._parse_alternates(card, pos)
+        elif isinstance(card, DataCardRepeat):
+            return self._update_repeat(node, pos, a, b, delta)
+        elif isinstance(card, DataCardStack):
+            children = []
+            idx = pos
+            offset = 0
+            for old in node.children:
+                child = self._update_child(old, offset, pos, idx, a, b,
+                                           delta)
+                offset += old.n
+                idx += child.n
+                children.append(child)
+            return self._stack_node(card, pos, children)
+        n, result = card._parse(self._tracker, pos)
+        self.parsed += 1
+        return Node(card, n, result)
+
+    def _update_repeat(self, node, pos, a, b, delta):
+        old_rows = node.children
+        if node.uniform:
+            offsets = None
+            first = min(a, len(old_rows))
+        else:
+            offsets = [0]
+            for r in old_rows:
+                offsets.append(offsets[-1] + r.n)
+            max_reach = max(r.reach for r in old_rows) if old_rows else 0
+            first = bisect.bisect_right(offsets, a, 0, len(old_rows)) - 1
+            first = max(first, 0)
+            # Earlier rows may have looked ahead into the edited lines.
+            i = first
+            while i > 0 and offsets[i - 1] + max_reach > a:
+                i -= 1
+                if offsets[i] + old_rows[i].reach > a:
+                    first = i
+            if first < len(old_rows) \
+                    and offsets[first] + old_rows[first].reach <= a:
+                first += 1
+        start = first if offsets is None else offsets[first]
+
+        new = Node(node.card, 0, None, old_rows[:first])
+        new.uniform = node.uniform
+        new.row_results = node.row_results[:first]
+
+        def resync(idx):
+            old_offset = idx - pos - delta
+            if old_offset < b:
+                return None
+            if offsets is None:
+                j = old_offset
+                if j > len(old_rows):
+                    return None
+            else:
+                j = _find(offsets, old_offset)
+                if j is None:
+                    return None
+            return lambda new, idx: self._finish_repeat(node, new, pos, idx,
+                                                        j, delta)
+
+        return self._run_repeat(new, pos, pos + start, resync)
+
+    def _finish_repeat(self, old, new, pos, idx, j, delta):
+        """ Complete new with the rows of old from row j and its end. """
+        new.children.extend(old.children[j:])
+        new.row_results.extend(old.row_results[j:])
+        new.uniform = new.uniform and old.uniform
+        new.end = old.end
+        new.n = old.n + delta
+        new.result = (new.row_results, old.result[1], old.result[2])
+        new.reach = max(new.n, old.reach + delta,
+                        self._tracker.max + 1 - pos)
+        return new
+
+
+def _find(offsets, value):
+    i = bisect.bisect_left(offsets, value)
+    if i < len(offsets) and offsets[i] == value:
+        return i
+    return None
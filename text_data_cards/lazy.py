@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+""" Card data that is decoded from the line on first access.
+
+    A DataCard created with lazy=True checks that the fields of a line can
+    be read when it parses it, with one regular expression rather than by
+    converting them, so it matches the same lines as an eager card, and
+    keeps the line itself. Its data is a LazyData mapping
+    that converts each field the first time it is looked up and keeps the
+    value. Scanning a large deck for a few fields then only converts those
+    fields.
+"""
+
+import collections
+import itertools
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # pragma: no cover
+    from collections import MutableMapping
+
+
+LazyLine = collections.namedtuple('LazyLine', 'line fixed source')
+LazyLine.__doc__ = """ Parse result of a lazy DataCard: the line, sliced to
+    the columns of the format, the values of the fixed fields and the whole
+    line.
+"""
+
+
+class LazyData(MutableMapping):
+    """ data dict of a lazily read card.
+
+        keys are the field names in order. decoders maps field names to
+        functions that convert the field from line, and values holds the
+        values known up front. Values assigned to the mapping replace the
+        decoded ones and set modified. A field that can't be converted
+        raises ValueError when it is looked up.
+    """
+
+    def __init__(self, keys=(), values=None, decoders=None, line=None):
+        self._keys = keys
+        self._values = {} if values is None else values
+        self._decoders = {} if decoders is None else decoders
+        self._line = line
+        self._links = None
+        self._deleted = None
+        self.modified = False
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if self._deleted is not None and key in self._deleted:
+            raise KeyError(key)
+        if key in self._decoders:
+            value = self._decoders[key](self._line)
+        elif self._links is not None and key in self._links:
+            value = self._links[key][key]
+        else:
+            raise KeyError(key)
+        self._values[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+        self.modified = True
+        if self._deleted is not None:
+            self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._values.pop(key, None)
+        self.modified = True
+        if self._deleted is None:
+            self._deleted = set()
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self._values:
+            return True
+        if self._deleted is not None and key in self._deleted:
+            return False
+        return key in self._decoders \
+            or (self._links is not None and key in self._links)
+
+    def __iter__(self):
+        seen = set()
+        for key in itertools.chain(self._keys, self._links or (),
+                                   list(self._values)):
+            if key not in seen and key in self:
+                seen.add(key)
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def link(self, key, mapping):
+        """ Look key up in mapping, on first access, instead. """
+        if self._links is None:
+            self._links = {}
+        self._links[key] = mapping
+        self._values.pop(key, None)
+        if self._deleted is not None:
+            self._deleted.discard(key)
+
+    def is_decoded(self, key):
+        """ Returns True if the value of key is already known. """
+        return key in self._values
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self))
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+""" Line sequences that can be passed to the read methods of the DataCard
+    classes in place of a list of lines.
+"""
+
+import array
+import codecs
+import mmap
+import os
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# Encodings with one byte per character, for which columns of a line can be
+# sliced from the bytes of the file.
+_SINGLE_BYTE = ('ascii', 'iso8859-1', 'cp1252')
+
+# Number of bytes scanned for newlines at a time with NumPy.
+_SCAN_BLOCK = 1 << 22
+
+
+class LineStream(object):
+    """ Sequence-like view of a file object or any iterator of lines.
+
+        Lines are pulled from the source only when they are indexed, so
+        only the lines between the last release() and the furthest line
+        looked at are held in memory. Indices are absolute line numbers
+        from the start of the source. Indexing a released line or a line
+        past the end of the source raises IndexError.
+
+        Trailing newline characters are stripped from each line.
+
+        pos is the index of the next line to be read by
+        DataCard.iter_read().
+    """
+
+    def __init__(self, source):
+        self._source = iter(source)
+        self._buf = []
+        self._base = 0
+        self._eof = False
+        self.pos = 0
+
+    def __getitem__(self, idx):
+        i = idx - self._base
+        if i < 0:
+            raise IndexError('Line %d has already been released' % idx)
+        while i >= len(self._buf):
+            if not self._fill():
+                raise IndexError('Line %d is past the end of input' % idx)
+        return self._buf[i]
+
+    def _fill(self):
+        if self._eof:
+            return False
+        try:
+            line = next(self._source)
+        except StopIteration:
+            self._eof = True
+            return False
+        self._buf.append(line.rstrip('\r\n'))
+        return True
+
+    def advance(self, n):
+        """ Move pos forward by n lines and release the lines before it. """
+        self.pos += n
+        self.release(self.pos)
+
+    def release(self, idx):
+        """ Discard buffered lines before line idx. """
+        i = idx - self._base
+        if i > 0:
+            del self._buf[:i]
+            self._base = idx
+
+    def buffered(self):
+        """ Number of lines currently held in memory. """
+        return len(self._buf)
+
+
+def _scan_newlines(buf, size):
+    """ Returns the offsets of the newlines in buf, and of its end if it
+        doesn't end with a newline.
+    """
+    if np is not None:
+        parts = []
+        for offset in range(0, size, _SCAN_BLOCK):
+            block = np.frombuffer(buf, dtype=np.uint8,
+                                  count=min(_SCAN_BLOCK, size - offset),
+                                  offset=offset)
+            parts.append(np.flatnonzero(block == 10) + offset)
+            del block
+        ends = array.array('q')
+        for part in parts:
+            ends.frombytes(part.astype(np.int64).tobytes())
+        if size and buf[size - 1:size] != b'\n':
+            ends.append(size)
+        return ends
+    ends = array.array('q')
+    pos = buf.find(b'\n')
+    while pos >= 0:
+        ends.append(pos)
+        pos = buf.find(b'\n', pos + 1)
+    if size and buf[size - 1:size] != b'\n':
+        ends.append(size)
+    return ends
+
+
+class MappedLines(object):
+    """ Sequence of the lines of a file, read through a memory map.
+
+        The file is scanned for newlines once, with NumPy if it is
+        installed, and only the line offsets are kept in memory. Indexing
+        returns a LineView of the line's bytes, which decodes only the
+        columns that are sliced from it. A trailing carriage return is
+        excluded from each line.
+
+        With a single-byte encoding such as the default latin-1, columns
+        are sliced directly from the file's bytes. With other encodings,
+        the whole line is decoded before slicing.
+
+        Close the MappedLines, or use it as a context manager, when done.
+        Values read into cards are ordinary strings and remain valid after
+        it is closed.
+    """
+
+    def __init__(self, path, encoding='latin-1'):
+        self.path = path
+        self.encoding = encoding
+        self._single_byte = codecs.lookup(encoding).name in _SINGLE_BYTE
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._buf = b''
+        self._ends = _scan_newlines(self._buf, size)
+
+    def __len__(self):
+        return len(self._ends)
+
+    def span(self, idx):
+        """ Returns the byte offsets of the start and end of line idx. """
+        if idx < 0:
+            idx += len(self._ends)
+        if idx < 0:
+            raise IndexError('Line index out of range')
+        try:
+            end = self._ends[idx]
+        except IndexError:
+            raise IndexError('Line %d is past the end of input' % idx)
+        start = self._ends[idx - 1] + 1 if idx else 0
+        # 13 is a carriage return.
+        if end > start and self._buf[end - 1] in (13, b'\r'):
+            end -= 1
+        return start, end
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        start, end = self.span(idx)
+        return LineView(self, start, end)
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LineView(object):
+    """ A line of a MappedLines that is decoded only as far as needed.
+
+        Slicing returns the decoded columns, str() the whole line. Views
+        compare equal to the str of the same line.
+    """
+
+    __slots__ = ('_lines', '_start', '_end')
+
+    def __init__(self, lines, start, end):
+        self._lines = lines
+        self._start = start
+        self._end = end
+
+    def __str__(self):
+        return self._lines._buf[self._start:self._end].decode(
+            self._lines.encoding)
+
+    def __getitem__(self, key):
+        if self._lines._single_byte and isinstance(key, slice) \
+                and key.step is None:
+            a, b, step = key.indices(self._end - self._start)
+            if b <= a:
+                return ''
+            return self._lines._buf[self._start + a:self._start + b] \
+                .decode(self._lines.encoding)
+        return str(self)[key]
+
+    def __len__(self):
+        if self._lines._single_byte:
+            return self._end - self._start
+        return len(str(self))
+
+    def __contains__(self, text):
+        if self._lines._single_byte:
+            return self._lines._buf.find(text.encode(self._lines.encoding),
+                                         self._start, self._end) >= 0
+        return text in str(self)
+
+    def __eq__(self, other):
+        if isinstance(other, LineView):
+            other = str(other)
+        return str(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return 'LineView(%r)' % str(self)
+
+
+def text_or(line, default=None):
+    """ Returns line, a str or LineView, as a str, or default if it is a
+        LineView whose MappedLines has been closed.
+    """
+    try:
+        return str(line)
+    except ValueError:
+        return default
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+""" Match lines against many fixed text literals at once.
+
+    A literal is a (start, width, text) tuple, as returned by a card's
+    _discriminators(): a line contains it if line[start:start + width],
+    padded with blanks to width, equals text, or, if width is None, if
+    line[start:] equals text. Keyword cards, prefixes such as '$INCLUDE' and
+    column ranges of request cards are all literals.
+
+    LiteralIndex groups literals by column range and keeps one dict of
+    texts per range, so a line is resolved against all of them with one
+    slice and hash lookup per distinct column range rather than one
+    comparison per literal.
+"""
+
+
+def holds(literal, line):
+    """ Returns True if line contains literal. """
+    start, width, text = literal
+    if width is None:
+        return line[start:] == text
+    return line[start:start + width].ljust(width) == text
+
+
+def literal_test(literals):
+    """ Returns a LiteralTest for literals, or None if literals is empty. """
+    literals = list(literals)
+    return LiteralTest(literals) if literals else None
+
+
+class LiteralTest(object):
+    """ Callable that tests whether a line contains all of literals. Unlike
+        a closure, it can be pickled with the card that holds it.
+    """
+
+    __slots__ = ('literals',)
+
+    def __init__(self, literals):
+        self.literals = tuple(
+            (start, width, text if width is None else text.ljust(width))
+            for start, width, text in literals)
+
+    def __call__(self, line):
+        for start, width, text in self.literals:
+            if width is None:
+                if line[start:] != text:
+                    return False
+            elif line[start:start + width].ljust(width) != text:
+                return False
+        return True
+
+    def __getstate__(self):
+        return self.literals
+
+    def __setstate__(self, state):
+        self.literals = state
+
+
+class LiteralIndex(object):
+    """ Index of values by literal. lookup() returns the values of all the
+        literals a line contains.
+    """
+
+    def __init__(self, items=()):
+        self._columns = {}
+        self._ranges = []
+        for literal, value in items:
+            self.add(literal, value)
+
+    def add(self, literal, value):
+        """ Add value under literal. A literal wider than its column range
+            can't be contained in any line and is left out.
+        """
+        start, width, text = literal
+        if width is not None and len(text) > width:
+            return
+        if width is not None:
+            text = text.ljust(width)
+        texts = self._columns.get((start, width))
+        if texts is None:
+            texts = self._columns[(start, width)] = {}
+            self._ranges = sorted(self._columns.items(),
+                                  key=lambda item: (item[0][0],
+                                                    item[0][1] or 0))
+        texts.setdefault(text, []).append(value)
+
+    def lookup(self, line):
+        """ Returns a list of the values of the literals that line contains,
+            ordered by the start column and width of their column range and
+            then by when they were added.
+        """
+        found = []
+        for (start, width), texts in self._ranges:
+            if width is None:
+                key = line[start:]
+            else:
+                key = line[start:start + width]
+                if len(key) < width:
+                    key = key.ljust(width)
+            values = texts.get(key)
+            if values is not None:
+                found.extend(values)
+        return found
+
+    def __len__(self):
+        return sum(len(values) for texts in self._columns.values()
+                   for values in texts.values())
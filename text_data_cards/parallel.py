@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+""" Parse large repeated blocks on several processes.
+
+    Most of the lines of a large deck are rows of a few DataCardRepeat
+    blocks. When the repeated record and the end record are single-line
+    cards, every line of the block is either a row or the end of the
+    block, so the block can be cut into chunks of lines that are parsed
+    independently. parallel_parse() walks the card tree like _parse(),
+    parses such blocks a chunk at a time on a concurrent.futures executor,
+    a process pool by default, and merges the rows back in order. The
+    first chunk that reaches the end record, or a row that fails to parse,
+    ends the block exactly where a serial parse would. Everything else is
+    parsed serially in the calling process.
+
+    Chunks are submitted a few at a time ahead of the chunk being merged,
+    so little work is wasted past the end of a block. The end of the block
+    is first looked for with the end record's match(), after a check of
+    its fixed text if it has any, so that only the lines of the block are
+    submitted.
+
+    Post read hooks are not run by the workers; they run in the calling
+    process when the result is applied, as with any other parse.
+"""
+
+import concurrent.futures
+
+from .text_data_cards import DataCardAlternates, DataCardRepeat, \
+    DataCardStack, ReadError
+
+
+def _single_line(card):
+    return card is not None and not isinstance(card, DataCardStack)
+
+
+def _splittable(card):
+    return _single_line(card._repeated_record) \
+        and (card.end_record is None or _single_line(card.end_record))
+
+
+def _worker_copy(card):
+    """ Copy of a single-line card without its post read hook, which may
+        not be picklable and isn't needed to parse.
+    """
+    if card is None:
+        return None
+    rec = card._new_record()
+    rec.post_read_hook = None
+    return rec
+
+
+def parse_rows(row, end, lines):
+    """ Parse a chunk of a repeated block. Returns the list of row results,
+        the index in lines where parsing stopped and a tuple of how it
+        stopped: ('end', end result), ('error', exception) or ('stop',
+        None) if a row didn't match and there is no end record. The last
+        item is None if every line was a row.
+    """
+    rows = []
+    for i in range(len(lines)):
+        if end is not None:
+            try:
+                n, r = end._parse(lines, i)
+            except ValueError:
+                pass
+            else:
+                return rows, i, ('end', r)
+            try:
+                n, r = row._parse(lines, i)
+            except ValueError as e:
+                return rows, i, ('error', e)
+        else:
+            try:
+                n, r = row._parse(lines, i)
+            except ValueError:
+                return rows, i, ('stop', None)
+        rows.append(r)
+    return rows, len(lines), None
+
+
+class _Parser(object):
+
+    def __init__(self, executor, chunk_size, window):
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.window = window
+
+    def parse(self, card, lines, start):
+        if isinstance(card, DataCardRepeat):
+            if _splittable(card):
+                return self.parse_repeat(card, lines, start)
+        elif isinstance(card, DataCardStack) \
+                and not isinstance(card, DataCardAlternates):
+            results = []
+            line_idx = start
+            for dl in card._datalines:
+                n, r = self.parse(dl, lines, line_idx)
+                line_idx += n
+                results.append(r)
+            return line_idx - start, results
+        return card._parse(lines, start)
+
+    def parse_repeat(self, card, lines, start):
+        stop = len(lines)
+        if card.end_record is not None:
+            stop = min(card._end_index(lines, start) + 1, stop)
+        if stop - start < 2 * self.chunk_size:
+            return card._parse(lines, start)
+
+        row = _worker_copy(card._repeated_record)
+        end = _worker_copy(card.end_record)
+        chunks = iter(range(start, stop, self.chunk_size))
+        pending = []
+
+        def submit():
+            a = next(chunks, None)
+            if a is not None:
+                pending.append((a, self.executor.submit(
+                    parse_rows, row, end, lines[a:min(a + self.chunk_size,
+                                                      stop)])))
+
+        for i in range(self.window):
+            submit()
+        rows = []
+        try:
+            while pending:
+                a, future = pending.pop(0)
+                chunk_rows, i, how = future.result()
+                rows.extend(chunk_rows)
+                if how is not None:
+                    kind, value = how
+                    if kind == 'end':
+                        return a + i + 1 - start, (rows, True, value)
+                    elif kind == 'error':
+                        if isinstance(value, ReadError):
+                            # Line numbers are relative to the chunk.
+                            if value.line_number is not None:
+                                value.line_number += a
+                            if value.card is None:
+                                value.card = card.name
+                        raise value
+                    return a + i - start, (rows, False, None)
+                submit()
+        finally:
+            for a, future in pending:
+                future.cancel()
+        return stop - start, (rows, False, None)
+
+
+def parallel_parse(card, lines, start=0, executor=None, max_workers=None,
+                   chunk_size=5000):
+    """ Parse lines beginning at lines[start] like card._parse(), with the
+        rows of large repeated blocks parsed in parallel. lines must be a
+        list.
+
+        executor is a concurrent.futures executor to use. By default a
+        ProcessPoolExecutor with max_workers processes is created for the
+        call. Blocks shorter than two chunks of chunk_size lines are
+        parsed serially.
+    """
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as pool:
+            return parallel_parse(card, lines, start, pool,
+                                  chunk_size=chunk_size)
+    window = 2 * (getattr(executor, '_max_workers', None) or 1)
+    return _Parser(executor, chunk_size, window).parse(card, lines, start)
+
+
+def parallel_read(card, lines, start=0, executor=None, max_workers=None,
+                  chunk_size=5000):
+    """ Read lines into card with parallel_parse(). Returns the number of
+        lines read.
+    """
+    n, result = parallel_parse(card, lines, start, executor, max_workers,
+                               chunk_size)
+    card._apply(result)
+    return n
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+""" Count calls, time and lines per card to find out why a deck is slow.
+
+    While a Profiler is enabled, the read, match, parse, apply, write and
+    record copy methods of the card classes are replaced by wrappers that
+    record, for each card, the number of calls of each method, the time
+    spent in it (in total and excluding the cards it called), the number of
+    lines parsed, parses that failed, failed trial parses of the alternates
+    of DataCardAlternates and DataCardOptional, and the copy.copy() and
+    copy.deepcopy() calls made on it. Cards are identified by their class
+    and name.
+
+    The original methods are put back when the profiler is disabled, so
+    reading is not slowed down at all when no profiler is enabled. Only
+    one profiler can be enabled at a time, and it records calls from all
+    threads into one set of counters, so profile one thread at a time.
+    Parsers compiled with compile_grammar() before the profiler was
+    enabled call the original methods and are not recorded.
+
+        with profiling() as prof:
+            deck.read(lines)
+        print(prof.report())
+"""
+
+import collections
+import copy
+import json
+import time
+
+from . import text_data_cards as _tdc
+
+
+# Methods wrapped, with the names they are reported under.
+METHODS = collections.OrderedDict([
+    ('read', 'read'), ('_read', 'read'), ('match', 'match'),
+    ('_parse', 'parse'), ('_apply', 'apply'), ('write', 'write'),
+    ('_new_record', 'new_record')])
+
+CLASSES = (_tdc.DataCard, _tdc.DataCardFixedText, _tdc.DataCardStack,
+           _tdc.DataCardRepeat, _tdc.DataCardAlternates,
+           _tdc.DataCardOptional)
+
+# Columns of report(): counter name and heading.
+COLUMNS = [('read.calls', 'read'), ('match.calls', 'match'),
+           ('parse.calls', 'parse'), ('parse.failed', 'failed'),
+           ('failed_trials', 'trials'), ('lines', 'lines'),
+           ('write.calls', 'write'), ('new_record.calls', 'records'),
+           ('copies', 'copies'), ('deepcopies', 'deep'),
+           ('parse.time', 'parse s'), ('self_time', 'self s')]
+
+_active = [None]
+
+
+def card_key(card):
+    """ Returns the name cards are reported under: the class name, followed
+        by the card's name if it has one.
+    """
+    name = getattr(card, 'name', None)
+    cls = type(card).__name__
+    return cls if name is None else '%s:%s' % (cls, name)
+
+
+class _CopyModule(object):
+    """ Stands in for the copy module in text_data_cards to count copies
+        of cards.
+    """
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def copy(self, x):
+        if isinstance(x, _tdc.DataCard):
+            self._profiler._counters(x)['copies'] += 1
+        return copy.copy(x)
+
+    def deepcopy(self, x, memo=None):
+        for card in x if isinstance(x, list) else [x]:
+            if isinstance(card, _tdc.DataCard):
+                self._profiler._counters(card)['deepcopies'] += 1
+        return copy.deepcopy(x, memo)
+
+
+class Profiler(object):
+    """ Records calls of card methods while enabled. Use it as a context
+        manager, or call enable() and disable(). Counters add up over
+        several enabled periods until reset() is called.
+    """
+
+    def __init__(self):
+        self._stats = collections.defaultdict(collections.Counter)
+        self._classes = {}
+        # One frame per wrapped call in progress: the card, the method and
+        # the time spent in the calls it made.
+        self._stack = []
+        self._saved = None
+
+    def enable(self):
+        if _active[0] is not None:
+            raise RuntimeError('A Profiler is already enabled')
+        _active[0] = self
+        saved = []
+        for cls in CLASSES:
+            for method, report_as in METHODS.items():
+                if method in vars(cls):
+                    func = vars(cls)[method]
+                    saved.append((cls, method, func))
+                    setattr(cls, method, self._wrap(func, report_as))
+        saved.append((_tdc, 'copy', _tdc.copy))
+        _tdc.copy = _CopyModule(self)
+        self._saved = saved
+
+    def disable(self):
+        if _active[0] is not self:
+            return
+        for obj, attr, value in self._saved:
+            setattr(obj, attr, value)
+        self._saved = None
+        _active[0] = None
+
+    @property
+    def enabled(self):
+        return _active[0] is self
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def reset(self):
+        """ Clear the counters. """
+        self._stats.clear()
+        self._classes.clear()
+
+    def _counters(self, card):
+        key = card_key(card)
+        self._classes[key] = type(card).__name__
+        return self._stats[key]
+
+    def _wrap(self, func, method):
+        profiler = self
+        stack = self._stack
+        clock = time.perf_counter
+
+        def wrapper(card, *args, **kwargs):
+            parent = stack[-1] if stack else None
+            frame = [card, method, 0.0]
+            stack.append(frame)
+            failed = False
+            result = None
+            t0 = clock()
+            try:
+                result = func(card, *args, **kwargs)
+                return result
+            except ValueError:
+                failed = True
+                raise
+            finally:
+                dt = clock() - t0
+                stack.pop()
+                if stack:
+                    stack[-1][2] += dt
+                c = profiler._counters(card)
+                c[method + '.calls'] += 1
+                c[method + '.time'] += dt
+                c['self_time'] += dt - frame[2]
+                if method == 'parse':
+                    if failed:
+                        c['parse.failed'] += 1
+                        if parent is not None and parent[1] == 'parse' \
+                                and isinstance(parent[0],
+                                               _tdc.DataCardAlternates):
+                            profiler._counters(parent[0])[
+                                'failed_trials'] += 1
+                    elif result is not None:
+                        c['lines'] += result[0]
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def stats(self, by='card'):
+        """ Returns a dict mapping each card, or each card class if by is
+            'class', to a dict of its counters: '<method>.calls' and
+            '<method>.time' for the methods read, match, parse, apply,
+            write and new_record, 'parse.failed', 'failed_trials', 'lines',
+            'copies', 'deepcopies' and 'self_time'. Times are in seconds.
+        """
+        if by not in ('card', 'class'):
+            raise ValueError("by must be 'card' or 'class'")
+        result = {}
+        for key, counters in self._stats.items():
+            if by == 'class':
+                key = self._classes[key]
+            result.setdefault(key, collections.Counter()).update(counters)
+        return dict((key, dict(counters)) for key, counters in result.items())
+
+    def to_json(self, by='card', **kwargs):
+        """ Returns stats(by) as a JSON string. kwargs are passed to
+            json.dumps().
+        """
+        return json.dumps(self.stats(by), sort_keys=True, **kwargs)
+
+    def report(self, by='card', limit=None):
+        """ Returns a text table of the counters of each card, or of each
+            card class if by is 'class', slowest first by the time spent in
+            the card itself.
+        """
+        stats = sorted(self.stats(by).items(),
+                       key=lambda item: -item[1].get('self_time', 0))
+        if limit is not None:
+            stats = stats[:limit]
+        width = max([len(by)] + [len(key) for key, c in stats])
+        rows = ['%-*s' % (width, by) + ''.join(
+            '%9s' % heading for name, heading in COLUMNS)]
+        for key, counters in stats:
+            cells = []
+            for name, heading in COLUMNS:
+                value = counters.get(name, 0)
+                if name.endswith('time'):
+                    cells.append('%9.4f' % value)
+                else:
+                    cells.append('%9d' % value)
+            rows.append('%-*s' % (width, key) + ''.join(cells))
+        return '\n'.join(rows)
+
+
+def profiling():
+    """ Returns a new Profiler, to be used as a context manager:
+
+            with profiling() as prof:
+                deck.read(lines)
+            print(prof.report())
+    """
+    return Profiler()
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+""" Publish read decks in shared memory for other processes.
+
+    publish() copies the rows of each DataCardRepeat of a card that has
+    been read, and the values of its other fields, into one
+    multiprocessing.shared_memory block. Each repeated block becomes a
+    table of fixed-layout NumPy columns: int64, float64 or fixed-width
+    unicode strings. publish() returns a SharedDeck that owns the block,
+    and its small, picklable handle can be sent to worker processes, which
+    attach() to the same memory instead of parsing the deck again or
+    unpickling a copy of it.
+
+    The columns of an attached SharedDeck are read-only views of the
+    shared memory. Columns with missing values (None) are masked arrays
+    whose mask is also in shared memory. A SharedDeck must be closed in
+    every process once its columns are no longer used, and the owner must
+    unlink() the block when no process needs it any more.
+
+    NumPy and Python 3.8 or later are needed.
+"""
+
+import collections
+import json
+import struct
+import sys
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # pragma: no cover
+    resource_tracker = shared_memory = None
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .columnar import ColumnTable
+from .fastformat import field_layout
+from .text_data_cards import DataCard, DataCardRepeat, DataCardStack
+
+
+SharedDeckHandle = collections.namedtuple('SharedDeckHandle', 'name size')
+SharedDeckHandle.__doc__ = """ Name and size of the shared memory block of
+    a SharedDeck, to pass to attach() in another process.
+"""
+
+_ALIGN = 16
+_PREFIX = struct.Struct('<QQ')
+
+# Before Python 3.13, SharedMemory registers every block it opens with the
+# resource tracker, which unlinks the blocks left at exit, even in the
+# processes that only attached to them.
+_UNTRACK = shared_memory is not None and sys.version_info < (3, 13) \
+    and getattr(shared_memory, '_USE_POSIX', False)
+
+
+def _require_shared_memory():
+    if np is None:
+        raise ImportError('NumPy is required for shared memory decks. '
+                          'Install from pip: pip install numpy')
+    if shared_memory is None:  # pragma: no cover
+        raise ImportError('multiprocessing.shared_memory needs Python 3.8 '
+                          'or later')
+
+
+def _tables(card, tables):
+    """ Append the DataCardRepeat blocks in card to tables, outside the rows
+        of other blocks, in order. Returns tables.
+    """
+    if isinstance(card, DataCardRepeat):
+        tables.append(card)
+    elif isinstance(card, DataCardStack):
+        for dl in card._datalines:
+            _tables(dl, tables)
+    return tables
+
+
+def _scalar(value):
+    return value is None or isinstance(value, (int, float, str))
+
+
+def _kinds(card):
+    """ Returns a dict of field name to edit descriptor kind for the rows of
+        a repeated single-line record with a fixed-width format.
+    """
+    record = card._repeated_record
+    if type(record) is not DataCard:
+        return {}
+    schema = record._schema
+    layout = field_layout(schema.format)
+    if layout is None or len(layout) != len(schema.fields):
+        return {}
+    return dict((f, field.kind) for f, field in zip(schema.fields, layout)
+                if f is not None)
+
+
+def _column(values, kind):
+    """ Returns a fixed-layout array of values and a boolean array of the
+        missing ones, or None if no value is missing.
+    """
+    present = [v for v in values if v is not None]
+    mask = None
+    if len(present) < len(values):
+        mask = np.array([v is None for v in values], dtype=bool)
+    if kind is None:
+        types = set(map(type, present))
+        kind = 'I' if types <= {int} and types \
+            else 'F' if types <= {int, float} and types else 'A'
+    if kind == 'I':
+        dtype, fill = np.int64, 0
+    elif kind == 'A':
+        dtype, fill = str, ''
+        values = [v if isinstance(v, str) or v is None else str(v)
+                  for v in values]
+    else:
+        dtype, fill = np.float64, 0.0
+    if mask is not None:
+        values = [fill if v is None else v for v in values]
+    column = np.array(values, dtype=dtype)
+    if column.dtype.kind == 'U' and column.dtype.itemsize == 0:
+        column = column.astype('U1')
+    return column, mask
+
+
+def _row_fields(card):
+    """ Returns the field names of the rows of card in order. """
+    fields = [f for f in card._repeated_record._fields if f is not None]
+    seen = set(fields)
+    for row in card.data:
+        for f in row:
+            if f not in seen and _scalar(row[f]):
+                seen.add(f)
+                fields.append(f)
+    return fields
+
+
+class SharedDeck(object):
+    """ Tables and data of a deck in a shared memory block.
+
+        tables is a dict of a columnar.ColumnTable per DataCardRepeat,
+        keyed by the name of the card, or 'table0', 'table1'... for cards
+        without a name, in the order they appear in the deck. data is a
+        dict of the other scalar values in the card's data. handle is the
+        SharedDeckHandle to attach() to the block from another process.
+
+        Use publish() and attach() to create it.
+    """
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self.owner = owner
+        self.handle = SharedDeckHandle(shm.name, shm.size)
+        buf = shm.buf
+        offset, size = _PREFIX.unpack_from(buf, 0)
+        header = json.loads(bytes(buf[offset:offset + size])
+                            .decode('utf-8'))
+        self.data = dict((k, v) for k, v in header['data'])
+        self.tables = {}
+        for name, nrows, num_lines, fields in header['tables']:
+            columns = []
+            for field, dtype, offset, mask_offset in fields:
+                # frombuffer keeps the buffer exported, so that the block
+                # can't be closed under arrays that are still in use.
+                column = np.frombuffer(buf, dtype, nrows, offset)
+                column.flags.writeable = False
+                if mask_offset is not None:
+                    mask = np.frombuffer(buf, bool, nrows, mask_offset)
+                    mask.flags.writeable = False
+                    column = np.ma.MaskedArray(column, mask, copy=False)
+                columns.append(column)
+            self.tables[name] = ColumnTable([f[0] for f in fields], columns,
+                                            nrows, num_lines)
+
+    def close(self):
+        """ Release the tables and close the shared memory block in this
+            process. Raises BufferError if columns of the tables are still
+            referenced elsewhere.
+        """
+        if self._shm is None:
+            return
+        self.tables = {}
+        self._shm.close()
+        self._shm = None
+
+    def unlink(self):
+        """ Close the block and free it once all processes have closed it.
+            Only the owner should call it.
+        """
+        name = self.handle.name
+        shm = self._shm
+        self.close()
+        if shm is None:
+            shm = _open(name)
+            shm.close()
+        if _UNTRACK:
+            # A process attached in this process or sharing its resource
+            # tracker has removed the registration shm.unlink() removes.
+            resource_tracker.register(shm._name, 'shared_memory')
+        shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
+
+
+def _open(name):
+    # Attaching processes shouldn't unlink the block when they exit.
+    if sys.version_info >= (3, 13):  # pragma: no cover
+        return shared_memory.SharedMemory(name, track=False)
+    shm = shared_memory.SharedMemory(name)
+    if _UNTRACK:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def publish(card, name=None):
+    """ Copy the tables and data of card, which must have been read, into a
+        new shared memory block, named name if given. Returns the owning
+        SharedDeck.
+    """
+    _require_shared_memory()
+    data = [] if isinstance(card, DataCardRepeat) else \
+        [[k, v] for k, v in card.data.items() if _scalar(v)]
+    tables = []
+    arrays = []
+    names = set()
+    for i, table in enumerate(_tables(card, [])):
+        key = table.name if table.name is not None else 'table%d' % i
+        if key in names:
+            raise ValueError('Duplicate table name %r' % (key,))
+        names.add(key)
+        kinds = _kinds(table)
+        fields = []
+        for f in _row_fields(table):
+            try:
+                column, mask = _column([row.get(f) for row in table.data],
+                                       kinds.get(f))
+            except OverflowError:
+                raise ValueError('Field %r of table %r has a value too '
+                                 'large for a shared column' % (f, key))
+            fields.append([f, column.dtype.str, column, mask])
+            arrays.append(column)
+            if mask is not None:
+                arrays.append(mask)
+        tables.append([key, len(table.data), table.num_lines(), fields])
+
+    # The arrays are laid out first, then the header, whose offset and
+    # size are in the first 16 bytes.
+    offsets = {}
+    pos = _PREFIX.size
+    for a in arrays:
+        pos += -pos % _ALIGN
+        offsets[id(a)] = pos
+        pos += a.nbytes
+    text = json.dumps({
+        'data': data,
+        'tables': [[t, nrows, num_lines,
+                    [[f, dtype, offsets[id(column)],
+                      None if mask is None else offsets[id(mask)]]
+                     for f, dtype, column, mask in fields]]
+                   for t, nrows, num_lines, fields in tables]
+    }).encode('utf-8')
+    shm = shared_memory.SharedMemory(name, create=True,
+                                     size=pos + len(text))
+    try:
+        buf = shm.buf
+        _PREFIX.pack_into(buf, 0, pos, len(text))
+        buf[pos:pos + len(text)] = text
+        for a in arrays:
+            if a.nbytes:
+                np.ndarray(a.shape, a.dtype, buf, offsets[id(a)])[:] = a
+        del buf
+        return SharedDeck(shm, owner=True)
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+
+def attach(handle):
+    """ Attach to the shared memory block of a SharedDeck published by
+        another process, given its SharedDeckHandle or name. Returns a
+        read-only SharedDeck that doesn't own the block.
+    """
+    _require_shared_memory()
+    name = getattr(handle, 'name', handle)
+    return SharedDeck(_open(name), owner=False)
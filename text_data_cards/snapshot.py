@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+""" Binary snapshots of read cards for reloading without parsing.
+
+    save_snapshot() writes the state of a card that has been read, and of
+    everything in it, to a file: the rows of each DataCardRepeat, which
+    alternate of each DataCardAlternates matched, whether each
+    DataCardOptional matched, and the values and source line of each
+    DataCard. load_snapshot() reads the file back into a card with the same
+    layout, as if the deck had just been read: post read hooks run, data
+    holds the same values and write() returns the same lines.
+
+    The values of a field are stored together, as a column, for all the
+    records read with the same card of the layout (all the rows of a
+    repeated block, for example). Columns of integers or floats are stored
+    as packed little-endian arrays of int64 or float64, aligned to 8 bytes;
+    other columns and the source lines are stored as JSON lists. Loading
+    maps the file into memory and converts each packed array to a list of
+    values in one call, since the cards hold their values in data dicts,
+    and closes the mapping before the card is populated. The file starts with a
+    version number and a signature of the card layout, and loading a file
+    of another version or layout raises ValueError. Unlike a ParseCache
+    file, a snapshot is not a pickle and loading one can't run code.
+
+    Unchanged cards of lazily read DataCards are stored as just their
+    source line and are lazily read again when the snapshot is loaded.
+"""
+
+import array
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+
+from .cache import signature
+from .lazy import LazyData
+from .lines import text_or
+from .text_data_cards import DataCard, DataCardAlternates, \
+    DataCardFixedText, DataCardOptional, DataCardRepeat, DataCardStack, \
+    ParsedLine
+
+
+MAGIC = b'TDCSNAP\n'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+_SWAP = sys.byteorder != 'little'
+
+
+def _layout(card, nodes):
+    """ Append card and the cards of its layout to nodes in a fixed order.
+        Returns nodes.
+    """
+    nodes.append(card)
+    if isinstance(card, DataCardOptional):
+        _layout(card.dl, nodes)
+    elif isinstance(card, DataCardAlternates):
+        for dl in card.alt_list:
+            _layout(dl, nodes)
+    elif isinstance(card, DataCardRepeat):
+        _layout(card._repeated_record, nodes)
+        if card.end_record is not None:
+            _layout(card.end_record, nodes)
+    elif isinstance(card, DataCardStack):
+        for dl in card._datalines:
+            _layout(dl, nodes)
+    return nodes
+
+
+def _str(source):
+    """ Returns source as a str, or None. """
+    if source is None:
+        return None
+    return text_or(source)
+
+
+def _source(card):
+    """ Returns the source line of card as a str, or None if it has none or
+        has been changed since it was read.
+    """
+    return None if card.dirty else _str(card.source)
+
+
+def _result(card):
+    """ Returns a result like card._parse() would for the current state of
+        card, as if its data had been read from lines.
+    """
+    if isinstance(card, DataCardOptional):
+        if card.dl_matched is None:
+            return (False, None)
+        return (True, _result(card.dl))
+    elif isinstance(card, DataCardAlternates):
+        for i, dl in enumerate(card.alt_list):
+            if dl is card.dl_matched:
+                return (i, _result(dl))
+        raise ValueError('DataCardAlternates has not been read')
+    elif isinstance(card, DataCardRepeat):
+        rows = card._datalines
+        found = bool(rows) and card.end_record is not None \
+            and rows[-1] is card.end_record
+        if found:
+            rows = rows[:-1]
+        if card.compact:
+            rows = card.data
+            results = [ParsedLine(rows.values(i), _str(rows.source(i)))
+                       for i in range(len(rows))]
+        else:
+            results = [_result(r) for r in rows]
+        return (results, found,
+                _result(card.end_record) if found else None)
+    elif isinstance(card, DataCardStack):
+        results = []
+        for dl in card._datalines:
+            card._sync_down(dl)
+            results.append(_result(dl))
+        return results
+    elif isinstance(card, DataCardFixedText):
+        return None if card.columns is None else card.source
+    source = _source(card)
+    if source is not None and type(card._source_values) is LazyData:
+        # Unchanged lazy data is read from the source again on loading.
+        return source
+    return ParsedLine([None if f is None else card.data[f]
+                       for f in card._fields], source)
+
+
+class _Columns(object):
+    """ Values of the records of one card of the layout, a list per field
+        and the list of source lines.
+    """
+
+    def __init__(self, card):
+        # Only the DataCards of the layout hold values. Unnamed fields are
+        # None.
+        self.fields = [] if isinstance(card, DataCardStack) \
+            else [None if f is None else [] for f in card._fields]
+        self.sources = []
+
+
+def _encode(card, result, structure, columns):
+    """ Add result, parsed with card, to the structure list and to the
+        _Columns of the cards of the layout.
+    """
+    if isinstance(card, DataCardOptional):
+        matched, r = result
+        structure.append(1 if matched else 0)
+        if matched:
+            _encode(card.dl, r, structure, columns)
+    elif isinstance(card, DataCardAlternates):
+        i, r = result
+        structure.append(i)
+        _encode(card.alt_list[i], r, structure, columns)
+    elif isinstance(card, DataCardRepeat):
+        rows, found, end_result = result
+        structure.append(len(rows))
+        structure.append(1 if found else 0)
+        for r in rows:
+            _encode(card._repeated_record, r, structure, columns)
+        if found:
+            _encode(card.end_record, end_result, structure, columns)
+    elif isinstance(card, DataCardStack):
+        for dl, r in zip(card._datalines, result):
+            _encode(dl, r, structure, columns)
+    elif isinstance(card, DataCardFixedText):
+        columns[id(card)].sources.append(result)
+    else:
+        cols = columns[id(card)]
+        if card.lazy:
+            structure.append(0 if type(result) is ParsedLine else 1)
+            if type(result) is not ParsedLine:
+                cols.sources.append(result)
+                return
+        cols.sources.append(result.source)
+        for values, value in zip(cols.fields, result.values):
+            if values is not None:
+                values.append(value)
+
+
+def _pack(values):
+    """ Returns the (kind, bytes) of a column. kind is 'q' or 'd' for a
+        packed array of int64 or float64, or 'json'.
+    """
+    types = set(map(type, values))
+    if types == {int} or types == {float}:
+        kind = 'q' if types == {int} else 'd'
+        try:
+            packed = array.array(kind, values)
+        except OverflowError:
+            pass
+        else:
+            if _SWAP:  # pragma: no cover
+                packed.byteswap()
+            return kind, packed.tobytes()
+    return 'json', json.dumps(values).encode('utf-8')
+
+
+def save_snapshot(card, path):
+    """ Write a snapshot of card, which must have been read, to the file at
+        path. The file is replaced atomically.
+    """
+    nodes = _layout(card, [])
+    columns = dict((id(c), _Columns(c)) for c in nodes)
+    structure = []
+    _encode(card, _result(card), structure, columns)
+
+    sections = []
+    offset = [0]
+
+    def add(kind, data):
+        entry = [kind, offset[0], len(data)]
+        sections.append(data + b'\0' * (-len(data) % 8))
+        offset[0] += len(data) + (-len(data) % 8)
+        return entry
+
+    header = {'signature': repr(signature(card)),
+              'structure': add(*_pack(structure)),
+              'nodes': []}
+    for c in nodes:
+        cols = columns[id(c)]
+        header['nodes'].append({
+            'sources': add(*_pack(cols.sources)),
+            'fields': [None if values is None else add(*_pack(values))
+                       for values in cols.fields]})
+    header = json.dumps(header).encode('utf-8')
+    header += b' ' * (-(_HEADER.size + len(header)) % 8)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for data in sections:
+            f.write(data)
+    getattr(os, 'replace', os.rename)(tmp, path)
+
+
+def _unpack(buf, base, entry):
+    """ Returns the list of values of a column stored in buf. Packed arrays
+        are converted through a memoryview of buf, without an intermediate
+        copy of their bytes.
+    """
+    kind, offset, size = entry
+    start = base + offset
+    if kind == 'json':
+        return json.loads(bytes(buf[start:start + size]).decode('utf-8'))
+    if _SWAP:  # pragma: no cover
+        values = array.array(kind, bytes(buf[start:start + size]))
+        values.byteswap()
+        return values.tolist()
+    view = buf[start:start + size].cast(kind)
+    try:
+        return view.tolist()
+    finally:
+        view.release()
+
+
+def _decode(card, structure, columns):
+    """ Returns the result of card read back from the structure iterator
+        and the iterators of the columns of the cards of the layout.
+    """
+    if isinstance(card, DataCardOptional):
+        if next(structure):
+            return (True, _decode(card.dl, structure, columns))
+        return (False, None)
+    elif isinstance(card, DataCardAlternates):
+        i = next(structure)
+        return (i, _decode(card.alt_list[i], structure, columns))
+    elif isinstance(card, DataCardRepeat):
+        nrows = next(structure)
+        found = next(structure)
+        template = card._repeated_record
+        if type(template) is DataCard and not template.lazy:
+            # Rows of a plain DataCard are taken from the columns in bulk.
+            sources, fields = columns[id(template)]
+            rows = [ParsedLine(t[1:], t[0]) for t in
+                    itertools.islice(zip(sources, *fields), nrows)]
+        else:
+            rows = [_decode(template, structure, columns)
+                    for _ in range(nrows)]
+        return (rows, bool(found),
+                _decode(card.end_record, structure, columns) if found
+                else None)
+    elif isinstance(card, DataCardStack):
+        return [_decode(dl, structure, columns) for dl in card._datalines]
+    sources, fields = columns[id(card)]
+    if isinstance(card, DataCardFixedText):
+        return next(sources)
+    if card.lazy and next(structure):
+        return card._schema.read_lazy(next(sources))
+    return ParsedLine([next(values) for values in fields], next(sources))
+
+
+def _read_header(buf):
+    if len(buf) < _HEADER.size:
+        raise ValueError('Not a snapshot file')
+    magic, version, size = _HEADER.unpack(bytes(buf[:_HEADER.size]))
+    if magic != MAGIC:
+        raise ValueError('Not a snapshot file')
+    if version != VERSION:
+        raise ValueError('Unsupported snapshot version %d' % version)
+    end = _HEADER.size + size
+    return json.loads(bytes(buf[_HEADER.size:end]).decode('utf-8')), end
+
+
+def load_snapshot(card, path):
+    """ Read the snapshot at path into card, which must have the same layout
+        as the card the snapshot was saved from. Returns card.
+    """
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped.
+            raise ValueError('Not a snapshot file')
+    buf = memoryview(mm)
+    try:
+        header, base = _read_header(buf)
+        if header['signature'] != repr(signature(card)):
+            raise ValueError('Snapshot was saved from a card with a '
+                             'different layout')
+        nodes = _layout(card, [])
+        columns = {}
+        for c, entry in zip(nodes, header['nodes']):
+            columns[id(c)] = (
+                iter(_unpack(buf, base, entry['sources'])),
+                [itertools.repeat(None) if e is None
+                 else iter(_unpack(buf, base, e)) for e in entry['fields']])
+        structure = iter(_unpack(buf, base, header['structure']))
+    finally:
+        buf.release()
+        mm.close()
+    card._apply(_decode(card, structure, columns))
+    return card
@@ -2,12 +2,230 @@
 
 # To parse ATP files, the fortranformat module is used
 # Install from pip: pip install fortranformat
-from fortranformat import FortranRecordReader
-from fortranformat import FortranRecordWriter
 # from fortranformat import RecordError
 
+import collections
 import copy
-import itertools
+
+from .compact import CompactRows
+from .fastformat import compile_reader, compile_writer, valid_line_check
+from .lazy import LazyData, LazyLine
+from .literals import LiteralIndex, literal_test
+from .lines import LineStream, LineView, text_or
+
+
+ParsedLine = collections.namedtuple('ParsedLine', 'values source')
+ParsedLine.__doc__ = """ Parse result of a DataCard: the list of values, one
+    per field, and the line they were read from.
+"""
+
+
+class ReadError(ValueError):
+    """ Raised when lines don't match a card.
+
+        line_number is the index in lines of the line that didn't match,
+        card the name of the card it didn't match, or of the nearest named
+        card that contains it, and field the name of the field that
+        couldn't be read or had the wrong fixed value. Each is None if it
+        isn't known.
+    """
+
+    _schema = _line = None
+
+    def __init__(self, message, line_number=None, card=None, field=None):
+        ValueError.__init__(self, message)
+        self.message = message
+        self.line_number = line_number
+        self.card = card
+        self._field = field
+
+    @property
+    def field(self):
+        # Found only when asked for, as most failed matches are trials.
+        if self._field is None and self._schema is not None:
+            self._field = self._schema.failed_field(self._line)
+            self._schema = self._line = None
+        return self._field
+
+    def __reduce__(self):
+        return (self.__class__,
+                (self.message, self.line_number, self.card, self.field))
+
+    def __str__(self):
+        where = []
+        if self.line_number is not None:
+            where.append('line %d' % self.line_number)
+        if self.card is not None:
+            where.append('card %r' % (self.card,))
+        if self.field is not None:
+            where.append('field %r' % (self.field,))
+        if not where:
+            return self.message
+        return '%s (%s)' % (self.message, ', '.join(where))
+
+
+def _has_line(lines, idx):
+    """ Checks if lines[idx] exists without requiring len(lines), which is
+        not available for streamed input.
+    """
+    try:
+        lines[idx]
+    except IndexError:
+        return False
+    return True
+
+
+class CardSchema(object):
+    """ Immutable layout of a single-line record: the format string, the
+        field names and the indices of the fixed fields, together with the
+        compiled reader and writer. Formats made up of fixed-width fields
+        are read and written with FastRecordReader and FastRecordWriter,
+        others with fortranformat.
+
+        A schema holds no parsed data, so it is shared rather than copied
+        between all cards built from it. Copying a schema returns the same
+        object.
+    """
+
+    __slots__ = ('format', 'fields', 'fixed_fields', 'layout', '_reader',
+                 '_writer', '_width', '_names', '_decoders', '_checked',
+                 '_check')
+
+    def __init__(self, format, fields, fixed_fields=()):
+        object.__setattr__(self, 'format', format)
+        object.__setattr__(self, 'fields', tuple(fields))
+        object.__setattr__(self, 'fixed_fields', tuple(fixed_fields))
+        object.__setattr__(self, '_reader', compile_reader(format))
+        object.__setattr__(self, '_writer', compile_writer(format))
+        # Column ranges of the fields, if the format has fixed columns.
+        object.__setattr__(self, 'layout',
+                           getattr(self._reader, 'layout', None))
+        object.__setattr__(self, '_width', None if self.layout is None
+                           else max(f.start + f.width for f in self.layout))
+        # Field names in order and converters of the other fields for lazy
+        # reading.
+        object.__setattr__(self, '_names', tuple(
+            f for f in self.fields if f is not None))
+        decoders = {}
+        if self.layout is not None:
+            for i, f in enumerate(self.fields):
+                if f is not None and i not in self.fixed_fields:
+                    decoders[f] = self._reader.field_readers[i]
+        object.__setattr__(self, '_decoders', decoders)
+        # Readers of the other fields, whose values a lazy read checks
+        # without converting them, and a regular expression that tells
+        # most valid lines apart quickly.
+        checked = [] if self.layout is None else \
+            [i for i, f in enumerate(self.layout)
+             if i not in self.fixed_fields and f.kind != 'A']
+        object.__setattr__(self, '_checked', tuple(
+            self._reader.field_readers[i] for i in checked))
+        object.__setattr__(self, '_check', None if not checked
+                           else valid_line_check(self.layout, checked))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CardSchema is immutable')
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (self.__class__,
+                (self.format, self.fields, self.fixed_fields))
+
+    def read(self, line):
+        """ Parse a line into a list of values, one per field. Raises
+            ValueError if a fixed field has the wrong value.
+        """
+        if type(line) is LineView:
+            # Decode only the columns that the fields are read from.
+            line = str(line) if self.layout is None else line[:self._width]
+        data = self._reader.read(line)
+        for f in self.fixed_fields:
+            if data[f] != self.fields[f]:
+                raise ValueError('Fixed field with wrong value: %s/%s'
+                                 % (data[f], self.fields[f]))
+        return data
+
+    def read_lazy(self, line):
+        """ Check a line without converting the fields that aren't fixed.
+            Raises ValueError for the same lines as read(). Returns a
+            LazyLine for lazy_data(), or a list of values like read() if the
+            format isn't fixed-width or the line contains line breaks.
+        """
+        if self.layout is None:
+            return self.read(line)
+        source = line
+        if type(line) is LineView:
+            line = line[:self._width]
+        elif '\n' in line or '\r' in line:
+            return self.read(line)
+        readers = self._reader.field_readers
+        fixed = []
+        for f in self.fixed_fields:
+            value = readers[f](line)
+            if value != self.fields[f]:
+                raise ValueError('Fixed field with wrong value: %s/%s'
+                                 % (value, self.fields[f]))
+            fixed.append(value)
+        if self._check is not None and self._check(line) is None:
+            # Unusual or invalid values: read them to raise as read() does.
+            for reader in self._checked:
+                reader(line)
+        return LazyLine(line[:self._width], tuple(fixed), source)
+
+    def lazy_data(self, result):
+        """ Returns a LazyData mapping for a LazyLine from read_lazy(). """
+        values = {}
+        for f, value in zip(self.fixed_fields, result.fixed):
+            if self.fields[f] is not None:
+                values[self.fields[f]] = value
+        return LazyData(self._names, values, self._decoders, result.line)
+
+    def failed_field(self, line):
+        """ Returns the name, or the index if it has no name, of the first
+            field of line that can't be read or has the wrong fixed value,
+            or None if there is none or the format isn't fixed-width.
+        """
+        if self.layout is None:
+            return None
+        if type(line) is LineView:
+            line = line[:self._width]
+        elif '\n' in line or '\r' in line:
+            return None
+        for i, reader in enumerate(self._reader.field_readers):
+            try:
+                value = reader(line)
+            except ValueError:
+                pass
+            else:
+                if i not in self.fixed_fields or value == self.fields[i]:
+                    continue
+            return i if self.fields[i] is None else self.fields[i]
+        return None
+
+    def write(self, values):
+        """ Format a list of values, one per field, into a line. """
+        return self._writer.write(values)
+
+    def new_data(self):
+        """ Returns an empty data dict for a record of this schema. """
+        return dict.fromkeys(self._names)
+
+    def discriminators(self):
+        """ Returns a list of (start, width, text) tuples, one for each fixed
+            A field. A line can only match if line[start:start + width],
+            padded with blanks to width, equals text.
+        """
+        if self.layout is None or len(self.layout) != len(self.fields):
+            return []
+        return [(self.layout[i].start, self.layout[i].width, self.fields[i])
+                for i in self.fixed_fields
+                if self.layout[i].kind == 'A'
+                and isinstance(self.fields[i], str)]
 
 
 class DataCard:
@@ -21,72 +239,180 @@ class DataCard:
             fields  list.
         post_read_hook is an optional parameter indicating a function to be
             called after reading lines into the DataCard.
+        lazy: if True, data is a LazyData mapping that converts the fields
+            when they are first looked up. Lines are checked when they are
+            read without converting them and match the same lines as with
+            lazy False.
         Data in the line is internally represented using a dict.
 
-        format and fields should not be changed after initialization.
+        A card that was read keeps the line in source. Until its data is
+        changed (see dirty), write() returns that line unchanged instead of
+        formatting the data, so unmodified cards round trip byte for byte.
+        Set source to None to have the card formatted anyway.
+
+        format and fields are held in a shared, immutable CardSchema.
 
         Reads only one line, but should be passed an interable of lines.
     """
 
+    # Line the card was read from and the data read from it.
+    source = None
+    _source_values = None
+
     def __init__(self, format, fields, fixed_fields=(), name=None,
-                 post_read_hook=None):
-        self._fields = fields
-        self._fixed_fields = tuple(fixed_fields)
-        self._reader = FortranRecordReader(format)
-        self._writer = FortranRecordWriter(format)
+                 post_read_hook=None, lazy=False):
+        self._schema = CardSchema(format, fields, fixed_fields)
+        self._fields = self._schema.fields
+        self._fixed_fields = self._schema.fixed_fields
         self.name = name
         self.post_read_hook = post_read_hook
+        self.lazy = lazy
 
-        self.data = {}
-        for f in fields:
-            if f is not None:
-                self.data[f] = None
+        self.data = self._schema.new_data()
 
-    def read(self, lines, read_all_or_none=True):
+    def _new_record(self):
+        """ Returns a new, unread card with the same layout. The schema is
+            shared with this card rather than copied.
+        """
+        # Faster than copy.copy, which matters for large repeated blocks.
+        rec = self.__class__.__new__(self.__class__)
+        rec.__dict__.update(self.__dict__)
+        rec.data = self._schema.new_data()
+        rec.source = rec._source_values = None
+        return rec
+
+    def read(self, lines, read_all_or_none=True, start=0, cache=None):
         """ Read in datalines with validation prior to populating data.
             lines: list of lines to read. Extra lines are ignored.
-            read_all_or_none: Tests the input before reading if True.
-            If False, a partial read will occur before an exception is
-            raised. Set to True is safest but has additional overhead of
-            copying the object and peeking at the data before reading. For
-            large cards, the performance difference is significant
-            (1 s vs 60 s).
+            start: index in lines of the first line to read.
+            read_all_or_none: Kept for compatibility. The lines are always
+            parsed in full, once, before the card is modified, so a failed
+            read leaves the card unchanged.
+            cache: optional ParseCache to look up and store the result in.
+            Returns the number of lines read. Raises ReadError, a
+            ValueError, with the line number, card and field where the
+            lines didn't match.
         """
-        if read_all_or_none and not self.match(lines):
-            # This should raise an exception and will help
-            # identify where in the stack the exception occured.
-            tmp = copy.deepcopy(self)
-            tmp._read(lines)
-        self._read(lines)
+        if cache is not None:
+            n, result = cache.parse(self, lines, start)
+        else:
+            n, result = self._parse(lines, start)
+        self._apply(result)
+        return n
 
 
-    def _read(self, lines):
-        line = lines[0]
-        data = self._reader.read(line)
-        for f in self._fixed_fields:
-            if data[f] != self._fields[f]:
-                raise ValueError('Fixed field with wrong value: ' + data[f] +
-                                 '/' + self._fields[f])
+    def _parse(self, lines, start=0):
+        """ Parse lines beginning at lines[start] without modifying the card.
+            Returns a tuple of the number of lines consumed and the parsed
+            result. Raises ValueError if the lines don't match the card.
+        """
+        try:
+            line = lines[start]
+        except IndexError:
+            raise ReadError('Unexpected end of input', start, self.name)
+        try:
+            if self.lazy:
+                result = self._schema.read_lazy(line)
+                if type(result) is LazyLine:
+                    return 1, result
+            else:
+                result = self._schema.read(line)
+        except ValueError as e:
+            error = ReadError(str(e), start, self.name)
+            error._schema = self._schema
+            error._line = line
+            raise error
+        return 1, ParsedLine(result, line)
+
+    def _read(self, lines, start=0):
+        """ Read in datalines with no validation. Throw ValueError if records
+            don't match up.
+        """
+        return self._apply(self._parse(lines, start)[1])
 
-        for f, d in zip(self._fields, data):
-            if f is not None:
-                self.data[f] = d
+    def _apply(self, result):
+        """ Populate the card from a result returned by _parse. """
+        if type(result) is LazyLine:
+            self.data = self._schema.lazy_data(result)
+            self._source_values = self.data
+        else:
+            for f, d in zip(self._fields, result.values):
+                if f is not None:
+                    self.data[f] = d
+            # Kept rather than a copy of data; dirty compares them only
+            # when it's asked.
+            self._source_values = result.values
+        self.source = result.source
 
         if self.post_read_hook is not None:
             self.post_read_hook(self)
 
         return self
 
+    def _discriminators(self):
+        """ Returns a list of (start, width, text) conditions that the first
+            line must meet for the card to match. width None means the rest
+            of the line must equal text. An empty list means no condition
+            is known, for example for cards that can match zero lines.
+        """
+        return self._schema.discriminators()
+
+    @property
+    def dirty(self):
+        """ True if the card has no source line or its data differs from the
+            values read from it.
+        """
+        if self.source is None:
+            return True
+        values = self._source_values
+        if type(values) is LazyData:
+            # Lazily read data records its own changes.
+            return self.data is not values or self.data.modified
+        data = self.data
+        try:
+            for f, v in zip(self._fields, values):
+                if f is not None and data[f] is not v and data[f] != v:
+                    return True
+        except KeyError:
+            return True
+        return False
+
     def write(self):
+        if not self.dirty:
+            line = text_or(self.source)
+            if line is not None:
+                return line
         data = [self.data[f] if f is not None else None for f in self._fields]
-        return self._writer.write(data)
+        return self._schema.write(data)
 
-    def match(self, lines):
-        """ Checks if text lines match record type. Does not modify card data.
+    def write_to(self, file, chunk_size=10000):
+        """ Write the card to a file object, one line at a time, in chunks
+            of chunk_size lines rather than as a single string. Every line,
+            including the last, is terminated with a newline. Returns the
+            number of lines written.
+        """
+        n = 0
+        chunk = []
+        for line in self._iter_write():
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                file.write('\n'.join(chunk) + '\n')
+                n += len(chunk)
+                chunk = []
+        if chunk:
+            file.write('\n'.join(chunk) + '\n')
+            n += len(chunk)
+        return n
+
+    def _iter_write(self):
+        yield self.write()
+
+    def match(self, lines, start=0):
+        """ Checks if text lines match record type. Does not modify card data
+            and does not call post_read_hook.
         """
-        tmp = copy.deepcopy(self)
         try:
-            tmp._read(lines)
+            self._parse(lines, start)
         except ValueError:
             return False
 
@@ -95,30 +421,93 @@ class DataCard:
     def num_lines(self):
         return 1
 
+    def iter_read(self, source):
+        """ Read the card from a file object or iterator of lines, yielding
+            cards as they are read. A simple card yields itself. Stacks
+            yield their children's cards in order, and DataCardRepeat
+            yields each row (and then the end record) as a new card without
+            storing them, so memory use does not depend on the number of
+            rows. Only the lines needed to read the current card are held
+            in memory.
+
+            source may also be a LineStream, in which case reading starts
+            at source.pos and the stream is left positioned after the card.
+        """
+        if isinstance(source, LineStream):
+            stream = source
+        else:
+            stream = LineStream(source)
+        for card in self._iter_read(stream):
+            yield card
+
+    def aiter_read(self, source, encoding='latin-1'):
+        """ Like iter_read(), but from an asyncio.StreamReader or async
+            iterator of lines, for use with async for. See aio.aiter_read.
+        """
+        from .aio import aiter_read
+        return aiter_read(self, source, encoding)
+
+    def _iter_read(self, stream):
+        stream.advance(self.read(stream, start=stream.pos))
+        yield self
+
 
 class DataCardFixedText(DataCard):
-    def __init__(self, text, name=None):
+    """ A line of fixed text, such as a keyword card.
+        By default the whole line must equal text. If prefix is True, the
+        line must start with text, and if columns is a (start, stop) tuple,
+        the columns line[start:stop], padded with blanks, must hold text
+        padded with blanks. The rest of such a line can hold anything, and
+        write() returns the line that was read.
+    """
+
+    def __init__(self, text, name=None, prefix=False, columns=None):
         DataCard.__init__(self, format='(A%d)' % len(text),
                           fields=[text], fixed_fields=(0,), name=name)
-
-    def _read(self, lines):
-        lines[0]
-        if lines[0] != self._fields[0]:
-            raise ValueError('Fixed text with wrong value: ' + lines[0] +
-                                 '/' + self._fields[0])
-
+        if columns is None and prefix:
+            columns = (0, len(text))
+        if columns is not None and len(text) > columns[1] - columns[0]:
+            raise ValueError('%r does not fit in columns %d to %d'
+                             % ((text,) + tuple(columns)))
+        self.columns = None if columns is None else tuple(columns)
+        self._test = literal_test(self._discriminators())
+
+    def _parse(self, lines, start=0):
+        try:
+            line = lines[start]
+        except IndexError:
+            raise ReadError('Unexpected end of input', start, self.name)
+        if self.columns is None:
+            if line != self._fields[0]:
+                raise ReadError('Fixed text with wrong value: %s/%s'
+                                % (line, self._fields[0]), start, self.name)
+            return 1, None
+        if not self._test(line):
+            raise ReadError('Fixed text not in columns %d to %d: %s/%s'
+                            % (self.columns + (line, self._fields[0])),
+                            start, self.name)
+        return 1, line
+
+    def _apply(self, result):
+        if result is not None:
+            self.source = result
         if self.post_read_hook is not None:
             self.post_read_hook(self)
 
         return self
 
-    def write(self):
-        return self._fields[0]
+    def _discriminators(self):
+        if self.columns is None:
+            return [(0, None, self._fields[0])]
+        start, stop = self.columns
+        return [(start, stop - start, self._fields[0])]
 
-    def match(self, lines):
-        """ Checks if text lines match record type. Does not modify card data.
-        """
-        return lines[0] == self._fields[0]
+    def write(self):
+        if self.columns is None:
+            return self._fields[0]
+        if self.source is not None:
+            return str(self.source)
+        return ' ' * self.columns[0] + self._fields[0]
 
 
 class DataCardStack(DataCard):
@@ -137,22 +526,49 @@ class DataCardStack(DataCard):
         self._fixed_fields = ()
         self.post_read_hook = post_read_hook
 
+        self._fields = []
         self.data = {}
         for dl in self._datalines:
             for f in dl._fields:
+                self._fields.append(f)
                 self.data[f] = dl.data[f]
 
-    def _read(self, lines):
-        """ Read in datalines with no validation. Throw ValueError if records
-            don't match up.
-        """
-        line_idx = 0
-        for dl in self._datalines:
-            dl._read(lines[line_idx:])
-            line_idx += dl.num_lines()
-            # Sync data up to DataCardFixed.data dict.
+    def _new_record(self):
+        rec = copy.copy(self)
+        rec._datalines = [dl._new_record() for dl in self._datalines]
+        rec.data = {}
+        for dl in rec._datalines:
             for f in dl._fields:
-                self.data[f] = dl.data[f]
+                rec.data[f] = dl.data[f]
+        return rec
+
+    def _parse(self, lines, start=0):
+        line_idx = start
+        results = []
+        try:
+            for dl in self._datalines:
+                n, r = dl._parse(lines, line_idx)
+                line_idx += n
+                results.append(r)
+        except ReadError as e:
+            if e.card is None:
+                e.card = self.name
+            raise
+        return line_idx - start, results
+
+    def _apply(self, result):
+        for dl, r in zip(self._datalines, result):
+            dl._apply(r)
+            # Sync data up to DataCardFixed.data dict.
+            if isinstance(dl.data, LazyData):
+                # Leave the fields to be decoded when they are looked up.
+                if not isinstance(self.data, LazyData):
+                    self.data = LazyData(values=self.data)
+                for f in dl._fields:
+                    self.data.link(f, dl.data)
+            else:
+                for f in dl._fields:
+                    self.data[f] = dl.data[f]
             if dl.name is not None:
                 self.data[dl.name] = dl.data
 
@@ -161,18 +577,52 @@ class DataCardStack(DataCard):
 
         return self
 
+    def _discriminators(self):
+        if not self._datalines:
+            return []
+        return self._datalines[0]._discriminators()
+
+    def _sync_down(self, dl):
+        """ Copy the values of dl's fields that were changed in data down to
+            dl.data. Unchanged values are left alone so that dl stays clean.
+        """
+        lazy = isinstance(self.data, LazyData)
+        for f in dl._fields:
+            if f is None or f not in self.data \
+                    or (lazy and not self.data.is_decoded(f)):
+                continue
+            value = self.data[f]
+            if f not in dl.data or (dl.data[f] is not value
+                                    and dl.data[f] != value):
+                dl.data[f] = value
+
     def write(self):
-        rtn = []
+        # Cards that hold no lines, such as an unmatched DataCardOptional,
+        # write nothing rather than a blank line.
+        return '\n'.join(self._iter_write())
+
+    def _iter_write(self):
         for dl in self._datalines:
             # Sync data down to DataLine.data dicts.
-            for f in dl._fields:
-                dl.data[f] = dl.data[f]
-            rtn.append(dl.write())
-        return '\n'.join(rtn)
+            self._sync_down(dl)
+            for line in dl._iter_write():
+                yield line
 
     def num_lines(self):
         return sum([dl.num_lines() for dl in self._datalines])
 
+    def _iter_read(self, stream):
+        for dl in self._datalines:
+            for card in dl._iter_read(stream):
+                yield card
+            for f in dl._fields:
+                self.data[f] = dl.data[f]
+            if dl.name is not None:
+                self.data[dl.name] = dl.data
+
+        if self.post_read_hook is not None:
+            self.post_read_hook(self)
+
 
 class DataCardRepeat(DataCardStack):
     """ Class to implement ATP/Fortram style input records where a record
@@ -186,10 +636,21 @@ class DataCardRepeat(DataCardStack):
 
         Data is stored as a list of cards. Access by index or iteration only at
         this time.
+
+        If compact is True, the rows are stored in a compact.CompactRows of
+        typed columns instead of a card and a data dict per row, which
+        takes much less memory for large blocks. data is then the
+        CompactRows, whose items are RowView mappings of the rows, and
+        _datalines only holds the end record. repeated_record must be a
+        single-line card.
     """
 
     def __init__(self, repeated_record, end_record=None, name=None,
-                 post_read_hook=None):
+                 post_read_hook=None, compact=False):
+        if compact and isinstance(repeated_record, DataCardStack):
+            raise ValueError('Compact rows need a single-line repeated '
+                             'record')
+        self.compact = compact
         self._repeated_record = copy.deepcopy(repeated_record)
         self.end_record = copy.deepcopy(end_record)
         self._datalines = []
@@ -197,41 +658,183 @@ class DataCardRepeat(DataCardStack):
         self.name = name
         self._fields = []
         self.post_read_hook = post_read_hook
-
-    def _read(self, lines):
-
-        self.data = []
-        self._datalines = []
-        # Loop breaks internally due to complexity of break conditions
-        line_idx = 0
-        while line_idx < len(lines):
-            if self.end_record is not None \
-                    and self.end_record.match(lines[line_idx:]):
-                self._datalines.append(self.end_record)
-                self.end_record._read(lines[line_idx:])
-                line_idx += self.end_record.num_lines()
+        # Checks the fixed text of the end record before trying to parse it.
+        self._end_test = None if end_record is None \
+            else literal_test(self.end_record._discriminators())
+
+    def _new_record(self):
+        # The repeated record is only used as a template, so it is shared.
+        rec = copy.copy(self)
+        if self.end_record is not None:
+            rec.end_record = self.end_record._new_record()
+        rec._datalines = []
+        rec.data = []
+        return rec
+
+    def _end_index(self, lines, start=0):
+        """ Returns the index of the first line from lines[start] on that the
+            end record matches, or the index after the last line if none
+            does. The lines before it are not parsed.
+        """
+        end = self.end_record
+        if isinstance(end, DataCardFixedText) and end.columns is None \
+                and isinstance(lines, list):
+            try:
+                return lines.index(end._fields[0], start)
+            except ValueError:
+                return max(len(lines), start)
+        end_test = self._end_test
+        line_idx = start
+        while _has_line(lines, line_idx):
+            if (end_test is None or end_test(lines[line_idx])) \
+                    and end.match(lines, line_idx):
                 break
-            # Read record and append to records list
-            r = copy.deepcopy(self._repeated_record)
-            self._datalines.append(r)
-            if self.end_record is None:
+            line_idx += 1
+        return line_idx
+
+    def _parse(self, lines, start=0):
+        """ Parse rows until the end record matches. The result is a tuple
+            of the list of row results, whether the end record was found,
+            and the end record result.
+        """
+        rows = []
+        line_idx = start
+        end_test = self._end_test
+        while _has_line(lines, line_idx):
+            if self.end_record is not None:
+                if end_test is None or end_test(lines[line_idx]):
+                    try:
+                        n, r = self.end_record._parse(lines, line_idx)
+                    except ValueError:
+                        pass
+                    else:
+                        return line_idx + n - start, (rows, True, r)
+                try:
+                    n, r = self._repeated_record._parse(lines, line_idx)
+                except ReadError as e:
+                    if e.card is None:
+                        e.card = self.name
+                    raise
+            else:
                 try:
-                    r._read(lines[line_idx:])
-                    line_idx += r.num_lines()
-                    self.data.append(r.data)
+                    n, r = self._repeated_record._parse(lines, line_idx)
                 except ValueError:
-                    self._datalines.pop()
                     break
-            else:
-                r._read(lines[line_idx:])
-                line_idx += r.num_lines()
-                self.data.append(r.data)
+            line_idx += n
+            rows.append(r)
+        return line_idx - start, (rows, False, None)
+
+    def _apply(self, result):
+        rows, end_found, end_result = result
+        self._datalines = []
+        if self.compact:
+            self.data = self._compact_rows(rows)
+            rows = ()
+        else:
+            self.data = []
+        for row in rows:
+            r = self._repeated_record._new_record()
+            r._apply(row)
+            self._datalines.append(r)
+            self.data.append(r.data)
+        if end_found:
+            self.end_record._apply(end_result)
+            self._datalines.append(self.end_record)
 
         if self.post_read_hook is not None:
             self.post_read_hook(self)
 
         return self
 
+    def _compact_rows(self, rows):
+        """ Returns a CompactRows of the row results. """
+        template = self._repeated_record
+        data = CompactRows(template._schema)
+        if template.post_read_hook is None and not template.lazy \
+                and type(template) is DataCard:
+            data.extend([r.values for r in rows], [r.source for r in rows])
+            return data
+        # Rows that need a hook or lazy reading are read into a card first.
+        values = []
+        sources = []
+        for row in rows:
+            r = template._new_record()
+            r._apply(row)
+            values.append([None if f is None else r.data[f]
+                           for f in r._fields])
+            sources.append(None if r.dirty else r.source)
+        data.extend(values, sources)
+        return data
+
+    def _discriminators(self):
+        # The block may have no rows.
+        return []
+
+    def _iter_write(self):
+        if self.compact:
+            for i in range(len(self.data)):
+                yield self.data.write_row(i)
+        for line in DataCardStack._iter_write(self):
+            yield line
+
+    def num_lines(self):
+        n = DataCardStack.num_lines(self)
+        return n + len(self.data) if self.compact else n
+
+    def _sync_down(self, dl):
+        # data holds the rows' own data dicts, so there is nothing to copy.
+        pass
+
+    def read_columns(self, lines, start=0):
+        """ Read the block into a columnar.ColumnTable of NumPy arrays, one
+            per field, instead of a list of data dicts. See
+            columnar.read_columns.
+        """
+        from .columnar import read_columns
+        return read_columns(self, lines, start)
+
+    def write_columns(self, columns, file, chunk_size=10000):
+        """ Write rows from columnar data, a mapping of field name to a
+            sequence or NumPy array of values, followed by the end record.
+            See columnar.write_columns.
+        """
+        from .columnar import write_columns
+        return write_columns(self, columns, file, chunk_size)
+
+    def read_arrow(self, lines, start=0):
+        """ Read the block into a pyarrow.Table typed from the format of the
+            repeated record. See arrow.read_arrow.
+        """
+        from .arrow import read_arrow
+        return read_arrow(self, lines, start)
+
+    def write_parquet(self, lines, path, start=0, **kwargs):
+        """ Read the block and write it to a Parquet file. See
+            arrow.write_parquet.
+        """
+        from .arrow import write_parquet
+        return write_parquet(self, lines, path, start, **kwargs)
+
+    def _iter_read(self, stream):
+        """ Yield each row as a new card without adding it to data. """
+        self.data = []
+        self._datalines = []
+        while _has_line(stream, stream.pos):
+            if self.end_record is not None \
+                    and self.end_record.match(stream, stream.pos):
+                for card in self.end_record._iter_read(stream):
+                    yield card
+                break
+            r = self._repeated_record._new_record()
+            if self.end_record is None \
+                    and not r.match(stream, stream.pos):
+                break
+            for card in r._iter_read(stream):
+                yield card
+
+        if self.post_read_hook is not None:
+            self.post_read_hook(self)
+
 
 class DataCardAlternates(DataCardStack):
     """ Class to implement ATP/Fortran style input records where different
@@ -247,6 +850,40 @@ class DataCardAlternates(DataCardStack):
         self.name = name
 
         self.post_read_hook = post_read_hook
+        self._build_index()
+
+    def _build_index(self):
+        """ Index the alternates by the fixed text that their first line
+            must contain, so that only alternates whose fixed text is
+            present in a line are tried. Alternates without fixed text are
+            always tried. alt_list should not be changed after the index is
+            built.
+        """
+        always = []
+        index = LiteralIndex()
+        for i, dl in enumerate(self.alt_list):
+            disc = dl._discriminators()
+            if not disc:
+                always.append(i)
+            else:
+                index.add(disc[0], i)
+        self._index = (always, index)
+
+    def _candidates(self, lines, start):
+        """ Returns the indices in alt_list of the alternates that may match
+            lines[start], with the selected record type first.
+        """
+        always, index = self._index
+        candidates = list(always)
+        try:
+            line = lines[start]
+        except IndexError:
+            line = None
+        if line is not None:
+            candidates.extend(index.lookup(line))
+        return sorted(candidates,
+                      key=lambda i: (self.alt_list[i] is not self.dl_matched,
+                                     i))
 
     def _sync_to_selected(self):
         if self.dl_matched is None:
@@ -258,25 +895,47 @@ class DataCardAlternates(DataCardStack):
             self.data = self.dl_matched.data
             self._fields = self.dl_matched._fields
 
-    def _read(self, lines):
-
-        dl_to_check = itertools.chain(self._datalines,
-                               filter(lambda dl: dl is not self.dl_matched,
-                                      self.alt_list))
-        for dl in dl_to_check:
-            if dl.match(lines):
-                dl.read(lines)
-                self.dl_matched = dl
-                self._sync_to_selected()
-                break
-        else:
-            raise ValueError('None of the alternate datacards matched.')
+    def _new_record(self):
+        rec = copy.copy(self)
+        rec.alt_list = [dl._new_record() for dl in self.alt_list]
+        rec.dl_matched = None
+        for dl, new_dl in zip(self.alt_list, rec.alt_list):
+            if dl is self.dl_matched:
+                rec.dl_matched = new_dl
+        rec._sync_to_selected()
+        return rec
+
+    def _parse(self, lines, start=0):
+        """ The result is a tuple of the index in alt_list of the matching
+            alternate and its result.
+        """
+        for i in self._candidates(lines, start):
+            try:
+                n, r = self.alt_list[i]._parse(lines, start)
+            except ValueError:
+                continue
+            return n, (i, r)
+        raise ReadError('None of the alternate datacards matched.', start,
+                        self.name)
+
+    def _apply(self, result):
+        i, r = result
+        self.dl_matched = self.alt_list[i]
+        self.dl_matched._apply(r)
+        self._sync_to_selected()
 
         if self.post_read_hook is not None:
             self.post_read_hook(self)
 
         return self
 
+    def _discriminators(self):
+        return []
+
+    def _iter_read(self, stream):
+        stream.advance(self.read(stream, start=stream.pos))
+        yield self
+
 
 class DataCardOptional(DataCardAlternates):
     """ Class to implement ATP/Fortran style input records where the card is
@@ -291,10 +950,27 @@ class DataCardOptional(DataCardAlternates):
 
         self.post_read_hook = post_read_hook
 
-    def _read(self, lines):
+    def _new_record(self):
+        rec = copy.copy(self)
+        rec.dl = self.dl._new_record()
+        rec.dl_matched = rec.dl if self.dl_matched is not None else None
+        rec._sync_to_selected()
+        return rec
+
+    def _parse(self, lines, start=0):
+        """ The result is a tuple of whether the card matched and its
+            result.
+        """
+        try:
+            n, r = self.dl._parse(lines, start)
+        except ValueError:
+            return 0, (False, None)
+        return n, (True, r)
 
-        if self.dl.match(lines):
-            self.dl.read(lines)
+    def _apply(self, result):
+        matched, r = result
+        if matched:
+            self.dl._apply(r)
             self.dl_matched = self.dl
         else:
             self.dl_matched = None